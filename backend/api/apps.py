@@ -1,6 +1,45 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+
+        from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                                     RecipeTag, Tag)
+        from foodgram.signals import bulk_loaded
+        from .catalogue import bump_catalogue_version
+        from .cookable import recipe_ingredients_changed
+        from .metrics import install_query_wrapper
+        from .response_cache import (invalidate_author, invalidate_recipe,
+                                     invalidate_recipe_relation)
+        from .search import (ingredient_search_changed, recipe_search_changed,
+                             recipes_loaded)
+
+        for model in (Ingredient, Tag):
+            post_save.connect(bump_catalogue_version, sender=model)
+            post_delete.connect(bump_catalogue_version, sender=model)
+            bulk_loaded.connect(bump_catalogue_version, sender=model)
+        post_save.connect(invalidate_recipe, sender=Recipe)
+        post_delete.connect(invalidate_recipe, sender=Recipe)
+        for model in (RecipeIngredient, RecipeTag):
+            post_save.connect(invalidate_recipe_relation, sender=model)
+            post_delete.connect(invalidate_recipe_relation, sender=model)
+        post_save.connect(invalidate_author, sender=get_user_model())
+        post_delete.connect(invalidate_author, sender=get_user_model())
+        for model in (Recipe, RecipeIngredient):
+            post_save.connect(recipe_search_changed, sender=model)
+            post_delete.connect(recipe_search_changed, sender=model)
+        post_save.connect(ingredient_search_changed, sender=Ingredient)
+        bulk_loaded.connect(recipes_loaded, sender=Recipe)
+        for model in (Recipe, RecipeIngredient):
+            post_save.connect(recipe_ingredients_changed, sender=model)
+            post_delete.connect(recipe_ingredients_changed, sender=model)
+        if settings.REQUEST_METRICS:
+            connection_created.connect(install_query_wrapper)
@@ -0,0 +1,113 @@
+"""
+Асинхронные представления для нагруженных эндпоинтов чтения.
+
+Подключаются в режиме ASGI (см. backend/asgi.py). Для GET вызывается
+асинхронный метод вьюсета с префиксом `a` (alist, aretrieve, ...), который
+читает данные асинхронным ORM, остальные методы HTTP обрабатываются
+обычным синхронным вьюсетом. Аутентификация, права доступа, выбор
+формата ответа и обработка ошибок те же, что у DRF.
+"""
+from asgiref.sync import sync_to_async
+from django.urls import path
+from rest_framework.routers import SimpleRouter
+
+from .views import IngredientsViewSet, RecipeViewSet, TagViewSet
+
+ROUTES = {route.name: route for route in SimpleRouter.routes
+          if hasattr(route, 'mapping')}
+
+
+def render_response(view):
+    """Синхронное представление, которое возвращает готовый ответ."""
+
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    return wrapper
+
+
+def as_async_view(viewset, actions, async_actions, **initkwargs):
+    """
+    Асинхронное представление для маршрута вьюсета.
+
+    actions - все методы HTTP маршрута, как у роутера DRF, async_actions -
+    методы, для которых вызывается асинхронный вариант действия.
+    """
+
+    sync_view = sync_to_async(
+        render_response(viewset.as_view(actions, **initkwargs))
+    )
+    if 'get' in actions and 'head' not in actions:
+        actions = {**actions, 'head': actions['get']}
+        async_actions = (*async_actions, 'head')
+
+    async def view(request, *args, **kwargs):
+        if request.method.lower() not in async_actions:
+            return await sync_view(request, *args, **kwargs)
+
+        self = viewset(**initkwargs)
+        self.action_map = actions
+        self.args = args
+        self.kwargs = kwargs
+        self.headers = self.default_response_headers
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        try:
+            # Пользователь по токену определяется до проверки прав,
+            # чтобы в цикле событий не выполнялись синхронные запросы.
+            await sync_to_async(lambda: request.user)()
+            self.initial(request, *args, **kwargs)
+            handler = getattr(self, f'a{ self.action }')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        response = self.finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    view.csrf_exempt = True
+    return view
+
+
+def get_route_view(viewset, basename, route_name):
+    """Маршрут роутера DRF (список или объект) с асинхронным GET."""
+
+    route = ROUTES[route_name]
+    actions = {method: action for method, action in route.mapping.items()
+               if hasattr(viewset, action)}
+    return as_async_view(viewset, actions, ('get',), **route.initkwargs,
+                         basename=basename, detail=route.detail)
+
+
+def get_action_view(viewset, basename, action):
+    """Дополнительное действие вьюсета (@action) с асинхронным GET."""
+
+    function = getattr(viewset, action)
+    return as_async_view(viewset, {'get': action}, ('get',),
+                         **function.kwargs, basename=basename,
+                         detail=function.detail)
+
+
+urlpatterns = [
+    path('tags/',
+         get_route_view(TagViewSet, 'tags', '{basename}-list'),
+         name='tags-list'),
+    path('ingredients/',
+         get_route_view(IngredientsViewSet, 'ingredients',
+                        '{basename}-list'),
+         name='ingredients-list'),
+    path('recipes/',
+         get_route_view(RecipeViewSet, 'recipes', '{basename}-list'),
+         name='recipes-list'),
+    path('recipes/download_shopping_cart/',
+         get_action_view(RecipeViewSet, 'recipes',
+                         'download_shopping_cart'),
+         name='recipes-download-shopping-cart'),
+    path('recipes/<int:pk>/',
+         get_route_view(RecipeViewSet, 'recipes', '{basename}-detail'),
+         name='recipes-detail'),
+]
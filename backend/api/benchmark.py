@@ -0,0 +1,555 @@
+"""
+Нагрузочные замеры API внутри процесса.
+
+Запросы выполняются тестовыми клиентами Django: режим wsgi - Client в пуле
+потоков через WSGI-обработчик, режим asgi - AsyncClient в цикле событий
+через ASGI-обработчик с асинхронными представлениями. Сетевой стек и сервер
+приложений не участвуют, поэтому результаты годятся для сравнения режимов
+и коммитов между собой, а не как оценка пропускной способности сервера.
+
+Каждый сценарий - маршрут из api/urls.py и метод HTTP. Сценарии записи
+выполняются над отдельными пользователями, созданными для замера, и
+парами (POST, затем DELETE), чтобы не зависеть друг от друга.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from types import ModuleType
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, include, path
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+MODES = ('wsgi', 'asgi')
+PASSWORD = 'bench-Pa55word'
+BENCH_PREFIX = 'bench'
+# Количество id в пакетных запросах.
+BULK_SIZE = 10
+
+Scenario = namedtuple('Scenario',
+                      ('route', 'method', 'variant', 'writes', 'prepare'))
+Request = namedtuple('Request', ('method', 'url', 'data', 'token'))
+
+# Маршруты, которые не замеряются, и причина. Маршруты subscriptions-*
+# кроме списка подписок - действия djoser, дублирующие /api/users/.
+SKIPPED = {
+    'users-activation': 'отправляет письма',
+    'users-resend-activation': 'отправляет письма',
+    'users-reset-password': 'отправляет письма',
+    'users-reset-password-confirm': 'требует кода из письма',
+    'users-reset-username': 'отправляет письма',
+    'users-reset-username-confirm': 'требует кода из письма',
+    'users-set-username': 'меняет email пользователя',
+    'users-detail': 'то же, что /api/users/me/',
+}
+
+
+def get_urlconf(mode):
+    """Корневой URLconf: в режиме asgi с асинхронными представлениями."""
+
+    from .async_views import urlpatterns as async_urlpatterns
+    from .urls import sync_urlpatterns
+
+    api_urlpatterns = sync_urlpatterns
+    if mode == 'asgi':
+        api_urlpatterns = async_urlpatterns + sync_urlpatterns
+    urlconf = ModuleType(f'benchmark_{ mode }_urls')
+    urlconf.urlpatterns = [path('api/', include(api_urlpatterns))]
+    return urlconf
+
+
+def get_routes(patterns=None):
+    """Пары (имя маршрута, метод HTTP) из api/urls.py."""
+
+    from .urls import sync_urlpatterns
+
+    routes = {}
+    for pattern in sync_urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            routes.update(dict.fromkeys(get_routes(pattern.url_patterns)))
+            continue
+        if not isinstance(pattern, URLPattern):
+            continue
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions is None:
+            view_class = pattern.callback.cls
+            actions = [method for method in view_class.http_method_names
+                       if hasattr(view_class, method)]
+        for method in actions:
+            if method not in ('options', 'head'):
+                routes[(pattern.name, method.upper())] = None
+    return list(routes)
+
+
+class QueryCounter:
+    """Счетчик SQL-запросов во всех потоках."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+        self.wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        for wrapper in [connection] if connection else connections.all():
+            if self not in wrapper.execute_wrappers:
+                wrapper.execute_wrappers.append(self)
+                self.wrappers.append(wrapper)
+
+    def __enter__(self):
+        self.install()
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *args):
+        connection_created.disconnect(self.install)
+        for wrapper in self.wrappers:
+            if self in wrapper.execute_wrappers:
+                wrapper.execute_wrappers.remove(self)
+
+
+def percentile(values, percent):
+    """Перцентиль по отсортированному списку значений."""
+
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def summarize(results, elapsed, queries):
+    """Пропускная способность, задержки в миллисекундах и объем ответов."""
+
+    latencies = sorted(latency for latency, _, _ in results)
+    count = len(results)
+    return {
+        'requests': count,
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'rps': round(count / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries_per_request': round(queries / count, 2),
+        'bytes_per_response': round(
+            statistics.mean(size for _, _, size in results)
+        ),
+    }
+
+
+def get_content_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def get_kwargs(request):
+    kwargs = {}
+    if request.data is not None:
+        kwargs['data'] = json.dumps(request.data)
+        kwargs['content_type'] = 'application/json'
+    return kwargs
+
+
+def run_wsgi(requests, concurrency, counter):
+    """Запросы из пула потоков через WSGI."""
+
+    clients = threading.local()
+
+    def call(request):
+        client = getattr(clients, 'client', None)
+        if client is None:
+            client = clients.client = Client()
+        headers = {}
+        if request.token:
+            headers['HTTP_AUTHORIZATION'] = f'Token { request.token }'
+        start = time.perf_counter()
+        response = client.generic(request.method, request.url,
+                                  **get_kwargs(request), **headers)
+        size = get_content_size(response)
+        return time.perf_counter() - start, response.status_code, size
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, requests))
+
+
+def run_asgi(requests, concurrency, counter):
+    """Конкурентные запросы в цикле событий через ASGI."""
+
+    async def main():
+        # Синхронный код представлений выполняется в отдельном потоке со
+        # своими соединениями с базой.
+        await sync_to_async(counter.install)()
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(request):
+            headers = {}
+            if request.token:
+                headers['AUTHORIZATION'] = f'Token { request.token }'
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.generic(
+                    request.method, request.url, **get_kwargs(request),
+                    **headers
+                )
+                size = get_content_size(response)
+                return time.perf_counter() - start, response.status_code, size
+
+        return await asyncio.gather(*(call(request) for request in requests))
+
+    return asyncio.run(main())
+
+
+RUNNERS = {
+    'wsgi': run_wsgi,
+    'asgi': run_asgi,
+}
+
+
+def run(mode, requests, concurrency):
+    """Замер списка запросов в режиме wsgi или asgi."""
+
+    with override_settings(ROOT_URLCONF=get_urlconf(mode)):
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            results = RUNNERS[mode](requests, concurrency, counter)
+            elapsed = time.perf_counter() - start
+    return summarize(results, elapsed, counter.count)
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), '#E26C2D').save(buffer, 'JPEG')
+    return ('data:image/jpeg;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class BenchContext:
+    """
+    Данные для сценариев: id рецептов, авторов, тегов и ингредиентов из
+    базы и пользователи замера с токенами и известным паролем.
+    """
+
+    def __init__(self):
+        self.user = User.objects.filter(
+            shopping_cart_ingredients__isnull=False
+        ).first() or User.objects.order_by('id').first()
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        self.recipe_ids = list(
+            Recipe.objects.order_by('-pub_date').values_list('id', flat=True)
+        )
+        self.author_ids = list(
+            User.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        self.ingredients = list(Ingredient.objects.order_by('id')[:100])
+        # Ингредиенты "в холодильнике": из нескольких новых рецептов.
+        self.pantry_ids = sorted(set(
+            RecipeIngredient.objects.filter(recipe_id__in=self.recipe_ids[:5])
+            .values_list('ingredient_id', flat=True)
+        ))
+        self.image = get_image()
+        self.password = make_password(PASSWORD)
+        self.new_users = itertools.count()
+        self.bench_users = []
+        self.tokens = {}
+
+    def create_users(self, prefix, count):
+        """Новые пользователи замера для очередного прогона сценариев."""
+
+        User.objects.bulk_create([
+            User(email=f'{ prefix }{ i }@foodgram.ru',
+                 username=f'{ prefix }{ i }',
+                 first_name='Нагрузка',
+                 last_name='Замер',
+                 password=self.password)
+            for i in range(count)
+        ])
+        self.bench_users = list(
+            User.objects.filter(username__startswith=prefix).order_by('id')
+        )
+        self.create_tokens()
+
+    def create_tokens(self):
+        """Токены для пользователей замера (после выхода из системы)."""
+
+        Token.objects.filter(user__in=self.bench_users).delete()
+        Token.objects.bulk_create([
+            Token(key=Token.generate_key(), user=user)
+            for user in self.bench_users
+        ])
+        self.tokens = dict(
+            Token.objects.filter(user__in=self.bench_users)
+            .values_list('user_id', 'key')
+        )
+
+    def bench_token(self, i):
+        return self.tokens[self.bench_users[i].id]
+
+    def recipe_data(self, i):
+        return {
+            'name': f'Рецепт замера { i }',
+            'text': 'Описание рецепта ' * 20,
+            'cooking_time': 30,
+            'image': self.image,
+            'tags': self.tag_ids[:1],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10 + i}
+                for ingredient in self.ingredients[i % 50:i % 50 + 3]
+            ],
+        }
+
+    def bench_recipes(self):
+        """Пары (id рецепта, токен автора) для рецептов замера."""
+
+        return [
+            (pk, self.tokens[author_id])
+            for pk, author_id in Recipe.objects.filter(
+                author__in=self.bench_users
+            ).order_by('id').values_list('id', 'author_id')
+        ]
+
+    def new_user_data(self):
+        number = next(self.new_users)
+        return {
+            'email': f'new{ number }@foodgram.ru',
+            'username': f'new{ number }',
+            'first_name': 'Новый',
+            'last_name': 'Пользователь',
+            'password': PASSWORD,
+        }
+
+
+def get_scenarios(ctx, requests):
+    """Сценарии в порядке выполнения."""
+
+    user_id = ctx.user.id
+    recipe_id = ctx.recipe_ids[0]
+    ingredient = ctx.ingredients[0].name[:3]
+
+    def repeat(url, token=None):
+        return lambda: [Request('GET', url, None, token)] * requests
+
+    def per_user(method, get_url, get_data=None):
+        return lambda: [
+            Request(method, get_url(i),
+                    None if get_data is None else get_data(i),
+                    ctx.bench_token(i))
+            for i in range(requests)
+        ]
+
+    def per_recipe(method, get_data=None):
+        return lambda: [
+            Request(method, f'/api/recipes/{ pk }/',
+                    None if get_data is None else get_data(i), token)
+            for i, (pk, token) in enumerate(ctx.bench_recipes())
+        ]
+
+    def after_logout(prepare):
+        def wrapper():
+            ctx.create_tokens()
+            return prepare()
+        return wrapper
+
+    def recipe_of(i):
+        return ctx.recipe_ids[i % len(ctx.recipe_ids)]
+
+    def author_of(i):
+        return ctx.author_ids[i % len(ctx.author_ids)]
+
+    return [
+        Scenario('api-root', 'GET', 'authorized', False,
+                 repeat('/api/', ctx.token)),
+        Scenario('tags-list', 'GET', 'anonymous', False,
+                 repeat('/api/tags/')),
+        Scenario('ingredients-list', 'GET', 'anonymous', False,
+                 repeat(f'/api/ingredients/?name={ ingredient }')),
+        Scenario('recipes-list', 'GET', 'anonymous', False,
+                 repeat('/api/recipes/?limit=6')),
+        Scenario('recipes-list', 'GET', 'authorized', False,
+                 repeat('/api/recipes/?limit=6', ctx.token)),
+        Scenario('recipes-detail', 'GET', 'anonymous', False,
+                 repeat(f'/api/recipes/{ recipe_id }/')),
+        Scenario('recipes-detail', 'GET', 'authorized', False,
+                 repeat(f'/api/recipes/{ recipe_id }/', ctx.token)),
+        Scenario('recipes-cookable', 'GET', 'anonymous', False,
+                 repeat('/api/recipes/cookable/?limit=6&ingredients='
+                        + ','.join(map(str, ctx.pantry_ids)))),
+        Scenario('recipes-recommended', 'GET', 'authorized', False,
+                 repeat('/api/recipes/recommended/?limit=6', ctx.token)),
+        Scenario('recipes-download-shopping-cart', 'GET', 'authorized',
+                 False, repeat('/api/recipes/download_shopping_cart/',
+                               ctx.token)),
+        Scenario('subscriptions-list', 'GET', 'authorized', False,
+                 repeat('/api/users/subscriptions/?limit=6&recipes_limit=3',
+                        ctx.token)),
+        Scenario('users-list', 'GET', 'authorized', False,
+                 repeat('/api/users/?limit=6', ctx.token)),
+        Scenario('users-detail', 'GET', 'authorized', False,
+                 repeat(f'/api/users/{ user_id }/', ctx.token)),
+        Scenario('users-me', 'GET', 'authorized', False,
+                 repeat('/api/users/me/', ctx.token)),
+        Scenario('recipes-list', 'POST', 'authorized', True,
+                 per_user('POST', lambda i: '/api/recipes/',
+                          ctx.recipe_data)),
+        Scenario('recipes-detail', 'PATCH', 'authorized', True,
+                 per_recipe('PATCH', lambda i: ctx.recipe_data(i + 1))),
+        Scenario('recipes-detail', 'PUT', 'authorized', True,
+                 per_recipe('PUT', ctx.recipe_data)),
+        Scenario('recipes-detail', 'DELETE', 'authorized', True,
+                 per_recipe('DELETE')),
+        Scenario('recipes-favorite', 'POST', 'authorized', True,
+                 per_user('POST',
+                          lambda i: f'/api/recipes/{ recipe_of(i) }/'
+                                    'favorite/')),
+        Scenario('recipes-favorite', 'DELETE', 'authorized', True,
+                 per_user('DELETE',
+                          lambda i: f'/api/recipes/{ recipe_of(i) }/'
+                                    'favorite/')),
+        Scenario('recipes-in-shopping-cart', 'POST', 'authorized', True,
+                 per_user('POST',
+                          lambda i: f'/api/recipes/{ recipe_of(i) }/'
+                                    'shopping_cart/')),
+        Scenario('recipes-in-shopping-cart', 'DELETE', 'authorized', True,
+                 per_user('DELETE',
+                          lambda i: f'/api/recipes/{ recipe_of(i) }/'
+                                    'shopping_cart/')),
+        Scenario('users-subscribe', 'POST', 'authorized', True,
+                 per_user('POST',
+                          lambda i: f'/api/users/{ author_of(i) }/'
+                                    'subscribe/')),
+        Scenario('users-subscribe', 'DELETE', 'authorized', True,
+                 per_user('DELETE',
+                          lambda i: f'/api/users/{ author_of(i) }/'
+                                    'subscribe/')),
+        *(
+            Scenario(route, method, 'authorized', True,
+                     per_user(method, lambda i, url=url: url,
+                              lambda i, get_id=get_id: {'ids': [
+                                  get_id(i * BULK_SIZE + k)
+                                  for k in range(BULK_SIZE)
+                              ]}))
+            for route, url, get_id in (
+                ('recipes-favorite-bulk', '/api/recipes/favorite/',
+                 recipe_of),
+                ('recipes-shopping-cart-bulk',
+                 '/api/recipes/shopping_cart/', recipe_of),
+                ('users-subscribe-bulk', '/api/users/subscribe/',
+                 author_of),
+            )
+            for method in ('POST', 'DELETE')
+        ),
+        Scenario('users-me', 'PATCH', 'authorized', True,
+                 per_user('PATCH', lambda i: '/api/users/me/',
+                          lambda i: {'first_name': f'Замер { i }'})),
+        Scenario('users-me', 'PUT', 'authorized', True,
+                 per_user('PUT', lambda i: '/api/users/me/',
+                          lambda i: {
+                              'email': ctx.bench_users[i].email,
+                              'username': ctx.bench_users[i].username,
+                              'first_name': 'Нагрузка',
+                              'last_name': 'Замер',
+                          })),
+        Scenario('users-list', 'POST', 'anonymous', True,
+                 lambda: [
+                     Request('POST', '/api/users/', ctx.new_user_data(), None)
+                     for _ in range(requests)
+                 ]),
+        Scenario('users-set-password', 'POST', 'authorized', True,
+                 per_user('POST', lambda i: '/api/users/set_password/',
+                          lambda i: {'current_password': PASSWORD,
+                                     'new_password': PASSWORD})),
+        Scenario('login', 'POST', 'anonymous', True,
+                 lambda: [
+                     Request('POST', '/api/auth/token/login/', {
+                         'email': ctx.bench_users[i].email,
+                         'password': PASSWORD,
+                     }, None)
+                     for i in range(requests)
+                 ]),
+        Scenario('logout', 'POST', 'authorized', True,
+                 per_user('POST', lambda i: '/api/auth/token/logout/')),
+        Scenario('users-me', 'DELETE', 'authorized', True,
+                 after_logout(per_user(
+                     'DELETE', lambda i: '/api/users/me/',
+                     lambda i: {'current_password': PASSWORD}
+                 ))),
+    ]
+
+
+def get_skipped(scenarios):
+    """Маршруты из api/urls.py без сценария и причина."""
+
+    covered = {(scenario.route, scenario.method) for scenario in scenarios}
+    skipped = []
+    for route, method in get_routes():
+        if (route, method) in covered:
+            continue
+        if route.startswith('subscriptions-'):
+            reason = 'действие djoser, дублирует /api/users/'
+        else:
+            reason = SKIPPED.get(route, 'нет сценария')
+        skipped.append({'route': route, 'method': method, 'reason': reason})
+    return skipped
+
+
+def run_scenarios(ctx, scenarios, modes, requests, concurrency,
+                  write_concurrency):
+    """
+    Выполнение сценариев во всех режимах.
+
+    Перед каждым режимом создаются новые пользователи замера: сценарии
+    записи выполняются парами и в конце удаляют своих пользователей.
+    """
+
+    results = []
+    for mode in modes:
+        ctx.create_users(f'{ BENCH_PREFIX }-{ mode }-', requests)
+        for scenario in scenarios:
+            scenario_requests = scenario.prepare()
+            if not scenario_requests:
+                continue
+            scenario_concurrency = (write_concurrency if scenario.writes
+                                    else concurrency)
+            results.append({
+                'route': scenario.route,
+                'method': scenario.method,
+                'variant': scenario.variant,
+                'url': scenario_requests[0].url,
+                'mode': mode,
+                'concurrency': scenario_concurrency,
+                **run(mode, scenario_requests, scenario_concurrency),
+            })
+    return results
+
+
+def get_meta(**params):
+    return {
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'image_workers': settings.IMAGE_WORKERS,
+        **params,
+    }
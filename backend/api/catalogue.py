@@ -0,0 +1,132 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from foodgram.models import Tag
+
+CATALOGUE_VERSION_KEY = 'catalogue_version'
+SERIALIZED_CACHE_SIZE = 1000
+
+_serialized = {}
+_serialized_lock = threading.Lock()
+_tag_ids = (None, {})
+
+
+def get_catalogue_version():
+    """
+    Версия справочников (теги и ингредиенты).
+
+    Версия - время последнего изменения в наносекундах, хранится в общем
+    кеше, поэтому одинакова для всех процессов и не требует запросов к БД.
+    """
+
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+        return cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version(**kwargs):
+    """Смена версии справочников после фиксации транзакции."""
+
+    transaction.on_commit(
+        lambda: cache.set(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+    )
+
+
+def get_tag_ids():
+    """
+    Id тегов по slug.
+
+    Словарь хранится в памяти процесса до смены версии справочников,
+    поэтому фильтр по тегам не обращается к таблице тегов.
+    """
+
+    global _tag_ids
+    version = get_catalogue_version()
+    cached_version, tag_ids = _tag_ids
+    if cached_version != version:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_ids = (version, tag_ids)
+    return tag_ids
+
+
+class CatalogueViewMixin:
+    """
+    Кешируемая выдача справочника.
+
+    Ответ содержит ETag и Last-Modified по версии справочников, на
+    If-None-Match и If-Modified-Since отвечает 304 без обращения к БД.
+    Сериализованные данные хранятся в памяти процесса до смены версии.
+    Справочники общедоступны, поэтому аутентификация отключена: проверка
+    токена потребовала бы запроса к БД.
+    """
+
+    authentication_classes = ()
+
+    def list(self, request, *args, **kwargs):
+        version = get_catalogue_version()
+        response = self.get_not_modified_response(request, version)
+        if response is None:
+            data = self.get_serialized(request, version)
+            if data is None:
+                data = super().list(request, *args, **kwargs).data
+                self.set_serialized(request, version, data)
+            response = Response(data)
+        return self.set_cache_headers(response, version)
+
+    async def alist(self, request, *args, **kwargs):
+        """Асинхронный вариант list: справочник читается асинхронным ORM."""
+
+        version = await sync_to_async(get_catalogue_version)()
+        response = self.get_not_modified_response(request, version)
+        if response is None:
+            data = self.get_serialized(request, version)
+            if data is None:
+                queryset = await sync_to_async(self.filter_queryset)(
+                    self.get_queryset()
+                )
+                data = self.get_serializer(
+                    [obj async for obj in queryset], many=True
+                ).data
+                self.set_serialized(request, version, data)
+            response = Response(data)
+        return self.set_cache_headers(response, version)
+
+    def get_etag(self, version):
+        return f'"{ self.basename }-{ version }"'
+
+    def get_not_modified_response(self, request, version):
+        """Ответ 304, если у клиента актуальная версия справочника."""
+
+        return get_conditional_response(request, self.get_etag(version),
+                                        version // 10 ** 9)
+
+    def get_serialized(self, request, version):
+        cached = _serialized.get((self.basename, request.get_full_path()))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        return None
+
+    def set_serialized(self, request, version, data):
+        with _serialized_lock:
+            if len(_serialized) >= SERIALIZED_CACHE_SIZE:
+                _serialized.clear()
+            _serialized[(self.basename, request.get_full_path())] = (
+                version, data
+            )
+
+    def set_cache_headers(self, response, version):
+        response['ETag'] = self.get_etag(version)
+        response['Last-Modified'] = http_date(version // 10 ** 9)
+        patch_cache_control(response, public=True,
+                            max_age=settings.CATALOGUE_CACHE_MAX_AGE)
+        return response
@@ -0,0 +1,102 @@
+"""
+Журнал изменений рецептов в общем кеше для индексов в памяти процессов.
+
+Запись журнала - id рецептов, измененных в одной транзакции, под
+очередным номером. Каждый процесс помнит номер последней примененной
+записи и при обращении к индексу применяет новые; если записи пропали
+или их слишком много, индекс строится заново.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CHANGES_TIMEOUT = 24 * 60 * 60
+# Больше изменений быстрее применить полной перестройкой индекса.
+MAX_INCREMENTAL_CHANGES = 1000
+
+_pending = threading.local()
+
+
+class ChangeLog:
+    """Журнал изменений с ключами в кеше, начинающимися с prefix."""
+
+    def __init__(self, prefix):
+        self.epoch_key = f'{ prefix }:epoch'
+        self.sequence_key = f'{ prefix }:sequence'
+        self.change_key = f'{ prefix }:change:{{}}'
+
+    def get_epoch(self):
+        """Метка журнала: меняется, если кеш был очищен или сброшен."""
+
+        epoch = cache.get(self.epoch_key)
+        if epoch is None:
+            cache.add(self.epoch_key, time.time_ns(), None)
+            return cache.get(self.epoch_key)
+        return epoch
+
+    def reset(self):
+        """Новая метка журнала: индексы будут построены заново."""
+
+        cache.set(self.epoch_key, time.time_ns(), None)
+
+    def get_sequence(self):
+        return cache.get(self.sequence_key, 0)
+
+    def log(self, recipe_ids):
+        """
+        Запись изменения рецептов в журнал. Если номер записи уже занят
+        (неатомарный incr в файловом кеше), запись помечается пустой, и
+        индексы строятся заново.
+        """
+
+        self.get_epoch()
+        cache.add(self.sequence_key, 0, None)
+        try:
+            sequence = cache.incr(self.sequence_key)
+        except ValueError:
+            cache.add(self.sequence_key, 0, None)
+            sequence = cache.incr(self.sequence_key)
+        key = self.change_key.format(sequence)
+        if not cache.add(key, sorted(recipe_ids), CHANGES_TIMEOUT):
+            cache.set(key, None, CHANGES_TIMEOUT)
+
+    def get_changes(self, start, stop):
+        """
+        Id рецептов из записей журнала (start, stop] или None, если
+        изменений слишком много или часть записей потеряна.
+        """
+
+        if stop - start > MAX_INCREMENTAL_CHANGES:
+            return None
+        keys = [self.change_key.format(sequence)
+                for sequence in range(start + 1, stop + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys) or None in changes.values():
+            return None
+        recipe_ids = set().union(*changes.values())
+        if len(recipe_ids) > MAX_INCREMENTAL_CHANGES:
+            return None
+        return recipe_ids
+
+
+def collect_on_commit(name, recipe_ids, callback):
+    """
+    Вызов callback(recipe_ids) после фиксации транзакции один раз для
+    всех id, собранных под именем name: первый выполненный обработчик
+    забирает все id, остальные ничего не делают. Id из отмененной
+    транзакции передаются со следующей - повторная обработка рецепта
+    ничего не меняет.
+    """
+
+    pending = _pending.__dict__.setdefault(name, set())
+    pending.update(recipe_ids)
+
+    def flush():
+        if pending:
+            changed = set(pending)
+            pending.clear()
+            callback(changed)
+
+    transaction.on_commit(flush)
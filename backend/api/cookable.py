@@ -0,0 +1,282 @@
+"""
+Подбор рецептов по имеющимся ингредиентам ("что приготовить").
+
+Обратный индекс в памяти процесса: для каждого ингредиента хранится
+множество рецептов, в которых он есть. Рецепт задается позицией в
+индексе (рецепты по возрастанию id), множество - битовой картой (целое
+число Python) для частых ингредиентов или отсортированным массивом
+позиций для редких. Битовые операции над целыми числами выполняются в C
+сразу над машинными словами, поэтому объединение множеств и подсчет
+совпадений и недостающих ингредиентов для всех рецептов сразу не требуют
+цикла по рецептам: счетчики хранятся по битам (bit-sliced), k-й бит
+счетчика всех рецептов - одно целое число.
+
+Индекс обновляется по журналу изменений рецептов в кеше. Если записи
+журнала пропали или изменились справочники, индекс строится заново.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+from foodgram.models import RecipeIngredient
+from .catalogue import get_catalogue_version
+from .changelog import ChangeLog, collect_on_commit
+
+# Битовая карта занимает меньше массива позиций (4 байта на рецепт),
+# если ингредиент есть больше чем в 1/32 рецептов.
+DENSE_RATIO = 32
+
+
+def positions_to_bitmap(positions, size):
+    bitmap = bytearray((size + 7) // 8)
+    for position in positions:
+        bitmap[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+def iter_positions(bitmap):
+    """Позиции установленных битов по убыванию."""
+
+    bits = bin(bitmap)[2:]
+    last = len(bits) - 1
+    index = bits.find('1')
+    while index != -1:
+        yield last - index
+        index = bits.find('1', index + 1)
+
+
+def add_bitmap(counter, bitmap):
+    """Прибавление 1 к счетчикам рецептов из bitmap (сумматор по битам)."""
+
+    carry = bitmap
+    for bit, plane in enumerate(counter):
+        if not carry:
+            return
+        counter[bit] = plane ^ carry
+        carry &= plane
+    if carry:
+        counter.append(carry)
+
+
+def subtract(minuend, subtrahend, mask):
+    """Разность счетчиков по битам для рецептов из mask."""
+
+    result = []
+    borrow = 0
+    for bit in range(max(len(minuend), len(subtrahend))):
+        x = minuend[bit] & mask if bit < len(minuend) else 0
+        y = subtrahend[bit] if bit < len(subtrahend) else 0
+        result.append(x ^ y ^ borrow)
+        borrow = (~x & (y | borrow)) | (x & y & borrow)
+    return result
+
+
+def select_equal(counter, value, mask):
+    """Рецепты из mask, у которых счетчик равен value."""
+
+    for bit, plane in enumerate(counter):
+        mask &= plane if value >> bit & 1 else ~plane
+        if not mask:
+            break
+    return mask
+
+
+class CookableResult:
+    """
+    Рецепты, в которых есть хотя бы один из ингредиентов, по возрастанию
+    числа недостающих ингредиентов, затем по убыванию id.
+
+    Последовательность для пагинатора: элементы (id рецепта, совпавшие,
+    недостающие) вычисляются по группам с одинаковым числом недостающих
+    ингредиентов, только до запрошенной страницы.
+    """
+
+    def __init__(self, index, candidates, missing):
+        self.index = index
+        self.candidates = candidates
+        self.missing = missing
+        self.size = bin(candidates).count('1')
+        self.items = []
+        self.groups = self.iter_groups()
+
+    def iter_groups(self):
+        remaining = self.candidates
+        value = 0
+        while remaining:
+            group = select_equal(self.missing, value, remaining)
+            if group:
+                remaining &= ~group
+                yield value, group
+            value += 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        stop = key.stop if isinstance(key, slice) else key + 1
+        while stop is None or len(self.items) < stop:
+            group = next(self.groups, None)
+            if group is None:
+                break
+            missing, bitmap = group
+            self.items.extend(
+                (self.index.recipe_ids[position],
+                 len(self.index.ingredients[position]) - missing,
+                 missing)
+                for position in iter_positions(bitmap)
+            )
+        return self.items[key]
+
+
+class CookableIndex:
+    """Обратный индекс ингредиент -> рецепты."""
+
+    def __init__(self, rows, version=None, sequence=0):
+        """rows - пары (id рецепта, id ингредиента) по возрастанию id."""
+
+        self.version = version
+        self.sequence = sequence
+        self.recipe_ids = []
+        self.positions = {}
+        self.ingredients = []
+        postings = {}
+        for recipe_id, ingredient_id in rows:
+            position = self.positions.get(recipe_id)
+            if position is None:
+                position = self.add_recipe(recipe_id)
+            self.ingredients[position].append(ingredient_id)
+            postings.setdefault(ingredient_id, array('I')).append(position)
+        size = len(self.recipe_ids)
+        self.postings = {
+            ingredient_id: (positions_to_bitmap(positions, size)
+                            if len(positions) * DENSE_RATIO > size
+                            else positions)
+            for ingredient_id, positions in postings.items()
+        }
+        self.totals = []
+        for position, ingredients in enumerate(self.ingredients):
+            self.set_total(position, len(ingredients))
+
+    def add_recipe(self, recipe_id):
+        position = len(self.recipe_ids)
+        self.recipe_ids.append(recipe_id)
+        self.positions[recipe_id] = position
+        self.ingredients.append([])
+        return position
+
+    def set_total(self, position, total):
+        """Запись числа ингредиентов рецепта в счетчик по битам."""
+
+        bit = 1 << position
+        while len(self.totals) < total.bit_length():
+            self.totals.append(0)
+        for index, plane in enumerate(self.totals):
+            if total >> index & 1:
+                self.totals[index] = plane | bit
+            elif plane & bit:
+                self.totals[index] = plane ^ bit
+
+    def get_bitmap(self, ingredient_id):
+        posting = self.postings.get(ingredient_id, 0)
+        if isinstance(posting, int):
+            return posting
+        return positions_to_bitmap(posting, len(self.recipe_ids))
+
+    def change_posting(self, ingredient_id, position, add):
+        posting = self.postings.get(ingredient_id)
+        if posting is None:
+            if add:
+                self.postings[ingredient_id] = array('I', [position])
+        elif isinstance(posting, int):
+            bit = 1 << position
+            self.postings[ingredient_id] = (posting | bit if add
+                                            else posting & ~bit)
+        elif add:
+            insort(posting, position)
+        else:
+            index = bisect_left(posting, position)
+            if index < len(posting) and posting[index] == position:
+                del posting[index]
+
+    def apply(self, recipes):
+        """
+        Учет изменений: recipes - словарь {id рецепта: id ингредиентов},
+        пустое множество у удаленного рецепта.
+        """
+
+        for recipe_id, ingredients in recipes.items():
+            position = self.positions.get(recipe_id)
+            if position is None:
+                if not ingredients:
+                    continue
+                position = self.add_recipe(recipe_id)
+            old = set(self.ingredients[position])
+            for ingredient_id in old - ingredients:
+                self.change_posting(ingredient_id, position, add=False)
+            for ingredient_id in ingredients - old:
+                self.change_posting(ingredient_id, position, add=True)
+            self.ingredients[position] = list(ingredients)
+            self.set_total(position, len(ingredients))
+
+    def search(self, ingredient_ids):
+        """Рецепты с ингредиентами ingredient_ids (CookableResult)."""
+
+        candidates = 0
+        matched = []
+        for ingredient_id in set(ingredient_ids):
+            bitmap = self.get_bitmap(ingredient_id)
+            candidates |= bitmap
+            add_bitmap(matched, bitmap)
+        return CookableResult(self, candidates,
+                              subtract(self.totals, matched, candidates))
+
+
+_index = None
+_index_lock = threading.Lock()
+changelog = ChangeLog('cookable')
+
+
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Запись в журнал после фиксации изменения рецепта."""
+
+    collect_on_commit('cookable', [getattr(instance, 'recipe_id',
+                                           instance.pk)], changelog.log)
+
+
+def build_index(version, sequence):
+    return CookableIndex(
+        RecipeIngredient.objects.order_by('recipe_id', 'ingredient_id')
+        .values_list('recipe_id', 'ingredient_id').iterator(),
+        version=version,
+        sequence=sequence,
+    )
+
+
+def get_cookable_index():
+    """
+    Индекс, актуальный на момент вызова: при первом обращении и смене
+    справочников строится заново, иначе применяются записи журнала.
+    """
+
+    global _index
+    version = (get_catalogue_version(), changelog.get_epoch())
+    sequence = changelog.get_sequence()
+    with _index_lock:
+        if (_index is None or _index.version != version
+                or _index.sequence > sequence):
+            _index = build_index(version, sequence)
+        elif _index.sequence < sequence:
+            recipe_ids = changelog.get_changes(_index.sequence, sequence)
+            if recipe_ids is None:
+                _index = build_index(version, sequence)
+            else:
+                recipes = {recipe_id: set() for recipe_id in recipe_ids}
+                for recipe_id, ingredient_id in (
+                    RecipeIngredient.objects.filter(
+                        recipe_id__in=recipe_ids
+                    ).values_list('recipe_id', 'ingredient_id')
+                ):
+                    recipes[recipe_id].add(ingredient_id)
+                _index.apply(recipes)
+                _index.sequence = sequence
+    return _index
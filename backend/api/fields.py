@@ -1,16 +1,81 @@
 import base64
+import binascii
 
 from django.core.files.base import ContentFile
+from PIL import Image
 from rest_framework import serializers
 
+from foodgram.images import get_rendition_url
+
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для фотографий блюд."""
+    """
+    Сериализатор для фотографий блюд.
+
+    Декодирование base64 и проверка формата выполняются при запросе:
+    фото сохраняется вместе с рецептом, а на битое фото сразу
+    возвращается ошибка. Pillow читает только заголовок файла, полное
+    декодирование и сжатие выполняются в фоне при подготовке
+    уменьшенных копий.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                content = base64.b64decode(imgstr)
+            except binascii.Error:
+                self.fail('invalid_image')
+            data = ContentFile(content, name='temp.' + ext)
+
+        file = serializers.FileField.to_internal_value(self, data)
+        try:
+            Image.open(file)
+        except Exception:
+            self.fail('invalid_image')
+        file.seek(0)
+        return file
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Фото рецепта в ответах API.
+
+    Возвращает адрес уменьшенной копии размера из контекста
+    сериализатора или заданного по умолчанию, а пока копии
+    не готовы — адрес исходного фото.
+    """
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        size = self.context.get('image_size', self.size)
+        url = get_rendition_url(value.instance, size)
+        if url is None:
+            return super().to_representation(value)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class RelatedIdsField(serializers.Field):
+    """
+    Список id связанных объектов вместо вложенных объектов.
+
+    source - строки промежуточной модели, attname - поле с id объекта,
+    поэтому таблица самих объектов не читается.
+    """
+
+    def __init__(self, attname, **kwargs):
+        self.attname = attname
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
 
-        return super().to_internal_value(data)
+    def to_representation(self, value):
+        return [getattr(item, self.attname) for item in value]
@@ -1,27 +1,65 @@
-from django_filters import (CharFilter, FilterSet, ModelMultipleChoiceFilter,
-                            TypedChoiceFilter)
+from django.db.models import Exists, OuterRef
+from django_filters import (CharFilter, ChoiceFilter, FilterSet,
+                            MultipleChoiceFilter, TypedChoiceFilter)
 
-from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.models import Ingredient, Recipe, RecipeTag
+from .catalogue import get_tag_ids
+from .search import search_ingredients, search_recipes
 
 BOOLEAN_CHOICES = ((0, False), (1, True),)
+TAGS_MODE_CHOICES = (('any', 'any'), ('all', 'all'))
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
 
 
 class RecipeFilter(FilterSet):
     """Фильтры для рецептов."""
 
     author = CharFilter(field_name='author__id', lookup_expr='exact')
-    tags = ModelMultipleChoiceFilter(field_name='tags__slug',
-                                     to_field_name='slug',
-                                     queryset=Tag.objects.all(),)
+    tags = MultipleChoiceFilter(choices=get_tag_choices,
+                                method='filter_tags')
+    tags_mode = ChoiceFilter(choices=TAGS_MODE_CHOICES,
+                             method='filter_tags_mode')
     is_favorited = TypedChoiceFilter(choices=BOOLEAN_CHOICES,
                                      method='filter_is_favorited')
     is_in_shopping_cart = TypedChoiceFilter(choices=BOOLEAN_CHOICES,
                                             method='filter_in_shopping_cart')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ['author', 'tags']
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтрация по тегам: рецепты хотя бы с одним из тегов или, с
+        ?tags_mode=all, со всеми тегами.
+
+        Условие EXISTS вместо соединения с тегами рецептов не размножает
+        строки, поэтому DISTINCT и COUNT(DISTINCT) не нужны.
+        """
+
+        tag_ids = get_tag_ids()
+        ids = sorted({tag_ids[slug] for slug in value if slug in tag_ids})
+        if not ids:
+            return queryset
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag_id in ids:
+                queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                    recipe=OuterRef('pk'), tag_id=tag_id,
+                )))
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=ids,
+        )))
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим фильтра по тегам, применяется в filter_tags."""
+
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
         """Фильтрация по наличию в избранном."""
 
@@ -38,12 +76,22 @@ class RecipeFilter(FilterSet):
             return queryset.filter(in_shopping_cart=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам."""
+
+        return search_recipes(queryset, value)
+
 
 class IngredientFilter(FilterSet):
     """Фильтр для ингредиентов."""
 
-    name = CharFilter(field_name='name', lookup_expr='istartswith')
+    name = CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ['name', ]
+
+    def filter_name(self, queryset, name, value):
+        """Поиск по названию с ранжированием: сначала по началу слова."""
+
+        return search_ingredients(queryset, value)
@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.benchmark import (MODES, BenchContext, get_meta, get_scenarios,
+                           get_skipped, run_scenarios)
+from foodgram import seed
+from foodgram.images import get_executor
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер всех маршрутов API на временной базе с '
+            'тестовыми данными: запросы в секунду, задержки p50/p95/p99, '
+            'запросы к базе и размер ответа.')
+
+    def add_arguments(self, parser):
+        data = parser.add_argument_group('тестовые данные')
+        data.add_argument('--seed', type=int, default=42)
+        data.add_argument('--users', type=int, default=seed.USERS_COUNT)
+        data.add_argument('--recipes', type=int, default=seed.RECIPES_COUNT)
+        data.add_argument('--ingredients-per-recipe', type=int,
+                          default=seed.INGREDIENTS_PER_RECIPE)
+        data.add_argument('--favorites-per-user', type=int,
+                          default=seed.FAVORITES_PER_USER)
+        data.add_argument('--cart-users', type=int,
+                          default=seed.CART_USERS_COUNT)
+        data.add_argument('--cart-size', type=int, default=seed.CART_SIZE)
+        data.add_argument('--subscriptions', type=int,
+                          default=seed.SUBSCRIPTIONS_COUNT)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Количество запросов в каждом сценарии.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Количество одновременных запросов.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=(*MODES, 'both'),
+            default='wsgi',
+            help='Синхронные представления (wsgi), асинхронные (asgi) '
+                 'или оба режима по очереди.',
+        )
+        parser.add_argument(
+            '--routes',
+            nargs='+',
+            help='Замерять только маршруты с этими именами '
+                 '(например, recipes-list).',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в JSON.',
+        )
+        parser.add_argument(
+            '--label',
+            help='Метка прогона в JSON, например хеш коммита.',
+        )
+
+    def get_scenarios(self, ctx, options):
+        scenarios = get_scenarios(ctx, options['requests'])
+        if options['routes']:
+            unknown = set(options['routes']) - {
+                scenario.route for scenario in scenarios
+            }
+            if unknown:
+                raise CommandError(
+                    f'Нет сценариев для маршрутов: {", ".join(unknown)}.'
+                )
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.route in options['routes']]
+        return scenarios
+
+    def bench(self, options):
+        seed.seed_database(
+            seed=options['seed'],
+            users_count=options['users'],
+            recipes_count=options['recipes'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites_per_user=options['favorites_per_user'],
+            cart_users_count=options['cart_users'],
+            cart_size=options['cart_size'],
+            subscriptions_count=options['subscriptions'],
+        )
+        ctx = BenchContext()
+        scenarios = self.get_scenarios(ctx, options)
+        # SQLite не допускает одновременной записи из нескольких потоков.
+        write_concurrency = (1 if connection.vendor == 'sqlite'
+                             else options['concurrency'])
+        modes = MODES if options['mode'] == 'both' else (options['mode'],)
+        results = run_scenarios(ctx, scenarios, modes, options['requests'],
+                                options['concurrency'], write_concurrency)
+        return scenarios, results
+
+    def handle(self, *args, **options):
+        for option in ('requests', 'concurrency', 'users', 'recipes'):
+            if options[option] < 1:
+                raise CommandError(f'--{ option } должно быть больше нуля.')
+        temp_dir = tempfile.mkdtemp()
+        caches = {
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'bench-{ alias }',
+            }
+            for alias in settings.CACHES
+        }
+        overrides = {}
+        if connection.vendor == 'sqlite':
+            # Тестовая база SQLite по умолчанию в памяти с общим кешем,
+            # который блокирует таблицы при обращении из разных потоков, а
+            # фоновые потоки с копиями фото мешали бы записи в API.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                temp_dir, 'bench.sqlite3'
+            )
+            overrides['IMAGE_WORKERS'] = 0
+        # Замер идет на отдельной тестовой базе, с отдельными кешами и
+        # каталогом для файлов, чтобы не затронуть рабочие данные.
+        with override_settings(
+            CACHES=caches,
+            MEDIA_ROOT=os.path.join(temp_dir, 'media'),
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            **overrides,
+        ):
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                meta = get_meta(**{
+                    key: options[key]
+                    for key in ('label', 'seed', 'users', 'recipes',
+                                'ingredients_per_recipe',
+                                'favorites_per_user', 'cart_users',
+                                'cart_size', 'subscriptions', 'requests',
+                                'concurrency', 'mode')
+                })
+                scenarios, results = self.bench(options)
+            finally:
+                if settings.IMAGE_WORKERS:
+                    get_executor().shutdown(wait=True)
+                    get_executor.cache_clear()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.write_table(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'meta': meta,
+                    'results': results,
+                    'skipped': get_skipped(scenarios),
+                }, output, ensure_ascii=False, indent=2)
+
+    def write_table(self, results):
+        self.stdout.write(
+            f'{"маршрут":<32} {"метод":<6} {"режим":<5} {"rps":>7} '
+            f'{"p50":>7} {"p95":>7} {"p99":>7} {"SQL":>6} {"байт":>8} '
+            f'{"ошибки":>6}'
+        )
+        for result in results:
+            route = f'{result["route"]} ({result["variant"][:4]})'
+            self.stdout.write(
+                f'{route[:32]:<32} {result["method"]:<6} '
+                f'{result["mode"]:<5} {result["rps"]:>7} '
+                f'{result["p50_ms"]:>7} {result["p95_ms"]:>7} '
+                f'{result["p99_ms"]:>7} '
+                f'{result["queries_per_request"]:>6} '
+                f'{result["bytes_per_response"]:>8} {result["errors"]:>6}'
+            )
@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.shopping_cart import get_cart_queryset
+from api.views import (CustomUserView, IngredientsViewSet, RecipeViewSet,
+                       SubscriptionView, TagViewSet)
+from foodgram.models import Recipe, ShoppingCartIngredient
+
+User = get_user_model()
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = 'Планы выполнения (EXPLAIN) основных запросов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого строятся запросы. '
+                 'По умолчанию - пользователь с самым большим '
+                 'списком покупок.',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Выполнить запросы (EXPLAIN ANALYZE, только PostgreSQL).',
+        )
+
+    def get_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {email} не найден.')
+        user_id = ShoppingCartIngredient.objects.values_list(
+            'user_id', flat=True
+        ).first()
+        user = User.objects.filter(id=user_id).first() or User.objects.first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def get_view_queryset(self, viewset, url, user, action='list', **kwargs):
+        """Queryset представления с фильтрами для указанного URL."""
+
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=user)
+        view = viewset(action_map={'get': action})
+        view.args = ()
+        view.kwargs = kwargs
+        view.format_kwarg = None
+        view.request = view.initialize_request(request)
+        return view.filter_queryset(view.get_queryset())
+
+    def get_queries(self, user):
+        recipe = Recipe.objects.first()
+        tag_slugs = '&'.join(
+            f'tags={slug}'
+            for slug in TagViewSet.queryset.values_list('slug', flat=True)[:2]
+        )
+        recipes = self.get_view_queryset(RecipeViewSet, '/api/recipes/', user)
+        subscriptions = self.get_view_queryset(
+            SubscriptionView, '/api/users/subscriptions/', user
+        )
+        return {
+            'recipes-list': recipes[:PAGE_SIZE],
+            'recipes-list ?ordering=popular': self.get_view_queryset(
+                RecipeViewSet, '/api/recipes/?ordering=popular', user
+            )[:PAGE_SIZE],
+            'recipes-list ?tags': self.get_view_queryset(
+                RecipeViewSet, f'/api/recipes/?{tag_slugs}', user
+            )[:PAGE_SIZE],
+            'recipes-list ?tags_mode=all': self.get_view_queryset(
+                RecipeViewSet, f'/api/recipes/?{tag_slugs}&tags_mode=all',
+                user
+            )[:PAGE_SIZE],
+            'recipes-list ?author': self.get_view_queryset(
+                RecipeViewSet, f'/api/recipes/?author={user.id}', user
+            )[:PAGE_SIZE],
+            'recipes-list ?is_favorited': self.get_view_queryset(
+                RecipeViewSet, '/api/recipes/?is_favorited=1', user
+            )[:PAGE_SIZE],
+            'recipes-list ?is_in_shopping_cart': self.get_view_queryset(
+                RecipeViewSet, '/api/recipes/?is_in_shopping_cart=1', user
+            )[:PAGE_SIZE],
+            'recipes-detail': recipes.filter(pk=recipe.pk if recipe else 0),
+            'recipes-download-shopping-cart': get_cart_queryset(user),
+            'ingredients-list ?name': self.get_view_queryset(
+                IngredientsViewSet, '/api/ingredients/?name=мол', user
+            ),
+            'tags-list': self.get_view_queryset(TagViewSet, '/api/tags/',
+                                                user),
+            'tags-by-slug': TagViewSet.queryset.filter(slug='breakfast'),
+            'subscriptions-list': subscriptions[:PAGE_SIZE],
+            'users-list': self.get_view_queryset(
+                CustomUserView, '/api/users/', user
+            )[:PAGE_SIZE],
+            'favorite-exists': Recipe.favorited.through.objects.filter(
+                recipe=recipe, user=user
+            ),
+            'shopping-cart-exists': (
+                Recipe.in_shopping_cart.through.objects.filter(
+                    recipe=recipe, user=user
+                )
+            ),
+            'subscribe-exists': User.subscriptions.through.objects.filter(
+                from_user=user, to_user=recipe.author if recipe else user
+            ),
+        }
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze поддерживается только в '
+                               'PostgreSQL.')
+        explain_options = {}
+        if options['analyze']:
+            explain_options = {'analyze': True, 'buffers': True}
+        user = self.get_user(options['user'])
+        for name, queryset in self.get_queries(user).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,21 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.response_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Счетчики попаданий и промахов кеша рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счетчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(get_stats()))
+        if options['reset']:
+            reset_stats()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = ('Пересчет поисковых векторов всех рецептов (PostgreSQL), '
+            'например после загрузки рецептов в обход ORM.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, обновляемых одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Поисковые векторы есть только в PostgreSQL, '
+                              'в других СУБД используется индекс в памяти.')
+            return
+        update_search_vectors(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Поисковые векторы обновлены.'))
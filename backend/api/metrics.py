@@ -0,0 +1,217 @@
+"""
+Метрики запросов к API.
+
+Статистика текущего запроса (запросы к базе, время сериализации) хранится
+в contextvar, поэтому учитываются и запросы, выполненные через
+sync_to_async в асинхронных представлениях. Накопленные метрики хранятся
+в памяти процесса и отдаются в текстовом формате Prometheus.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+# Границы корзин гистограммы времени ответа, в секундах.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                    10)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Статистика одного запроса."""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.db_time = 0
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def get_duplicates(self):
+        """Одинаковые SQL-запросы (с разными параметрами) - признак N+1."""
+
+        return [{'sql': sql, 'count': count}
+                for sql, count in self.queries.most_common() if count > 1]
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries[sql] += 1
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    """Подключение record_query к соединениям с базой."""
+
+    for wrapper in [connection] if connection else connections.all():
+        if record_query not in wrapper.execute_wrappers:
+            wrapper.execute_wrappers.append(record_query)
+
+
+def timed_data(data):
+    """Учет времени сериализации: BaseSerializer.data верхнего уровня."""
+
+    def wrapper(serializer):
+        stats = current_stats.get()
+        if stats is None:
+            return data(serializer)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            stats.serializer_depth -= 1
+            if not stats.serializer_depth:
+                stats.serializer_time += time.perf_counter() - start
+
+    wrapper.timed = True
+    return wrapper
+
+
+def install():
+    """
+    Подключение учета запросов к базе и времени сериализации.
+    record_query подключается к открытым соединениям и к новым при их
+    создании, вне запросов с метриками он только проверяет contextvar.
+    """
+
+    install_query_wrapper()
+    connection_created.connect(install_query_wrapper)
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = property(timed_data(BaseSerializer.data.fget))
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Метрики процесса по представлениям (имя маршрута и метод)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.requests = Counter()
+        self.totals = defaultdict(Counter)
+
+    def observe(self, view, method, status, duration, stats, size):
+        labels = (view, method)
+        with self.lock:
+            self.durations[labels].observe(duration)
+            self.requests[(view, method, str(status))] += 1
+            self.totals['db_queries'][labels] += stats.query_count
+            self.totals['db_duration_seconds'][labels] += stats.db_time
+            self.totals['serializer_duration_seconds'][labels] += (
+                stats.serializer_time
+            )
+            self.totals['duplicate_queries'][labels] += sum(
+                item['count'] for item in stats.get_duplicates()
+            )
+            if size is not None:
+                self.totals['response_bytes'][labels] += size
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP foodgram_request_duration_seconds '
+                'Время обработки запроса.',
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for (view, method), histogram in sorted(self.durations.items()):
+                labels = format_labels(view=view, method=method)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(
+                        'foodgram_request_duration_seconds_bucket'
+                        f'{{{labels},le="{bound}"}} {count}'
+                    )
+                lines += [
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{{labels},le="+Inf"}} {histogram.count}',
+                    'foodgram_request_duration_seconds_sum'
+                    f'{{{labels}}} {histogram.sum}',
+                    'foodgram_request_duration_seconds_count'
+                    f'{{{labels}}} {histogram.count}',
+                ]
+            lines += [
+                '# HELP foodgram_requests_total Количество запросов.',
+                '# TYPE foodgram_requests_total counter',
+            ]
+            for (view, method, status), count in sorted(
+                self.requests.items()
+            ):
+                labels = format_labels(view=view, method=method,
+                                       status=status)
+                lines.append(f'foodgram_requests_total{{{labels}}} {count}')
+            for name, totals in sorted(self.totals.items()):
+                lines += [
+                    f'# HELP foodgram_{ name }_total { TOTALS_HELP[name] }',
+                    f'# TYPE foodgram_{ name }_total counter',
+                ]
+                for (view, method), value in sorted(totals.items()):
+                    labels = format_labels(view=view, method=method)
+                    lines.append(
+                        f'foodgram_{ name }_total{{{labels}}} {value}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+TOTALS_HELP = {
+    'db_queries': 'Количество SQL-запросов.',
+    'db_duration_seconds': 'Время выполнения SQL-запросов.',
+    'serializer_duration_seconds': 'Время сериализации ответов.',
+    'duplicate_queries': 'Повторяющиеся SQL-запросы (признак N+1).',
+    'response_bytes': 'Размер ответов.',
+}
+
+
+def format_labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'),
+        )
+        for name, value in labels.items()
+    )
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(),
+                        content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import logging
+import time
+
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import RequestStats, current_stats, install, registry
+
+logger = logging.getLogger(__name__)
+
+METRICS_VIEW = 'metrics'
+# Сколько повторяющихся запросов попадает в лог.
+LOGGED_DUPLICATES = 5
+LOGGED_SQL_LENGTH = 300
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name
+
+
+def finish(request, response, stats, duration):
+    """Учет запроса в метриках процесса и запись в лог в JSON."""
+
+    view = get_view_name(request)
+    if view == METRICS_VIEW:
+        return
+    size = None if response.streaming else len(response.content)
+    registry.observe(view, request.method, response.status_code, duration,
+                     stats, size)
+    duplicates = stats.get_duplicates()
+    record = {
+        'view': view,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'db_queries': stats.query_count,
+        'db_ms': round(stats.db_time * 1000, 2),
+        'serializer_ms': round(stats.serializer_time * 1000, 2),
+        'response_bytes': size,
+        'duplicate_queries': [
+            {'sql': item['sql'][:LOGGED_SQL_LENGTH], 'count': item['count']}
+            for item in duplicates[:LOGGED_DUPLICATES]
+        ],
+    }
+    logger.log(logging.WARNING if duplicates else logging.INFO,
+               json.dumps(record, ensure_ascii=False))
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Время ответа, количество и время запросов к базе, время сериализации
+    и размер ответа для каждого запроса. Включается настройкой
+    REQUEST_METRICS.
+    """
+
+    install()
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats = RequestStats()
+            token = current_stats.set(stats)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                current_stats.reset(token)
+            finish(request, response, stats, time.perf_counter() - start)
+            return response
+    else:
+        def middleware(request):
+            stats = RequestStats()
+            token = current_stats.set(stats)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                current_stats.reset(token)
+            finish(request, response, stats, time.perf_counter() - start)
+            return response
+
+    return middleware
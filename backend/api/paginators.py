@@ -1,7 +1,218 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Пагинация по ключу (курсору) для бесконечной прокрутки.
+
+    Страница выбирается условием по полям сортировки последней записи
+    предыдущей страницы, без OFFSET, поэтому время выборки не зависит от
+    глубины. Общее количество считается, только если передан `?count=1`.
+    Поля сортировки берутся из атрибута `keyset_ordering` представления.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-pk',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = queryset.count()
+        return self.set_page(
+            list(self.get_page_queryset(queryset, request, view))
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset."""
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = await queryset.acount()
+        return self.set_page([
+            obj async for obj
+            in self.get_page_queryset(queryset, request, view)
+        ])
+
+    def get_page_queryset(self, queryset, request, view):
+        """Выборка страницы с одной лишней записью для ссылки next."""
+
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, page):
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_keyset_filter(self, values):
+        """Условие "после записи с такими значениями полей сортировки"."""
+
+        result = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            result |= equal & Q(**{f'{ name }__{ lookup }': value})
+            equal &= Q(**{name: value})
+        return result
+
+    def encode_cursor(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            values.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, request, queryset):
+        """
+        Значения полей сортировки из курсора, приведенные к типам полей
+        модели или аннотаций выборки.
+        """
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound('Неверный курсор.')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Неверный курсор.')
+        result = []
+        for field, value in zip(self.ordering, values):
+            try:
+                value = self.get_ordering_field(
+                    queryset, field.lstrip('-')
+                ).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound('Неверный курсор.')
+            if value is None:
+                raise NotFound('Неверный курсор.')
+            result.append(value)
+        return result
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        """Поле модели или аннотации выборки с таким именем."""
+
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last),
+        )
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
 
 
 class CustomPaginator(PageNumberPagination):
-    """Кастомный пагинатор для подписок."""
+    """
+    Кастомный пагинатор для подписок.
+
+    С параметром `?pagination=cursor` использует пагинацию по ключу.
+    """
+
+    page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPaginator()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Асинхронный вариант paginate_queryset.
+
+        Количество и записи страницы выбираются асинхронным ORM,
+        остальное как в PageNumberPagination.
+        """
+
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPaginator()
+            return await self.keyset.apaginate_queryset(queryset, request,
+                                                        view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        self.request = request
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RankedPaginator(PageNumberPagination):
+    """
+    Пагинатор выдач, упорядоченных по рангу: подбор рецептов по
+    ингредиентам и рекомендации.
+
+    Ранг вычисляется для выдачи целиком (результаты индекса в памяти,
+    агрегат в запросе), поэтому пагинация по ключу не поддерживается.
+    """
 
+    page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
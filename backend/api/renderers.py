@@ -0,0 +1,49 @@
+import json
+
+from rest_framework import renderers
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """
+    Базовый рендерер для выгрузки списка покупок.
+
+    Сам файл отдается потоком из представления, рендерер нужен для
+    выбора формата по `?format=` или заголовку Accept и для вывода ошибок.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # У двоичных форматов charset нет, ошибки все равно в UTF-8.
+        return json.dumps(data, ensure_ascii=False).encode(
+            self.charset or 'utf-8'
+        )
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+SHOPPING_CART_RENDERERS = (
+    ShoppingCartTxtRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartJSONRenderer,
+    ShoppingCartPDFRenderer,
+)
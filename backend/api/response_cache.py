@@ -0,0 +1,227 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .catalogue import get_catalogue_version
+
+RECIPES_CACHE_ALIAS = 'recipes'
+GENERATION_KEY = 'recipes:generation'
+LIST_GENERATION_KEY = 'recipes:list_generation'
+DETAIL_GENERATION_KEY = 'recipes:detail_generation:{}'
+HITS_KEY = 'recipes:hits'
+MISSES_KEY = 'recipes:misses'
+
+# Параметры, от которых зависит ответ для анонимного пользователя.
+# Запросы с другими параметрами в кеш не попадают.
+LIST_PARAMS = ('tags', 'tags_mode', 'author', 'page', 'limit',
+               'pagination', 'cursor', 'count', 'image_size', 'ordering',
+               'search', 'fields', 'expand')
+DETAIL_PARAMS = ('image_size', 'fields', 'expand')
+USER_NAME_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def get_recipes_cache():
+    return caches[RECIPES_CACHE_ALIAS]
+
+
+def get_generation(key):
+    """
+    Поколение кеша: меняется при изменении данных.
+
+    Начальное значение - текущее время в наносекундах: если ключ
+    поколения вытеснен из кеша, новое поколение не совпадет ни с одним
+    прежним, и ответы под старыми ключами не будут отданы.
+    """
+
+    cache = get_recipes_cache()
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
+    return generation
+
+
+def bump_generation(*keys):
+    """Смена поколений после фиксации транзакции."""
+
+    def bump():
+        cache = get_recipes_cache()
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def count(key):
+    """Счетчик в общем кеше, где он не вытесняется страницами ответов."""
+
+    try:
+        default_cache.incr(key)
+    except ValueError:
+        default_cache.add(key, 0, None)
+        default_cache.incr(key)
+
+
+def get_params_hash(params, allowed):
+    """
+    Хеш нормализованных параметров запроса.
+
+    None - если в запросе есть параметры не из allowed.
+    """
+
+    if set(params) - set(allowed):
+        return None
+    normalized = '&'.join(
+        f'{ name }={ ",".join(sorted(set(params.getlist(name)))) }'
+        for name in allowed if name in params
+    )
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
+def get_list_cache_key(request):
+    """
+    Ключ кеша для списка рецептов.
+
+    Учитываются только нормализованные фильтры и параметры пагинации,
+    None - если в запросе есть параметры, не влияющие на ключ.
+    """
+
+    params_hash = get_params_hash(request.query_params, LIST_PARAMS)
+    if params_hash is None:
+        return None
+    return ':'.join((
+        'recipes:list',
+        str(get_catalogue_version()),
+        str(get_generation(GENERATION_KEY)),
+        str(get_generation(LIST_GENERATION_KEY)),
+        request.get_host(),
+        params_hash,
+    ))
+
+
+def get_detail_cache_key(request, pk):
+    """Ключ кеша для рецепта."""
+
+    params_hash = get_params_hash(request.query_params, DETAIL_PARAMS)
+    if params_hash is None:
+        return None
+    return ':'.join((
+        'recipes:detail',
+        str(get_catalogue_version()),
+        str(get_generation(GENERATION_KEY)),
+        str(get_generation(DETAIL_GENERATION_KEY.format(pk))),
+        request.get_host(),
+        str(pk),
+        params_hash,
+    ))
+
+
+def get_cached_data(key):
+    """Данные ответа из кеша с учетом попадания или промаха."""
+
+    data = get_recipes_cache().get(key)
+    count(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def cache_response(key, response):
+    """Сохранение успешного ответа в кеш."""
+
+    if response.status_code == 200:
+        get_recipes_cache().set(key, response.data,
+                                settings.RECIPES_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def get_hit_response(data):
+    response = Response(data)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cached_response(request, key, view):
+    """
+    Ответ из кеша для анонимного пользователя.
+
+    При промахе вызывается view, успешный ответ сохраняется в кеш.
+    """
+
+    if key is None or request.user.is_authenticated:
+        return view()
+    data = get_cached_data(key)
+    if data is not None:
+        return get_hit_response(data)
+    return cache_response(key, view())
+
+
+async def acached_response(request, get_key, view, *args):
+    """
+    Асинхронный вариант cached_response.
+
+    Ключ get_key(request, *args) вычисляется и читается из кеша в одном
+    потоке, view - корутинная функция без аргументов.
+    """
+
+    if request.user.is_authenticated:
+        return await view()
+
+    def lookup():
+        key = get_key(request, *args)
+        return key, None if key is None else get_cached_data(key)
+
+    key, data = await sync_to_async(lookup)()
+    if data is not None:
+        return get_hit_response(data)
+    response = await view()
+    if key is None:
+        return response
+    return await sync_to_async(cache_response)(key, response)
+
+
+def get_stats():
+    """Счетчики попаданий и промахов кеша."""
+
+    hits = default_cache.get(HITS_KEY, 0)
+    misses = default_cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'timeout': settings.RECIPES_CACHE_TIMEOUT,
+    }
+
+
+def reset_stats():
+    default_cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def invalidate_recipe(sender, instance, **kwargs):
+    """Сброс кеша рецепта и списков при изменении рецепта."""
+
+    bump_generation(LIST_GENERATION_KEY,
+                    DETAIL_GENERATION_KEY.format(instance.pk))
+
+
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    """Сброс кеша при изменении тегов и ингредиентов рецепта."""
+
+    bump_generation(LIST_GENERATION_KEY,
+                    DETAIL_GENERATION_KEY.format(instance.recipe_id))
+
+
+def invalidate_author(sender, instance, update_fields=None, **kwargs):
+    """Сброс всего кеша при изменении имени или почты пользователя."""
+
+    if update_fields is None or USER_NAME_FIELDS & set(update_fields):
+        bump_generation(GENERATION_KEY)
@@ -0,0 +1,487 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector,
+                                            TrigramWordSimilarity)
+from django.db import connection, transaction
+from django.db.models import (Case, F, FloatField, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+from .catalogue import get_catalogue_version
+from .changelog import ChangeLog, collect_on_commit
+
+TRIGRAM_THRESHOLD = 0.4
+TYPO_RESULTS_LIMIT = 20
+
+SEARCH_CONFIG = 'russian'
+# Поля, от которых зависит поиск: сохранение с update_fields без них
+# поиск не обновляет.
+SEARCH_FIELDS = {
+    Recipe: {'name', 'text'},
+    RecipeIngredient: {'ingredient', 'ingredient_id'},
+}
+# Сколько лучших рецептов возвращает поиск по индексу в памяти.
+RECIPE_SEARCH_LIMIT = 500
+# Веса полей рецепта, как у весов A, B и C в ts_rank PostgreSQL.
+RECIPE_FIELD_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+WORD = re.compile(r'\w+')
+# Окончания для упрощенного выделения основы русских слов, длинные
+# проверяются первыми.
+ENDINGS = sorted(
+    ('иями', 'ями', 'ами', 'иях', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+     'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ых', 'их',
+     'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'ию', 'ью',
+     'ия', 'ья', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'),
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+# Служебные слова не индексируются, как в словаре russian PostgreSQL.
+STOP_WORDS = frozenset((
+    'а', 'без', 'в', 'во', 'для', 'до', 'за', 'и', 'из', 'или', 'к', 'ко',
+    'на', 'не', 'но', 'о', 'об', 'от', 'по', 'при', 'с', 'со', 'у',
+))
+STEM_CACHE_SIZE = 2 ** 17
+
+
+def get_trigrams(word):
+    """Триграммы слова в духе pg_trgm: с пробелами по краям."""
+
+    word = f'  {word} '
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class IngredientIndex:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Префиксы ищутся двоичным поиском по отсортированным названиям,
+    вхождения - перебором (справочник небольшой), опечатки - по
+    совпадению триграмм слов названия.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.names = sorted((name.lower(), pk) for pk, name in rows)
+        self.keys = [name for name, _ in self.names]
+        self.trigrams = {}
+        self.word_trigrams = {}
+        for name, pk in self.names:
+            words = [get_trigrams(word) for word in name.split()]
+            self.word_trigrams[pk] = words
+            for trigram in set().union(*words):
+                self.trigrams.setdefault(trigram, []).append(pk)
+
+    def prefix(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        result = []
+        for name, pk in self.names[start:]:
+            if not name.startswith(query):
+                break
+            result.append(pk)
+        return result
+
+    def infix(self, query):
+        matches = []
+        for name, pk in self.names:
+            position = name.find(query)
+            if position > 0:
+                matches.append((position, name, pk))
+        return [pk for _, _, pk in sorted(matches)]
+
+    def similar(self, query, exclude):
+        query_trigrams = get_trigrams(query)
+        candidates = Counter(
+            pk
+            for trigram in query_trigrams
+            for pk in self.trigrams.get(trigram, ())
+        )
+        scored = []
+        for pk in candidates:
+            if pk in exclude:
+                continue
+            score = max(
+                len(query_trigrams & word) / len(query_trigrams | word)
+                for word in self.word_trigrams[pk]
+            )
+            if score >= TRIGRAM_THRESHOLD:
+                scored.append((-score, pk))
+        return [pk for _, pk in sorted(scored)[:TYPO_RESULTS_LIMIT]]
+
+    def search(self, query):
+        """Идентификаторы ингредиентов в порядке релевантности."""
+
+        query = query.strip().lower()
+        if not query:
+            return []
+        result = self.prefix(query) + self.infix(query)
+        return result + self.similar(query, set(result))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Индекс ингредиентов, построенный при первом обращении.
+
+    Индекс перестраивается, когда меняется версия справочников.
+    """
+
+    global _index
+    version = get_catalogue_version()
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = IngredientIndex(
+                Ingredient.objects.values_list('id', 'name'),
+                version=version,
+            )
+    return _index
+
+
+def invalidate_ingredient_index():
+    """Сброс индекса ингредиентов в текущем процессе."""
+
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def search_ingredients(queryset, query):
+    """
+    Поиск ингредиентов по началу, вхождению и с опечатками.
+
+    Сначала идут совпадения по началу названия, затем по вхождению,
+    затем похожие названия. В PostgreSQL поиск выполняется в базе
+    по триграммным индексам, в остальных СУБД - по индексу в памяти.
+    """
+
+    if connection.vendor == 'postgresql':
+        return queryset.annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                When(name__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramWordSimilarity(query, 'name'),
+        ).filter(
+            Q(name__icontains=query) | Q(name__trigram_word_similar=query)
+        ).order_by('rank', '-similarity', 'name')
+
+    ids = get_ingredient_index().search(query)
+    return queryset.filter(pk__in=ids).order_by(
+        Case(
+            *[When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+    )
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """Основа слова: без окончания, если остается не меньше 3 букв."""
+
+    for ending in ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def get_terms(text):
+    return [stem(word)
+            for word in WORD.findall(text.lower().replace('ё', 'е'))
+            if word not in STOP_WORDS]
+
+
+class RecipeIndex:
+    """
+    Обратный индекс рецептов в памяти процесса для СУБД без полнотекстового
+    поиска.
+
+    Для каждой основы слова хранится вес рецептов, в названии, ингредиентах
+    и описании которых она встречается. Находятся рецепты со всеми словами
+    запроса, релевантность - сумма логарифмов весов. Для каждого рецепта
+    хранятся его основы, чтобы при изменении рецепта заменить только его
+    веса.
+    """
+
+    def __init__(self, recipes, ingredients, version=None, sequence=0):
+        self.version = version
+        self.sequence = sequence
+        self.postings = {}
+        self.recipe_terms = {}
+        self.ranked = {}
+        self.add_recipes(recipes, ingredients)
+
+    def add_recipes(self, recipes, ingredients):
+        """Добавление рецептов: (id, название, описание) и (id, ингредиент)."""
+
+        added = set()
+        for pk, name, text in recipes:
+            self.add(pk, name, 'name')
+            self.add(pk, text, 'text')
+            added.add(pk)
+        for pk, name in ingredients:
+            if pk in added:
+                self.add(pk, name, 'ingredients')
+        for pk in added:
+            terms = self.recipe_terms[pk] = tuple(self.recipe_terms[pk])
+            for term in terms:
+                self.ranked.pop(term, None)
+
+    def add(self, pk, text, field):
+        weight = RECIPE_FIELD_WEIGHTS[field]
+        terms = self.recipe_terms.setdefault(pk, set())
+        for term, count in Counter(get_terms(text)).items():
+            weights = self.postings.setdefault(term, {})
+            weights[pk] = weights.get(pk, 0) + weight * count
+            terms.add(term)
+
+    def remove(self, pk):
+        for term in self.recipe_terms.pop(pk, ()):
+            weights = self.postings[term]
+            del weights[pk]
+            if not weights:
+                del self.postings[term]
+            self.ranked.pop(term, None)
+
+    def apply(self, recipe_ids, recipes, ingredients):
+        """
+        Замена рецептов recipe_ids текущими данными: удаленные рецепты
+        отсутствуют в recipes и только убираются из индекса.
+        """
+
+        for pk in recipe_ids:
+            self.remove(pk)
+        self.add_recipes(recipes, ingredients)
+
+    def get_ranked(self, term):
+        """
+        Релевантность рецептов по слову: словарь и список пар
+        (релевантность, id) по убыванию. Считаются при первом поиске слова.
+        """
+
+        ranked = self.ranked.get(term)
+        if ranked is None:
+            scores = {pk: math.log1p(weight)
+                      for pk, weight in self.postings[term].items()}
+            ranked = self.ranked[term] = (
+                scores,
+                sorted(((score, pk) for pk, score in scores.items()),
+                       reverse=True),
+            )
+        return ranked
+
+    def search(self, query, limit=RECIPE_SEARCH_LIMIT):
+        """
+        Пары (id рецепта, релевантность), сначала самые релевантные.
+
+        Списки слов запроса просматриваются параллельно от самых
+        релевантных рецептов (threshold algorithm): просмотр заканчивается,
+        когда непросмотренные рецепты уже не могут попасть в первые limit.
+        """
+
+        terms = set(get_terms(query))
+        if not terms or not all(term in self.postings for term in terms):
+            return []
+        ranked = [self.get_ranked(term) for term in terms]
+        scores = [term_scores for term_scores, _ in ranked]
+        lists = sorted((items for _, items in ranked), key=len)
+        top = []
+        seen = set()
+        for depth in range(len(lists[0])):
+            threshold = 0
+            for items in lists:
+                score, pk = items[depth]
+                threshold += score
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                if all(pk in term_scores for term_scores in scores):
+                    item = (sum(term_scores[pk] for term_scores in scores),
+                            pk)
+                    if len(top) < limit:
+                        heapq.heappush(top, item)
+                    else:
+                        heapq.heappushpop(top, item)
+            if len(top) == limit and top[0][0] >= threshold:
+                break
+        top.sort(reverse=True)
+        return [(pk, round(score, 6)) for score, pk in top]
+
+
+_recipe_index = None
+_recipe_index_lock = threading.Lock()
+recipe_changelog = ChangeLog('recipe_search')
+
+
+def build_recipe_index(version, sequence):
+    return RecipeIndex(
+        Recipe.objects.values_list('id', 'name', 'text').iterator(),
+        RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ).iterator(),
+        version=version,
+        sequence=sequence,
+    )
+
+
+def get_recipe_index():
+    """
+    Индекс рецептов, актуальный на момент вызова: при первом обращении и
+    смене справочников строится заново, иначе применяются записи журнала
+    изменений рецептов.
+    """
+
+    global _recipe_index
+    version = (get_catalogue_version(), recipe_changelog.get_epoch())
+    sequence = recipe_changelog.get_sequence()
+    with _recipe_index_lock:
+        if (_recipe_index is None or _recipe_index.version != version
+                or _recipe_index.sequence > sequence):
+            _recipe_index = build_recipe_index(version, sequence)
+        elif _recipe_index.sequence < sequence:
+            recipe_ids = recipe_changelog.get_changes(
+                _recipe_index.sequence, sequence
+            )
+            if recipe_ids is None:
+                _recipe_index = build_recipe_index(version, sequence)
+            else:
+                _recipe_index.apply(
+                    recipe_ids,
+                    Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                        'id', 'name', 'text'
+                    ),
+                    RecipeIngredient.objects.filter(
+                        recipe_id__in=recipe_ids
+                    ).values_list('recipe_id', 'ingredient__name'),
+                )
+                _recipe_index.sequence = sequence
+    return _recipe_index
+
+
+def get_search_vector():
+    """
+    Поисковый вектор рецепта: название (вес A), названия ингредиентов (B)
+    и описание (C) с русской морфологией.
+    """
+
+    ingredients = Subquery(
+        RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(ingredients, weight='B', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG))
+
+
+def update_search_vectors(recipe_ids=None, batch_size=1000):
+    """
+    Пересчет поисковых векторов рецептов (всех, если recipe_ids не
+    передан). Векторы есть только в PostgreSQL.
+    """
+
+    if connection.vendor != 'postgresql':
+        return
+    if recipe_ids is None:
+        recipe_ids = Recipe.objects.order_by('id').values_list('id',
+                                                               flat=True)
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        Recipe.objects.filter(
+            pk__in=recipe_ids[start:start + batch_size]
+        ).update(search_vector=get_search_vector())
+
+
+def recipes_committed(recipe_ids):
+    """
+    Обновление поиска по рецептам, измененным в транзакции: векторов в
+    PostgreSQL, журнала для индекса в памяти в остальных СУБД.
+    """
+
+    if connection.vendor == 'postgresql':
+        update_search_vectors(recipe_ids)
+    else:
+        recipe_changelog.log(recipe_ids)
+
+
+def schedule_search_update(recipe_ids):
+    """Обновление поиска по рецептам после фиксации транзакции."""
+
+    collect_on_commit('recipe_search', recipe_ids, recipes_committed)
+
+
+def recipe_search_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    Обновление поиска при изменении рецепта и его ингредиентов. Сохранение
+    только тех полей, которые не индексируются (например, копий фото),
+    поиск не меняет.
+    """
+
+    if update_fields is not None and not (
+        SEARCH_FIELDS[sender] & set(update_fields)
+    ):
+        return
+    schedule_search_update([getattr(instance, 'recipe_id', instance.pk)])
+
+
+def ingredient_search_changed(sender, instance, update_fields=None,
+                              **kwargs):
+    """
+    Обновление векторов рецептов с переименованным ингредиентом. Индекс в
+    памяти перестраивается по версии справочников.
+    """
+
+    if connection.vendor != 'postgresql' or (
+        update_fields is not None and 'name' not in update_fields
+    ):
+        return
+    schedule_search_update(instance.recipes.values_list('id', flat=True))
+
+
+def recipes_loaded(sender, **kwargs):
+    """Пересчет поиска после загрузки рецептов в обход ORM."""
+
+    update_search_vectors()
+    transaction.on_commit(recipe_changelog.reset)
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+    Добавляет релевантность search_rank. В PostgreSQL поиск выполняется
+    по поисковому вектору с GIN-индексом, в остальных СУБД - по индексу
+    в памяти (лучшие RECIPE_SEARCH_LIMIT рецептов).
+    """
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        )
+
+    ranked = get_recipe_index().search(query)
+    return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in ranked],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
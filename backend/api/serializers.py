@@ -1,14 +1,22 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
-from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
-from .fields import Base64ImageField
-from .serializers_utils import tags_and_ingredients_create
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient, Tag)
+
+from .fields import Base64ImageField, RecipeImageField, RelatedIdsField
+from .serializers_utils import (get_duplicates, get_missing_ids,
+                                get_recipes_limit, tags_and_ingredients_create,
+                                tags_and_ingredients_update)
 
 User = get_user_model()
 
+# Наибольшее количество id в пакетных запросах.
+BULK_MAX_SIZE = 1000
+COOKABLE_MAX_INGREDIENTS = 100
+
 
 class CustomUserSerializer(UserSerializer):
     """Сериализатор для пользователя."""
@@ -23,7 +31,12 @@ class CustomUserSerializer(UserSerializer):
     def get_is_subscribed(self, obj):
         """Отметка о подписке на автора."""
 
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context.get('request').user
+        if user.is_anonymous:
+            return False
         return User.objects.filter(pk=user.id,
                                    subscriptions=obj).exists()
 
@@ -56,7 +69,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class RecipeIngredientPostSerializer(serializers.ModelSerializer):
     """Сериализатор для получения ингредиентов рецепта и их количества."""
 
-    id = serializers.IntegerField(source='ingredient.id')
+    id = serializers.IntegerField(source='ingredient_id')
 
     class Meta:
         model = RecipeIngredient
@@ -84,18 +97,24 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'cooking_time',)
 
     def validate_ingredients(self, value):
-        """Проверка уникальности ингредиентов."""
-
-        result = []
-        for item in value:
-            ingredient = item['ingredient']
-            if ingredient in result:
-                raise serializers.ValidationError(
-                    'В списке ингредиентов есть повторяющиеся элементы.'
-                )
-            result.append(ingredient)
+        """Проверка уникальности и существования ингредиентов."""
+
+        ids = [item['ingredient_id'] for item in value]
+        duplicates = get_duplicates(ids)
+        if duplicates:
+            raise serializers.ValidationError(
+                'В списке ингредиентов есть повторяющиеся элементы: '
+                f'{", ".join(map(str, duplicates))}.'
+            )
+        missing = get_missing_ids(Ingredient, ids)
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, missing))}.'
+            )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipeingredient_set')
@@ -104,13 +123,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        instance.ingredients.clear()
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipeingredient_set')
 
-        tags_and_ingredients_create(tags, ingredients, instance)
+        old_amounts, new_amounts = tags_and_ingredients_update(
+            tags, ingredients, instance
+        )
+        ShoppingCartIngredient.objects.change_recipe(
+            instance.id, old_amounts, new_amounts
+        )
         return super().update(instance, validated_data)
 
 
@@ -130,10 +153,19 @@ class RicepiIngredientGetSerializer(serializers.ModelSerializer):
 
 
 class RecipeGetSerializer(serializers.ModelSerializer):
-    """Сериализатор для получения рецептов."""
+    """
+    Сериализатор для получения рецептов.
+
+    Состав полей задается в контексте: fields - имена полей, expand -
+    связи (relations), которые отдаются вложенными объектами. Если задан
+    хотя бы один из них, остальные связи отдаются id, без них - все поля
+    и все связи вложенными объектами.
+    """
+
+    relations = ('author', 'tags', 'ingredients')
 
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField(required=True, allow_null=False)
+    image = RecipeImageField(size='card', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = RicepiIngredientGetSerializer(
         source='recipeingredient_set.all', many=True, read_only=True
@@ -154,9 +186,35 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                   'text',
                   'cooking_time',)
 
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        expand = self.context.get('expand')
+        if requested is None and expand is None:
+            return fields
+        expand = expand or set()
+        if requested is not None:
+            fields = {name: field for name, field in fields.items()
+                      if name in requested or name in expand}
+        collapsed = {
+            'author': serializers.IntegerField(source='author_id',
+                                               read_only=True),
+            'tags': RelatedIdsField('tag_id', source='recipetag_set.all'),
+            'ingredients': RelatedIdsField(
+                'ingredient_id', source='recipeingredient_set.all'
+            ),
+        }
+        for name, field in collapsed.items():
+            if name in fields and name not in expand:
+                fields[name] = field
+        return fields
+
     def get_is_in_shopping_cart(self, obj):
         """Рецепт в списке покупок у пользователя."""
 
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return Recipe.objects.filter(id=obj.id,
@@ -166,16 +224,30 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     def get_is_favorited(self, obj):
         """Рецепт в избраном у пользователя."""
 
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return Recipe.objects.filter(id=obj.id, favorited=user).exists()
         return False
 
 
+class CookableRecipeSerializer(RecipeGetSerializer):
+    """Рецепт с числом имеющихся и недостающих ингредиентов."""
+
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeGetSerializer.Meta):
+        fields = RecipeGetSerializer.Meta.fields + ('matched_count',
+                                                    'missing_count')
+
+
 class RecipeForSubscriptionsSerializer(serializers.ModelSerializer):
     """Сериализатор для рецептов в подписках."""
 
-    image = Base64ImageField(required=True, allow_null=False)
+    image = RecipeImageField(size='thumb', read_only=True)
 
     class Meta:
         model = Recipe
@@ -189,7 +261,7 @@ class SubscribeGetSerializer(serializers.ModelSerializer):
     """Сериализатор для получения подписок."""
 
     is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
     recipes = serializers.SerializerMethodField()
 
     class Meta:
@@ -207,26 +279,40 @@ class SubscribeGetSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """Отметка о подписке на автора."""
 
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context.get('request').user
         return User.objects.filter(pk=user.id,
                                    subscriptions=obj).exists()
 
-    def get_recipes_count(self, obj):
-        """Подсчет количества рецептов автора."""
-
-        user = get_object_or_404(
-            User,
-            id=obj.id)
-        return user.recipes.count()
-
     def get_recipes(self, obj):
         """Получение рецептов."""
 
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit')
-
-        if recipes_limit:
-            recipes = obj.recipes.all().order_by('id')[:int(recipes_limit)]
-        else:
+        recipes = getattr(obj, 'subscription_recipes', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context['request'])
             recipes = obj.recipes.all()
+            if recipes_limit:
+                recipes = recipes.order_by('id')[:recipes_limit]
         return RecipeForSubscriptionsSerializer(recipes, many=True).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетных запросов."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_SIZE,
+    )
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """Id имеющихся ингредиентов для подбора рецептов."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=COOKABLE_MAX_INGREDIENTS,
+    )
@@ -1,6 +1,51 @@
-from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
 
-from foodgram.models import Ingredient, RecipeIngredient, RecipeTag
+from foodgram.models import RecipeIngredient, RecipeTag
+
+
+def get_missing_ids(model, ids):
+    """Отсортированный список id, которых нет в базе, за один запрос."""
+
+    return sorted(set(ids) - model.objects.in_bulk(ids).keys())
+
+
+def get_duplicates(ids):
+    """Отсортированный список повторяющихся id."""
+
+    seen = set()
+    duplicates = set()
+    for pk in ids:
+        if pk in seen:
+            duplicates.add(pk)
+        seen.add(pk)
+    return sorted(duplicates)
+
+
+def get_recipes_limit(request):
+    """
+    Количество рецептов автора в подписках из параметра ?recipes_limit=:
+    целое положительное число или None, если параметр не передан.
+    """
+
+    recipes_limit = request.query_params.get('recipes_limit')
+    if not recipes_limit:
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = 0
+    if recipes_limit < 1:
+        raise ValidationError({'recipes_limit': (
+            'Ожидается целое положительное число.'
+        )})
+    return recipes_limit
+
+
+def get_ingredient_amounts(ingredients):
+    """Словарь id ингредиента -> количество из проверенных данных."""
+
+    return {ing['ingredient_id']: ing['amount']
+            for ing in ingredients['all']}
 
 
 def tags_and_ingredients_create(tags, ingredients, recipe):
@@ -12,11 +57,62 @@ def tags_and_ingredients_create(tags, ingredients, recipe):
         [RecipeTag(tag=tag, recipe=recipe) for tag in tags]
     )
     RecipeIngredient.objects.bulk_create(
-        [RecipeIngredient(ingredient=get_object_or_404(
-                              Ingredient,
-                              pk=ing['ingredient']['id']
-                         ),
+        [RecipeIngredient(ingredient_id=ingredient_id,
+                          recipe=recipe,
+                          amount=amount)
+         for ingredient_id, amount
+         in get_ingredient_amounts(ingredients).items()]
+    )
+
+
+def tags_and_ingredients_update(tags, ingredients, recipe):
+    """
+    Метод для обновления тегов и ингредиентов рецепта.
+
+    Вместо удаления и повторной вставки всех строк сравнивает
+    текущий состав рецепта с новым: добавляет недостающие строки,
+    обновляет изменившиеся количества и удаляет лишние.
+    Возвращает старые и новые количества ингредиентов.
+
+    Лишние строки удаляются одним запросом DELETE без сигналов
+    post_delete, поэтому число запросов не зависит от количества строк.
+    Кеш ответов, поиск и подбор рецептов обновляются по сигналу
+    сохранения самого рецепта, списки покупок - вызывающим кодом по
+    возвращенным количествам.
+    """
+
+    new_tags = {tag.id for tag in tags}
+    old_tags = set(recipe.recipetag_set.values_list('tag_id', flat=True))
+    if old_tags - new_tags:
+        recipe.recipetag_set.filter(
+            tag_id__in=old_tags - new_tags
+        )._raw_delete(recipe._state.db)
+    RecipeTag.objects.bulk_create(
+        [RecipeTag(tag_id=tag_id, recipe=recipe)
+         for tag_id in new_tags - old_tags]
+    )
+
+    new_amounts = get_ingredient_amounts(ingredients)
+    rows = {row.ingredient_id: row
+            for row in recipe.recipeingredient_set.all()}
+    old_amounts = {pk: row.amount for pk, row in rows.items()}
+    removed = old_amounts.keys() - new_amounts.keys()
+    if removed:
+        recipe.recipeingredient_set.filter(
+            ingredient_id__in=removed
+        )._raw_delete(recipe._state.db)
+    changed = []
+    for ingredient_id, amount in new_amounts.items():
+        row = rows.get(ingredient_id)
+        if row is not None and row.amount != amount:
+            row.amount = amount
+            changed.append(row)
+    RecipeIngredient.objects.bulk_update(changed, ['amount'])
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(ingredient_id=ingredient_id,
                           recipe=recipe,
-                          amount=ing['amount'])
-            for ing in ingredients['all']]
+                          amount=amount)
+         for ingredient_id, amount in new_amounts.items()
+         if ingredient_id not in rows]
     )
+    return old_amounts, new_amounts
@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from foodgram.models import ShoppingCartIngredient
+
+CHUNK_SIZE = 500
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+PDF_FONT_NAME = 'ShoppingCartFont'
+
+
+def get_cart_queryset(user):
+    """
+    Ингредиенты из списка покупок пользователя.
+
+    Суммы берутся из ShoppingCartIngredient, ингредиенты с названиями,
+    которые отличаются только регистром, объединяются. Порядок
+    детерминирован: по названию, затем по единице измерения.
+    """
+
+    return ShoppingCartIngredient.objects.filter(
+        user=user
+    ).values(
+        name=Lower('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(
+        amount=Sum('amount')
+    ).order_by(
+        'name',
+        'measurement_unit',
+    )
+
+
+def get_cart_response(renderer, items):
+    """Потоковый ответ со списком покупок в формате рендерера."""
+
+    return StreamingHttpResponse(
+        SHOPPING_CART_EXPORTERS[renderer.format](items),
+        headers={
+            'Content-Type': renderer.media_type,
+            'Content-Disposition':
+                f'attachment; filename="cart.{ renderer.format }"',
+        }
+    )
+
+
+def get_cart_items(user):
+    """Итератор по ингредиентам из списка покупок пользователя."""
+
+    return get_cart_queryset(user).iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, который сразу возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def txt_rows(items):
+    """Список покупок в текстовом формате."""
+
+    for item in items:
+        yield (f'{ item["name"].capitalize() } '
+               f'({ item["measurement_unit"] })- { item["amount"] } \n')
+
+
+def csv_rows(items):
+    """Список покупок в формате CSV."""
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for item in items:
+        yield writer.writerow((item['name'].capitalize(),
+                               item['measurement_unit'],
+                               item['amount']))
+
+
+def json_rows(items):
+    """Список покупок в формате JSON."""
+
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps(
+            {'name': item['name'].capitalize(),
+             'measurement_unit': item['measurement_unit'],
+             'amount': item['amount']},
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+def get_pdf_font():
+    """Регистрация шрифта с кириллицей, если он есть в системе."""
+
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+        return 'Helvetica'
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+    )
+    return PDF_FONT_NAME
+
+
+def pdf_rows(items):
+    """
+    Список покупок в формате PDF.
+
+    reportlab собирает документ целиком, поэтому страницы пишутся
+    во временный файл на диске и отдаются из него частями.
+    """
+
+    font = get_pdf_font()
+    height = A4[1]
+    margin, line_height = 50, 18
+    with tempfile.TemporaryFile() as buffer:
+        document = canvas.Canvas(buffer, pagesize=A4)
+        document.setFont(font, 12)
+        y = height - margin
+        for line in txt_rows(items):
+            if y < margin:
+                document.showPage()
+                document.setFont(font, 12)
+                y = height - margin
+            document.drawString(margin, y, line.strip())
+            y -= line_height
+        document.save()
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_CART_EXPORTERS = {
+    'txt': txt_rows,
+    'csv': csv_rows,
+    'json': json_rows,
+    'pdf': pdf_rows,
+}
@@ -0,0 +1,124 @@
+from asyncio import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import include, path, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import urls
+from api.async_views import urlpatterns as async_urlpatterns
+from foodgram.models import Recipe
+from foodgram.seed import seed_database
+
+urlpatterns = [
+    path('api/', include(async_urlpatterns + urls.sync_urlpatterns)),
+]
+
+URLS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=сах',
+    '/api/recipes/',
+    '/api/recipes/?limit=10&page=3',
+    '/api/recipes/?limit=6&tags=breakfast&tags=lunch',
+    '/api/recipes/?is_favorited=1&limit=6',
+    '/api/recipes/?is_in_shopping_cart=1&limit=6&image_size=thumb',
+    '/api/recipes/?pagination=cursor&limit=6&count=1',
+)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewsTestCase(TestCase):
+    """Асинхронные представления отвечают так же, как вьюсеты DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_database()
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.sync_client = APIClient()
+
+    async def get(self, url, **headers):
+        return await self.async_client.get(url, **headers)
+
+    async def get_sync(self, url, authorized=True):
+        """Ответ синхронного вьюсета DRF."""
+
+        headers = {}
+        if authorized:
+            headers['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        return await sync_to_async(self.sync_client.get)(url, **headers)
+
+    async def assert_same(self, url, authorized):
+        headers = {}
+        if authorized:
+            headers['AUTHORIZATION'] = f'Token {self.token}'
+        response = await self.get(url, **headers)
+        expected = await self.get_sync(url, authorized)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.json(), expected.json(), url)
+
+    def test_async_routes(self):
+        for url in ('/api/tags/', '/api/ingredients/', '/api/recipes/',
+                    f'/api/recipes/{self.recipe.id}/',
+                    '/api/recipes/download_shopping_cart/'):
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url).func))
+
+    async def test_same_responses(self):
+        urls = URLS + (f'/api/recipes/{self.recipe.id}/',
+                       '/api/recipes/100500/')
+        for url in urls:
+            for authorized in (False, True):
+                with self.subTest(url=url, authorized=authorized):
+                    await self.assert_same(url, authorized)
+
+    async def test_invalid_token(self):
+        response = await self.get('/api/recipes/',
+                                  AUTHORIZATION='Token invalid')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    async def test_catalogue_not_modified(self):
+        etag = (await self.get('/api/tags/'))['ETag']
+        response = await self.get('/api/tags/', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_recipe_cache(self):
+        url = '/api/recipes/?limit=6'
+        self.assertEqual((await self.get(url))['X-Cache'], 'MISS')
+        self.assertEqual((await self.get(url))['X-Cache'], 'HIT')
+
+    async def test_download_shopping_cart(self):
+        url = '/api/recipes/download_shopping_cart/'
+        response = await self.get(url)
+        self.assertEqual(response.status_code, 401)
+        for file_format in ('txt', 'csv', 'json', 'pdf'):
+            with self.subTest(file_format=file_format):
+                response = await self.get(
+                    f'{url}?format={file_format}',
+                    AUTHORIZATION=f'Token {self.token}',
+                )
+                expected = await self.get_sync(f'{url}?format={file_format}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'],
+                                 expected['Content-Type'])
+                content = b''.join(response.streaming_content)
+                if file_format != 'pdf':
+                    self.assertEqual(
+                        content, b''.join(expected.streaming_content)
+                    )
+
+    async def test_write_methods_use_sync_views(self):
+        response = await self.async_client.post(
+            '/api/recipes/', {}, content_type='application/json',
+            AUTHORIZATION=f'Token {self.token}',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
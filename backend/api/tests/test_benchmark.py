@@ -0,0 +1,77 @@
+import json
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.benchmark import (BenchContext, get_routes, get_scenarios,
+                           get_skipped, summarize)
+from foodgram.seed import seed_database
+
+MEDIA_ROOT = tempfile.mkdtemp()
+REQUESTS = 3
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BenchmarkTestCase(TestCase):
+    """Сценарии нагрузочного замера (команда bench)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(users_count=20, recipes_count=50)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.ctx = BenchContext()
+        self.scenarios = get_scenarios(self.ctx, REQUESTS)
+
+    def test_all_routes_covered(self):
+        covered = {(scenario.route, scenario.method)
+                   for scenario in self.scenarios}
+        skipped = {(item['route'], item['method']): item['reason']
+                   for item in get_skipped(self.scenarios)}
+        for route in get_routes():
+            with self.subTest(route=route):
+                self.assertTrue(route in covered or route in skipped)
+                self.assertNotEqual(skipped.get(route), 'нет сценария')
+
+    def test_scenarios_succeed(self):
+        """Сценарии выполняются без ошибок в том порядке, как в замере."""
+
+        self.ctx.create_users('bench-test-', REQUESTS)
+        client = APIClient()
+        for scenario in self.scenarios:
+            requests = scenario.prepare()
+            self.assertTrue(requests, scenario)
+            for request in requests:
+                headers = {}
+                if request.token:
+                    headers['HTTP_AUTHORIZATION'] = f'Token {request.token}'
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = client.generic(
+                        request.method, request.url,
+                        json.dumps(request.data) if request.data else '',
+                        'application/json',
+                        **headers
+                    )
+                self.assertLess(response.status_code, 400, scenario)
+
+    def test_summarize(self):
+        results = [(0.001 * i, 200, 100) for i in range(1, 101)]
+        results[0] = (0.001, 404, 40)
+        summary = summarize(results, elapsed=2, queries=250)
+        self.assertEqual(summary['requests'], 100)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['rps'], 50)
+        self.assertEqual(summary['p50_ms'], 51)
+        self.assertEqual(summary['p99_ms'], 100)
+        self.assertEqual(summary['queries_per_request'], 2.5)
+        self.assertEqual(summary['bytes_per_response'], 99)
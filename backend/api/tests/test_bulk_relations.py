@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient)
+
+User = get_user_model()
+
+
+class BulkRelationsTestCase(TestCase):
+    """Пакетные избранное, список покупок и подписки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        User.objects.bulk_create([
+            User(email=f'author{i}@foodgram.ru', username=f'author{i}')
+            for i in range(30)
+        ])
+        cls.authors = list(User.objects.exclude(pk=cls.user.pk))
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {i}',
+                   text='Текст',
+                   author=cls.authors[i],
+                   cooking_time=5,
+                   image='recipes/images/test.png')
+            for i in range(30)
+        ])
+        cls.recipes = list(Recipe.objects.order_by('id'))
+        cls.sugar, cls.salt = Ingredient.objects.bulk_create([
+            Ingredient(name='сахар', measurement_unit='г'),
+            Ingredient(name='соль', measurement_unit='г'),
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in cls.recipes
+            for ingredient in (cls.sugar, cls.salt)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, ids):
+        response = getattr(self.client, method)(url, {'ids': ids},
+                                                format='json')
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status']
+                for item in response.json()['results']}
+
+    def get_cart(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_favorite(self):
+        first, second, third = (recipe.id for recipe in self.recipes[:3])
+        self.user.favorites.add(first)
+        statuses = self.send('post', '/api/recipes/favorite/',
+                             [first, second, second, 100500])
+        self.assertEqual(statuses, {first: 'exists', second: 'added',
+                                    100500: 'not_found'})
+        self.assertEqual(set(self.user.favorites.values_list('id',
+                                                             flat=True)),
+                         {first, second})
+        statuses = self.send('delete', '/api/recipes/favorite/',
+                             [first, third])
+        self.assertEqual(statuses, {first: 'removed', third: 'absent'})
+        self.assertEqual(list(self.user.favorites.values_list('id',
+                                                              flat=True)),
+                         [second])
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes[:5]]
+        self.client.post(f'/api/recipes/{ids[0]}/shopping_cart/')
+        statuses = self.send('post', '/api/recipes/shopping_cart/', ids)
+        self.assertEqual(list(statuses.values()),
+                         ['exists'] + ['added'] * 4)
+        self.assertEqual(self.get_cart(),
+                         {self.sugar.id: 50, self.salt.id: 50})
+        self.send('delete', '/api/recipes/shopping_cart/', ids[:3])
+        self.assertEqual(self.get_cart(),
+                         {self.sugar.id: 20, self.salt.id: 20})
+        self.send('delete', '/api/recipes/shopping_cart/', ids)
+        self.assertEqual(self.get_cart(), {})
+
+    def test_subscribe(self):
+        ids = [author.id for author in self.authors[:3]]
+        statuses = self.send('post', '/api/users/subscribe/',
+                             [*ids, self.user.id])
+        self.assertEqual(statuses, {**dict.fromkeys(ids, 'added'),
+                                    self.user.id: 'self'})
+        self.assertEqual(set(self.user.subscriptions.values_list(
+            'id', flat=True
+        )), set(ids))
+        statuses = self.send('delete', '/api/users/subscribe/', ids[:2])
+        self.assertEqual(statuses, dict.fromkeys(ids[:2], 'removed'))
+        self.assertEqual(list(self.user.subscriptions.values_list(
+            'id', flat=True
+        )), ids[2:])
+
+    def test_constant_queries(self):
+        for url, objects in (('/api/recipes/favorite/', self.recipes),
+                             ('/api/recipes/shopping_cart/', self.recipes),
+                             ('/api/users/subscribe/', self.authors)):
+            counts = []
+            for size in (1, 20):
+                ids = [obj.id for obj in objects[:size]]
+                for method in ('post', 'delete'):
+                    with CaptureQueriesContext(connection) as queries:
+                        self.send(method, url, ids)
+                    counts.append(len(queries))
+            with self.subTest(url=url):
+                self.assertEqual(counts[:2], counts[2:])
+
+    def test_validation(self):
+        for data in ({}, {'ids': []}, {'ids': ['abc']}, {'ids': [0]},
+                     {'ids': list(range(1, 1002))}):
+            with self.subTest(data=data):
+                response = self.client.post('/api/recipes/favorite/', data,
+                                            format='json')
+                self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/recipes/favorite/',
+                                    {'ids': [self.recipes[0].id]},
+                                    format='json')
+        self.assertEqual(response.status_code, 401)
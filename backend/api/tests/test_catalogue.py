@@ -0,0 +1,53 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram.models import Ingredient, Tag
+
+
+class CatalogueCacheTestCase(TestCase):
+    """Условные запросы и кеширование справочников."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast',
+                                     color='#E26C2D')
+        Ingredient.objects.create(name='молоко', measurement_unit='мл')
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def test_headers(self):
+        for url in ('/api/tags/', '/api/ingredients/?name=мол'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['ETag'].startswith('"'))
+                self.assertIn('Last-Modified', response)
+                self.assertIn('public', response['Cache-Control'])
+
+    def test_not_modified_without_queries(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/',
+                                       HTTP_IF_NONE_MATCH=etag,
+                                       HTTP_AUTHORIZATION='Token 123')
+        self.assertEqual(response.status_code, 304)
+
+    def test_serialized_copy(self):
+        self.client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.json()[0]['slug'], 'breakfast')
+
+    def test_change_refreshes_catalogue(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'Поздний завтрак'
+            self.tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Поздний завтрак')
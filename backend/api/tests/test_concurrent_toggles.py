@@ -0,0 +1,168 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.counters import reconcile_counters
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient)
+
+User = get_user_model()
+
+THREADS = 8
+
+
+def create_data():
+    user = User.objects.create(email='cook@foodgram.ru', username='cook')
+    author = User.objects.create(email='author@foodgram.ru',
+                                 username='author')
+    recipe = Recipe.objects.create(name='Рецепт', text='Текст', author=author,
+                                   cooking_time=5,
+                                   image='recipes/images/test.png')
+    sugar, salt = Ingredient.objects.bulk_create([
+        Ingredient(name='сахар', measurement_unit='г'),
+        Ingredient(name='соль', measurement_unit='г'),
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=sugar, amount=10),
+        RecipeIngredient(recipe=recipe, ingredient=salt, amount=5),
+    ])
+    return user, author, recipe
+
+
+class ConcurrentTogglesTestCase(TransactionTestCase):
+    """Одновременные одинаковые запросы меняют связь ровно один раз."""
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.user, self.author, self.recipe = create_data()
+
+    def send_all(self, requests):
+        """Одновременная отправка запросов (method, url, data)."""
+
+        barrier = threading.Barrier(len(requests))
+
+        def send(request):
+            method, url, data = request
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                return getattr(client, method)(url, data, format='json')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(len(requests)) as executor:
+            responses = list(executor.map(send, requests))
+        self.assertEqual({response.status_code for response in responses},
+                         {200})
+        return responses
+
+    def send_concurrently(self, method, url):
+        responses = self.send_all([(method, url, None)] * THREADS)
+        return sum('errors' not in response.json()
+                   for response in responses)
+
+    def check_toggle(self, url, get_relations, expected):
+        self.assertEqual(self.send_concurrently('post', url), 1)
+        self.assertEqual(get_relations(), expected)
+        self.assertEqual(self.send_concurrently('delete', url), 1)
+        self.assertEqual(get_relations(), [])
+
+    def test_favorite(self):
+        self.check_toggle(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            lambda: list(self.user.favorites.values_list('id', flat=True)),
+            [self.recipe.id],
+        )
+
+    def test_subscribe(self):
+        self.check_toggle(
+            f'/api/users/{self.author.id}/subscribe/',
+            lambda: list(self.user.subscriptions.values_list('id',
+                                                             flat=True)),
+            [self.author.id],
+        )
+
+    def test_shopping_cart(self):
+        self.check_toggle(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            lambda: sorted(ShoppingCartIngredient.objects.filter(
+                user=self.user
+            ).values_list('ingredient__name', 'amount')),
+            [('сахар', 10), ('соль', 5)],
+        )
+        self.assertFalse(self.user.shopping_cart.exists())
+
+    def test_bulk_and_single(self):
+        """
+        Пакетные и одиночные запросы вперемешку: каждое изменение учтено
+        в счетчиках и списке покупок один раз.
+        """
+
+        other = Recipe.objects.create(name='Другой', text='Текст',
+                                      author=self.author, cooking_time=5,
+                                      image='recipes/images/test.png')
+        ids = [self.recipe.id, other.id]
+        single = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        for method, status in (('post', 'added'), ('delete', 'removed')):
+            responses = self.send_all([
+                (method, '/api/recipes/shopping_cart/', {'ids': ids}),
+                (method, single, None),
+            ] * (THREADS // 2))
+            changes = [
+                item['id']
+                for response in responses[::2]
+                for item in response.json()['results']
+                if item['status'] == status
+            ] + [
+                self.recipe.id
+                for response in responses[1::2]
+                if 'errors' not in response.json()
+            ]
+            self.assertEqual(sorted(changes), sorted(ids), method)
+            self.assertEqual(
+                reconcile_counters(check=True)['recipe.shopping_cart_count'],
+                0,
+            )
+            call_command('rebuild_shopping_cart', '--check',
+                         stdout=StringIO())
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+
+class ToggleQueriesTestCase(TestCase):
+    """Добавление и удаление связи - один запрос к базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.recipe = create_data()
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_mutations(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith(('INSERT', 'DELETE'))]
+
+    def test_single_statement(self):
+        for url in (f'/api/recipes/{self.recipe.id}/favorite/',
+                    f'/api/users/{self.author.id}/subscribe/'):
+            for method in ('post', 'post', 'delete', 'delete'):
+                with self.subTest(url=url, method=method):
+                    self.assertEqual(
+                        len(self.get_mutations(method, url)), 1
+                    )
@@ -0,0 +1,174 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api.cookable import CookableIndex
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+
+def brute_force(recipes, ingredient_ids):
+    """Тот же подбор перебором всех рецептов."""
+
+    ingredient_ids = set(ingredient_ids)
+    result = []
+    for recipe_id, ingredients in recipes.items():
+        matched = len(ingredients & ingredient_ids)
+        if matched:
+            result.append((recipe_id, matched, len(ingredients) - matched))
+    return sorted(result, key=lambda item: (item[2], -item[0]))
+
+
+class CookableIndexTestCase(SimpleTestCase):
+    """Обратный индекс ингредиент -> рецепты."""
+
+    def setUp(self):
+        generator = random.Random(0)
+        # Частые ингредиенты хранятся битовыми картами, редкие - массивами.
+        self.recipes = {
+            recipe_id: set(
+                generator.sample(range(1, 5), generator.randint(0, 2))
+                + generator.sample(range(5, 200), generator.randint(1, 12))
+            )
+            for recipe_id in range(1, 400, 2)
+        }
+        self.index = CookableIndex(self.get_rows())
+
+    def get_rows(self):
+        return [(recipe_id, ingredient_id)
+                for recipe_id, ingredients in sorted(self.recipes.items())
+                for ingredient_id in sorted(ingredients)]
+
+    def check_search(self, ingredient_ids):
+        result = self.index.search(ingredient_ids)
+        expected = brute_force(self.recipes, ingredient_ids)
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(result[:5], expected[:5])
+        self.assertEqual(list(result[:]), expected)
+
+    def test_search(self):
+        generator = random.Random(1)
+        for _ in range(20):
+            self.check_search(
+                generator.sample(range(1, 210), generator.randint(1, 30))
+            )
+
+    def test_unknown_ingredients(self):
+        self.assertEqual(len(self.index.search([1000, 1001])), 0)
+        self.assertEqual(self.index.search([1000])[:10], [])
+
+    def test_apply(self):
+        """Изменения рецептов без перестройки индекса."""
+
+        changes = {
+            1: set(),
+            3: {1, 2, 150},
+            5: set(range(5, 40)),
+            401: {2, 3, 199},
+            403: set(),
+        }
+        self.index.apply(changes)
+        self.recipes.update(changes)
+        for ingredient_ids in ([1, 2, 3], [150, 199], list(range(5, 40))):
+            self.check_search(ingredient_ids)
+        self.assertEqual(CookableIndex(self.get_rows()).search([2, 150])[:],
+                         self.index.search([2, 150])[:])
+
+
+class CookableTestCase(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    url = '/api/recipes/cookable/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(email='author@foodgram.ru',
+                                     username='author')
+        cls.ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('молоко', 'мука', 'яйцо', 'творог', 'сахар')
+        }
+        cls.recipes = {}
+        for name, ingredient_names in (
+            ('Блины', ('молоко', 'мука', 'яйцо')),
+            ('Сырники', ('творог', 'мука', 'яйцо', 'сахар')),
+            ('Омлет', ('молоко', 'яйцо')),
+            ('Гоголь-моголь', ('яйцо', 'сахар')),
+        ):
+            recipe = Recipe.objects.create(name=name, text='Текст',
+                                           author=author, cooking_time=5,
+                                           image='recipes/images/test.png')
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe,
+                                 ingredient=cls.ingredients[ingredient],
+                                 amount=1)
+                for ingredient in ingredient_names
+            ])
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def get_ids(self, *names):
+        return ','.join(str(self.ingredients[name].id) for name in names)
+
+    def cook(self, *names, **params):
+        response = self.client.get(
+            self.url, {'ingredients': self.get_ids(*names), **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranking(self):
+        data = self.cook('молоко', 'яйцо', 'мука')
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(
+            [(item['name'], item['matched_count'], item['missing_count'])
+             for item in data['results']],
+            [('Омлет', 2, 0), ('Блины', 3, 0),
+             ('Гоголь-моголь', 1, 1), ('Сырники', 2, 2)],
+        )
+        self.assertEqual(len(data['results'][0]['ingredients']), 2)
+
+    def test_pagination(self):
+        data = self.cook('яйцо', limit=3, page=2)
+        self.assertEqual(data['count'], 4)
+        self.assertEqual([item['name'] for item in data['results']],
+                         ['Сырники'])
+
+    def test_repeated_param(self):
+        response = self.client.get(self.url, {'ingredients': [
+            self.ingredients['творог'].id, self.ingredients['сахар'].id,
+        ]})
+        self.assertEqual(response.json()['results'][0]['name'],
+                         'Гоголь-моголь')
+
+    def test_validation(self):
+        for params in ({}, {'ingredients': ''}, {'ingredients': 'a,1'},
+                       {'ingredients': ','.join(map(str, range(1, 200)))}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_index_sync(self):
+        """Индекс обновляется после изменения и удаления рецепта."""
+
+        self.assertEqual(self.cook('творог')['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=self.recipes['Омлет'],
+                ingredient=self.ingredients['творог'],
+                amount=1,
+            )
+        data = self.cook('творог')
+        self.assertEqual([item['name'] for item in data['results']],
+                         ['Омлет', 'Сырники'])
+        self.assertEqual(data['results'][0]['missing_count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes['Сырники'].delete()
+        self.assertEqual(self.cook('творог')['count'], 1)
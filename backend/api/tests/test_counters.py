@@ -0,0 +1,224 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram.models import Recipe
+
+User = get_user_model()
+
+
+class CountersTestCase(TestCase):
+    """Счетчики популярности рецептов и авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        cls.authors = [
+            User.objects.create(email=f'author{i}@foodgram.ru',
+                                username=f'author{i}')
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(name=f'Рецепт {i}',
+                                  text='Текст',
+                                  author=cls.authors[i % 3],
+                                  cooking_time=5,
+                                  image='recipes/images/test.png')
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_counters(self, obj, *fields):
+        obj.refresh_from_db(fields=fields)
+        return tuple(getattr(obj, field) for field in fields)
+
+    def test_recipes_count(self):
+        author = self.authors[0]
+        self.assertEqual(self.get_counters(author, 'recipes_count'), (2,))
+        self.recipes[0].delete()
+        self.assertEqual(self.get_counters(author, 'recipes_count'), (1,))
+
+    def test_toggles(self):
+        recipe, author = self.recipes[0], self.authors[1]
+        for _ in range(2):
+            self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+            self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(
+            self.get_counters(recipe, 'favorites_count',
+                              'shopping_cart_count'),
+            (1, 1),
+        )
+        self.assertEqual(self.get_counters(author, 'followers_count'), (1,))
+        for _ in range(2):
+            self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+            self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+            self.client.delete(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(
+            self.get_counters(recipe, 'favorites_count',
+                              'shopping_cart_count'),
+            (0, 0),
+        )
+        self.assertEqual(self.get_counters(author, 'followers_count'), (0,))
+
+    def test_bulk(self):
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        self.client.post(f'/api/recipes/{ids[0]}/favorite/')
+        self.client.post('/api/recipes/favorite/', {'ids': ids},
+                         format='json')
+        self.assertEqual(
+            list(Recipe.objects.filter(id__in=ids).order_by('id')
+                 .values_list('favorites_count', flat=True)),
+            [1, 1, 1],
+        )
+        self.client.delete('/api/recipes/favorite/', {'ids': ids[:2]},
+                           format='json')
+        self.assertEqual(
+            list(Recipe.objects.filter(id__in=ids).order_by('id')
+                 .values_list('favorites_count', flat=True)),
+            [0, 0, 1],
+        )
+        self.client.post('/api/users/subscribe/',
+                         {'ids': [author.id for author in self.authors]},
+                         format='json')
+        self.assertEqual(
+            set(User.objects.filter(id__in=[a.id for a in self.authors])
+                .values_list('followers_count', flat=True)),
+            {1},
+        )
+
+    def test_related_managers(self):
+        """Изменения через add/remove/set/clear с обеих сторон связи."""
+
+        recipe = self.recipes[0]
+        recipe.favorited.add(*self.authors)
+        self.user.favorites.add(recipe)
+        self.user.favorites.add(recipe)
+        self.assertEqual(self.get_counters(recipe, 'favorites_count'), (4,))
+        recipe.favorited.remove(self.authors[0], self.authors[0])
+        self.user.favorites.remove(self.recipes[1])
+        self.assertEqual(self.get_counters(recipe, 'favorites_count'), (3,))
+        recipe.favorited.set([self.user])
+        self.assertEqual(self.get_counters(recipe, 'favorites_count'), (1,))
+        self.user.favorites.clear()
+        self.assertEqual(self.get_counters(recipe, 'favorites_count'), (0,))
+
+        author = self.authors[0]
+        self.user.subscriptions.add(author)
+        author.followers.add(self.authors[1])
+        self.assertEqual(self.get_counters(author, 'followers_count'), (2,))
+        self.user.subscriptions.clear()
+        self.assertEqual(self.get_counters(author, 'followers_count'), (1,))
+
+    def test_user_deleted(self):
+        recipe, author = self.recipes[0], self.authors[1]
+        self.user.favorites.add(recipe)
+        self.user.shopping_cart.add(recipe)
+        self.user.subscriptions.add(author)
+        self.user.delete()
+        self.assertEqual(
+            self.get_counters(recipe, 'favorites_count',
+                              'shopping_cart_count'),
+            (0, 0),
+        )
+        self.assertEqual(self.get_counters(author, 'followers_count'), (0,))
+
+    def test_save_keeps_counters(self):
+        """Сохранение загруженного раньше объекта не затирает счетчики."""
+
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        author = User.objects.get(pk=self.authors[1].pk)
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.post(f'/api/users/{author.id}/subscribe/')
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.set_password('new-password')
+        author.save()
+        self.assertEqual(self.get_counters(recipe, 'name', 'favorites_count'),
+                         ('Новое название', 1))
+        self.assertEqual(self.get_counters(author, 'followers_count'), (1,))
+
+    def test_subscriptions_recipes_count(self):
+        self.user.subscriptions.add(self.authors[0])
+        response = self.client.get('/api/users/subscriptions/?limit=10')
+        self.assertEqual(response.json()['results'][0]['recipes_count'], 2)
+
+    def test_reconcile(self):
+        recipe = self.recipes[0]
+        Recipe.favorited.through.objects.create(recipe=recipe,
+                                                user=self.user)
+        User.objects.filter(id=self.authors[0].id).update(recipes_count=10)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', '--check', stdout=StringIO())
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('recipe.favorites_count: 1', out.getvalue())
+        self.assertIn('user.recipes_count: 1', out.getvalue())
+        self.assertEqual(self.get_counters(recipe, 'favorites_count'), (1,))
+        self.assertEqual(self.get_counters(self.authors[0], 'recipes_count'),
+                         (2,))
+        call_command('reconcile_counters', '--check', stdout=StringIO())
+
+
+class PopularOrderingTestCase(TestCase):
+    """Сортировка рецептов по популярности."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(email='author@foodgram.ru',
+                                     username='author')
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {i}',
+                   text='Текст',
+                   author=author,
+                   cooking_time=5,
+                   image='recipes/images/test.png',
+                   favorites_count=i % 4)
+            for i in range(10)
+        ])
+        cls.expected = list(Recipe.objects.order_by(
+            '-favorites_count', '-id'
+        ).values_list('id', flat=True))
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def test_page_pagination(self):
+        response = self.client.get('/api/recipes/?ordering=popular&limit=10')
+        self.assertEqual([item['id'] for item in response.json()['results']],
+                         self.expected)
+
+    def test_keyset_pagination(self):
+        url = '/api/recipes/?ordering=popular&pagination=cursor&limit=3'
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(ids, self.expected)
+
+    def test_cache_key(self):
+        """Ответы с разной сортировкой кешируются отдельно."""
+
+        new = self.client.get('/api/recipes/?limit=10').json()
+        popular = self.client.get('/api/recipes/?ordering=popular&limit=10')
+        self.assertEqual(popular['X-Cache'], 'MISS')
+        self.assertNotEqual(popular.json(), new)
+
+    def test_unknown_ordering(self):
+        response = self.client.get('/api/recipes/?ordering=name')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from api.catalogue import get_catalogue_version
+from foodgram.models import Ingredient
+
+INGREDIENTS = [
+    {'name': 'сахар', 'measurement_unit': 'г'},
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'молоко', 'measurement_unit': 'мл'},
+    {'name': 'молоко', 'measurement_unit': 'стакан'},
+]
+
+
+class ImportIngredientsTestCase(TestCase):
+    """Импорт ингредиентов командой import_csv."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_csv', *args, stdout=out)
+        return out.getvalue()
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list('name',
+                                                  'measurement_unit'))
+
+    def test_csv(self):
+        path = self.write('ingredients.csv', (
+            'name,measurement_unit\n'
+            'сахар,г\n'
+            'соль,г\n'
+            ' сахар , г\n'
+            'молоко,мл\n'
+            'молоко,стакан\n'
+            'без единицы измерения\n'
+            ',г\n'
+        ))
+        output = self.run_import(path, '--batch-size', '2')
+        self.assertIn('Добавлено: 4, пропущено: 1, с ошибками: 2', output)
+        self.assertEqual(
+            self.get_ingredients(),
+            {(item['name'], item['measurement_unit'])
+             for item in INGREDIENTS},
+        )
+
+    def test_rerun_adds_only_new(self):
+        path = self.write('ingredients.csv', 'сахар,г\nсоль,г\n')
+        self.run_import(path)
+        version = get_catalogue_version()
+        output = self.run_import(path)
+        self.assertIn('Добавлено: 0, пропущено: 2', output)
+        self.assertEqual(get_catalogue_version(), version)
+
+        path = self.write('update.csv', 'сахар,г\nмолоко,мл\n')
+        output = self.run_import(path)
+        self.assertIn('Добавлено: 1, пропущено: 1', output)
+        self.assertNotEqual(get_catalogue_version(), version)
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    @mock.patch('foodgram.management.commands.import_csv.JSON_CHUNK_SIZE',
+                7)
+    def test_json(self):
+        """Массив и объекты по строкам читаются частями."""
+
+        contents = (
+            json.dumps(INGREDIENTS, ensure_ascii=False, indent=2),
+            '\n'.join(json.dumps(item, ensure_ascii=False)
+                      for item in INGREDIENTS),
+        )
+        for content in contents:
+            Ingredient.objects.all().delete()
+            path = self.write('ingredients.json', content)
+            with self.subTest(content=content[:20]):
+                output = self.run_import(path, '--batch-size', '3')
+                self.assertIn('Добавлено: 4, пропущено: 0, с ошибками: 0',
+                              output)
+                self.assertEqual(len(self.get_ingredients()), 4)
+
+    def test_json_errors(self):
+        path = self.write('ingredients.txt',
+                          '[{"name": "сахар"}, 1, {"name": "соль", '
+                          '"measurement_unit": "г"}]')
+        output = self.run_import(path, '--format', 'json')
+        self.assertIn('Добавлено: 1, пропущено: 0, с ошибками: 2', output)
+
+        path = self.write('broken.json', '[{"name": "сахар", ')
+        with self.assertRaises(CommandError):
+            self.run_import(path)
+
+    def test_unknown_format(self):
+        path = self.write('ingredients.txt', 'сахар,г\n')
+        with self.assertRaises(CommandError):
+            self.run_import(path)
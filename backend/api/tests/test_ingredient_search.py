@@ -0,0 +1,51 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.search import invalidate_ingredient_index
+from foodgram.models import Ingredient
+
+
+class IngredientSearchTestCase(TestCase):
+    """Поиск ингредиентов по началу, вхождению и с опечатками."""
+
+    url = '/api/ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('сгущенное молоко', 'молоко', 'молотый перец',
+                         'кокосовое молоко', 'мука', 'соль')
+        ])
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        invalidate_ingredient_index()
+        self.client = APIClient()
+
+    def search(self, query):
+        response = self.client.get(self.url, {'name': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.search('мол'), [
+            'молоко', 'молотый перец', 'кокосовое молоко', 'сгущенное молоко'
+        ])
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.search('МУК'), ['мука'])
+
+    def test_typo(self):
+        self.assertIn('молоко', self.search('малоко'))
+
+    def test_empty_result(self):
+        self.assertEqual(self.search('шоколад'), [])
+
+    def test_index_invalidation(self):
+        self.assertEqual(self.search('сах'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='сахар', measurement_unit='г')
+        self.assertEqual(self.search('сах'), ['сахар'])
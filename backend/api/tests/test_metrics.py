@@ -0,0 +1,136 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from rest_framework.test import APIClient
+
+from api import urls
+from api.async_views import urlpatterns as async_urlpatterns
+from api.metrics import (install_query_wrapper, metrics_view, record_query,
+                         registry)
+from foodgram.seed import seed_database
+
+User = get_user_model()
+
+
+def duplicate_queries_view(request):
+    for _ in range(3):
+        User.objects.filter(id=request.GET.get('id', 0)).exists()
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('api/', include(async_urlpatterns + urls.sync_urlpatterns)),
+    path('duplicates/', duplicate_queries_view, name='duplicates'),
+    path('metrics', metrics_view, name='metrics'),
+]
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    MIDDLEWARE=['api.middleware.request_metrics_middleware',
+                *settings.MIDDLEWARE],
+)
+class RequestMetricsTestCase(TestCase):
+    """Метрики запросов: лог в JSON и эндпоинт для Prometheus."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Учет запросов подключается к уже открытым соединениям, как при
+        запуске с REQUEST_METRICS=1 (см. ApiConfig.ready).
+        """
+
+        super().setUpClass()
+        install_query_wrapper()
+
+    @classmethod
+    def tearDownClass(cls):
+        connection_created.disconnect(install_query_wrapper)
+        for connection in connections.all():
+            if record_query in connection.execute_wrappers:
+                connection.execute_wrappers.remove(record_query)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_database(users_count=20, recipes_count=30)
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        registry.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_record(self, url, level='INFO'):
+        with self.assertLogs('api.middleware', level) as logs:
+            response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, level)
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_log_record(self):
+        response, record = self.get_record('/api/users/?limit=6')
+        self.assertEqual(record['view'], 'users-list')
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertGreaterEqual(record['duration_ms'], record['db_ms'])
+        self.assertEqual(record['response_bytes'], len(response.content))
+        self.assertEqual(record['duplicate_queries'], [])
+
+    def test_duplicate_queries(self):
+        _, record = self.get_record('/duplicates/', level='WARNING')
+        self.assertEqual(record['view'], 'duplicates')
+        self.assertEqual(len(record['duplicate_queries']), 1)
+        self.assertEqual(record['duplicate_queries'][0]['count'], 3)
+
+    def test_streaming_response(self):
+        _, record = self.get_record('/api/recipes/download_shopping_cart/')
+        self.assertEqual(record['view'], 'recipes-download-shopping-cart')
+        self.assertIsNone(record['response_bytes'])
+
+    async def test_async_view(self):
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            response = await self.async_client.get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'recipes-list')
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['serializer_ms'], 0)
+
+    def test_prometheus_endpoint(self):
+        with self.assertLogs('api.middleware', 'INFO'):
+            for _ in range(2):
+                self.client.get('/api/users/?limit=6')
+            self.client.get('/api/users/100500/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = response.content.decode().splitlines()
+        labels = 'view="users-list",method="GET"'
+        self.assertIn(
+            'foodgram_request_duration_seconds_bucket'
+            f'{{{labels},le="+Inf"}} 2',
+            lines,
+        )
+        self.assertIn(
+            f'foodgram_request_duration_seconds_count{{{labels}}} 2', lines
+        )
+        self.assertIn(
+            f'foodgram_requests_total{{{labels},status="200"}} 2', lines
+        )
+        self.assertIn(
+            'foodgram_requests_total{view="users-detail",method="GET",'
+            'status="404"} 1',
+            lines,
+        )
+        self.assertNotIn('view="metrics"', response.content.decode())
@@ -0,0 +1,110 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from foodgram.models import Recipe
+
+User = get_user_model()
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Пагинация по ключу для рецептов и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='reader@foodgram.ru',
+                                       username='reader')
+        authors = User.objects.bulk_create([
+            User(email=f'author{i}@foodgram.ru', username=f'author{i}')
+            for i in range(7)
+        ])
+        cls.user.subscriptions.set(authors)
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {i}',
+                   text='Текст',
+                   author=authors[i % len(authors)],
+                   cooking_time=5,
+                   image='recipes/images/test.png')
+            for i in range(25)
+        ])
+        # Одинаковая дата публикации у части рецептов проверяет
+        # устойчивость порядка по (pub_date, id).
+        Recipe.objects.filter(id__in=Recipe.objects.values('id')[:10]).update(
+            pub_date=timezone.now()
+        )
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+            pages += 1
+        return ids, pages
+
+    def test_recipes(self):
+        ids, pages = self.walk('/api/recipes/?pagination=cursor&limit=4')
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 7)
+
+    def test_subscriptions(self):
+        ids, _ = self.walk(
+            '/api/users/subscriptions/?pagination=cursor&limit=3'
+        )
+        self.assertEqual(ids, list(self.user.subscriptions.order_by(
+            'id'
+        ).values_list('id', flat=True)))
+
+    def test_count_on_request(self):
+        url = '/api/recipes/?pagination=cursor&limit=4'
+        self.assertNotIn('count', self.client.get(url).json())
+        self.assertEqual(self.client.get(url + '&count=1').json()['count'],
+                         25)
+
+    def test_no_offset_and_count(self):
+        first = self.client.get('/api/recipes/?pagination=cursor&limit=4')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.json()['next'])
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('COUNT', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            '/api/recipes/?pagination=cursor&cursor=broken'
+        )
+        self.assertEqual(response.status_code, 404)
+        for ordering, values in (('new', ['abc', 1]),
+                                 ('new', [None, 1]),
+                                 ('popular', ['x', 1]),
+                                 ('popular', [{'a': 1}, 1]),
+                                 ('popular', [1, [2]])):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            response = self.client.get(
+                f'/api/recipes/?pagination=cursor&ordering={ordering}'
+                f'&cursor={cursor}'
+            )
+            self.assertEqual(response.status_code, 404, values)
+
+    def test_page_number_by_default(self):
+        response = self.client.get('/api/recipes/?limit=4&page=2')
+        self.assertEqual(response.json()['count'], 25)
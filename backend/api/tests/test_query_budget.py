@@ -0,0 +1,133 @@
+import time
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.catalogue import get_tag_ids
+from api.search import invalidate_ingredient_index
+from foodgram.models import Recipe
+from foodgram.seed import seed_database
+
+MAX_SECONDS = 2
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Ограничения на количество SQL-запросов и время ответа эндпоинтов.
+
+    Количество запросов не должно зависеть от размера страницы,
+    поэтому каждый эндпоинт проверяется на маленькой и большой странице.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_database()
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def get_with_budget(self, client, url, max_queries):
+        """GET-запрос с проверкой количества запросов и времени ответа."""
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+            duration = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(queries),
+            max_queries,
+            f'{url}: {len(queries)} запросов вместо {max_queries}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        self.assertLess(duration, MAX_SECONDS, url)
+        return response, len(queries)
+
+    def assert_constant_queries(self, client, url, max_queries,
+                                small=6, large=50):
+        """Количество запросов одинаково для страниц разного размера."""
+
+        separator = '&' if '?' in url else '?'
+        _, small_count = self.get_with_budget(
+            client, f'{url}{separator}limit={small}', max_queries
+        )
+        response, large_count = self.get_with_budget(
+            client, f'{url}{separator}limit={large}', max_queries
+        )
+        self.assertEqual(small_count, large_count, url)
+        return response
+
+    def test_recipe_list_guest(self):
+        response = self.assert_constant_queries(
+            self.guest_client, '/api/recipes/', max_queries=4
+        )
+        self.assertEqual(len(response.json()['results']), 50)
+
+    def test_recipe_list_authorized(self):
+        self.assert_constant_queries(
+            self.authorized_client, '/api/recipes/', max_queries=5
+        )
+
+    def test_recipe_list_filters(self):
+        # Словарь тегов загружается один раз на версию справочников.
+        get_tag_ids()
+        for query in ('?tags=breakfast&tags=lunch',
+                      f'?author={self.user.id}',
+                      '?is_favorited=1',
+                      '?is_in_shopping_cart=1'):
+            with self.subTest(query=query):
+                self.assert_constant_queries(
+                    self.authorized_client, f'/api/recipes/{query}',
+                    max_queries=5
+                )
+
+    def test_recipe_retrieve(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.get_with_budget(self.guest_client, url, max_queries=3)
+        self.get_with_budget(self.authorized_client, url, max_queries=4)
+
+    def test_subscriptions(self):
+        self.assert_constant_queries(
+            self.authorized_client, '/api/users/subscriptions/',
+            max_queries=3
+        )
+        self.assert_constant_queries(
+            self.authorized_client,
+            '/api/users/subscriptions/?recipes_limit=3',
+            max_queries=3
+        )
+
+    def test_users_list(self):
+        self.assert_constant_queries(
+            self.authorized_client, '/api/users/', max_queries=2
+        )
+
+    def test_ingredients_search(self):
+        invalidate_ingredient_index()
+        response, _ = self.get_with_budget(
+            self.guest_client, '/api/ingredients/?name=мол', max_queries=2
+        )
+        self.assertTrue(response.json())
+        self.get_with_budget(
+            self.guest_client, '/api/ingredients/?name=мол', max_queries=1
+        )
+
+    def test_tags(self):
+        self.get_with_budget(self.guest_client, '/api/tags/', max_queries=1)
+
+    def test_download_shopping_cart(self):
+        self.get_with_budget(
+            self.authorized_client,
+            '/api/recipes/download_shopping_cart/',
+            max_queries=2
+        )
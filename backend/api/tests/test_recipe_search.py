@@ -0,0 +1,175 @@
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api.search import RecipeIndex, get_recipe_index, recipe_changelog, stem
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+RECIPES = (
+    ('Блины на молоке', 'Тонкие блины к завтраку.', ('молоко', 'мука')),
+    ('Сырники', 'Подавать со сметаной и блинами.', ('творог', 'мука')),
+    ('Овсяная каша', 'Варить на молоке десять минут.', ('овсянка',)),
+    ('Омлет', 'Взбить яйца.', ('яйцо', 'молоко')),
+)
+
+
+class RecipeIndexTestCase(SimpleTestCase):
+    """Обратный индекс рецептов в памяти."""
+
+    def setUp(self):
+        self.index = RecipeIndex(
+            [(pk, name, text) for pk, (name, text, _) in enumerate(RECIPES)],
+            [(pk, ingredient) for pk, (*_, ingredients) in enumerate(RECIPES)
+             for ingredient in ingredients],
+        )
+
+    def search(self, query):
+        return [pk for pk, _ in self.index.search(query)]
+
+    def test_stem(self):
+        self.assertEqual(stem('блинами'), stem('блины'))
+        self.assertEqual(stem('молоке'), stem('молоко'))
+        self.assertEqual(stem('яйца'), 'яйц')
+
+    def test_rank_by_field(self):
+        """Совпадение в названии важнее, чем в описании."""
+
+        self.assertEqual(self.search('блины'), [0, 1])
+
+    def test_all_words(self):
+        self.assertEqual(self.search('каша молоко'), [2])
+        self.assertEqual(self.search('каша творог'), [])
+
+    def test_ingredients(self):
+        self.assertEqual(set(self.search('молоко')), {0, 2, 3})
+        self.assertEqual(self.search('Творог'), [1])
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.search('мука', limit=1)), 1)
+        self.assertEqual(self.index.search('!!!'), [])
+
+    def test_apply(self):
+        self.assertEqual(set(self.search('молоко')), {0, 2, 3})
+        self.index.apply({0, 2, 5},
+                         [(0, 'Оладьи', 'На кефире.'), (5, 'Кефир', '')],
+                         [(0, 'кефир'), (0, 'мука'), (5, 'молоко')])
+        self.assertEqual(self.search('молоко'), [5, 3])
+        self.assertEqual(self.search('блины'), [1])
+        self.assertEqual(self.search('кефир'), [5, 0])
+        self.assertEqual(self.search('каша'), [])
+        self.assertNotIn(2, self.index.recipe_terms)
+
+
+class RecipeSearchTestCase(TestCase):
+    """Параметр ?search= списка рецептов."""
+
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(email='author@foodgram.ru',
+                                     username='author')
+        ingredients = {}
+        cls.recipes = []
+        for name, text, names in RECIPES:
+            recipe = Recipe.objects.create(name=name, text=text,
+                                           author=author, cooking_time=5,
+                                           image='recipes/images/test.png')
+            for ingredient_name in names:
+                if ingredient_name not in ingredients:
+                    ingredients[ingredient_name] = (
+                        Ingredient.objects.create(name=ingredient_name,
+                                                  measurement_unit='г')
+                    )
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredients[ingredient_name],
+                    amount=1,
+                )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def search(self, params):
+        response = self.client.get(self.url, {'limit': 10, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()['results']]
+
+    def test_ranked(self):
+        self.assertEqual(self.search({'search': 'блины'}),
+                         ['Блины на молоке', 'Сырники'])
+
+    def test_ordering(self):
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            favorites_count=5
+        )
+        self.assertEqual(
+            self.search({'search': 'блины', 'ordering': 'popular'}),
+            ['Сырники', 'Блины на молоке'],
+        )
+        response = self.client.get(self.url, {'ordering': 'relevance'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_keyset_pagination(self):
+        names = []
+        url = self.url + '?' + urlencode(
+            {'search': 'молоко', 'pagination': 'cursor', 'limit': 1}
+        )
+        while url:
+            data = self.client.get(url).json()
+            names += [item['name'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(names, self.search({'search': 'молоко'}))
+        self.assertEqual(len(names), 3)
+
+    def test_blank_query(self):
+        self.assertEqual(len(self.search({'search': '  '})), len(RECIPES))
+
+    def test_incremental_update(self):
+        """Изменения применяются к индексу без его перестройки."""
+
+        self.assertEqual(self.search({'search': 'оладьи'}), [])
+        index = get_recipe_index()
+        sequence = recipe_changelog.get_sequence()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.recipes[0]
+            recipe.name = 'Оладьи на молоке'
+            recipe.save()
+            recipe.recipeingredient_set.all().delete()
+            self.recipes[2].delete()
+        self.assertEqual(recipe_changelog.get_sequence(), sequence + 1)
+        self.assertEqual(self.search({'search': 'оладьи'}),
+                         ['Оладьи на молоке'])
+        self.assertEqual(self.search({'search': 'мука'}), ['Сырники'])
+        self.assertEqual(self.search({'search': 'молоко'}),
+                         ['Оладьи на молоке', 'Омлет'])
+        self.assertIs(get_recipe_index(), index)
+
+    def test_untracked_fields(self):
+        """Сохранение неиндексируемых полей не меняет журнал."""
+
+        get_recipe_index()
+        sequence = recipe_changelog.get_sequence()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.recipes[0]
+            recipe.image_renditions = {'source': recipe.image.name}
+            recipe.save(update_fields=['image_renditions'])
+            row = recipe.recipeingredient_set.first()
+            row.amount = 2
+            row.save(update_fields=['amount'])
+        self.assertEqual(recipe_changelog.get_sequence(), sequence)
+
+    def test_index_invalidation(self):
+        self.assertEqual(self.search({'search': 'оладьи'}), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.recipes[3]
+            recipe.text = 'Или испечь оладьи.'
+            recipe.save()
+        self.assertEqual(self.search({'search': 'оладьи'}), ['Омлет'])
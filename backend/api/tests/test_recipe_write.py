@@ -0,0 +1,239 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient, Tag)
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def get_image(size=(2, 2)):
+    """Картинка в base64, как её присылает фронтенд."""
+
+    buffer = BytesIO()
+    Image.new('RGB', size).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteTestCase(TestCase):
+    """Создание и редактирование рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+             for i in range(20)]
+        )
+        cls.lunch = Tag.objects.create(name='Обед', slug='lunch',
+                                       color='#49B64E')
+        cls.dinner = Tag.objects.create(name='Ужин', slug='dinner',
+                                        color='#8775D2')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, ingredients, tags=None):
+        return {
+            'tags': [tag.id for tag in tags or [self.lunch]],
+            'ingredients': [{'id': ingredient_id, 'amount': amount}
+                            for ingredient_id, amount in ingredients],
+            'image': get_image(),
+            'name': 'Суп',
+            'text': 'Текст',
+            'cooking_time': 30,
+        }
+
+    def create(self, ingredients):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/recipes/',
+                                        self.get_data(ingredients),
+                                        format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(queries)
+
+    def test_create_constant_queries(self):
+        few = self.create([(ing.id, 1) for ing in self.ingredients[:2]])
+        many = self.create([(ing.id, 1) for ing in self.ingredients])
+        self.assertEqual(few, many)
+
+    def test_missing_ingredients(self):
+        response = self.client.post('/api/recipes/', self.get_data(
+            [(self.ingredients[0].id, 1), (100500, 1), (100501, 1)]
+        ), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('100500, 100501', str(response.data['ingredients']))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_duplicate_ingredients(self):
+        ingredient = self.ingredients[0]
+        response = self.client.post('/api/recipes/', self.get_data(
+            [(ingredient.id, 1), (ingredient.id, 2)]
+        ), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(ingredient.id), str(response.data['ingredients']))
+
+    def update(self, recipe, ingredients):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/recipes/{recipe.id}/',
+                                         self.get_data(ingredients),
+                                         format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(queries)
+
+    def test_update_constant_queries(self):
+        """Число запросов не зависит от количества удаляемых строк."""
+
+        first, *rest = self.ingredients
+        counts = []
+        for removed in (rest[:2], rest):
+            self.create([(first.id, 1)]
+                        + [(ingredient.id, 1) for ingredient in removed])
+            recipe = Recipe.objects.latest('id')
+            counts.append(self.update(recipe, [(first.id, 2)]))
+            self.assertEqual(
+                list(recipe.recipeingredient_set.values_list('ingredient_id',
+                                                             'amount')),
+                [(first.id, 2)],
+            )
+        self.assertEqual(counts[0], counts[1])
+
+    def test_delete_constant_queries(self):
+        """Число запросов при удалении не зависит от ингредиентов."""
+
+        counts = []
+        for ingredients in (self.ingredients[:2], self.ingredients):
+            self.create([(ingredient.id, 1) for ingredient in ingredients])
+            recipe = Recipe.objects.latest('id')
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.delete(f'/api/recipes/{recipe.id}/')
+            self.assertEqual(response.status_code, 204)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_update_changes_only_diff(self):
+        first, second, third = self.ingredients[:3]
+        self.create([(first.id, 1), (second.id, 2)])
+        recipe = Recipe.objects.get()
+        kept = RecipeIngredient.objects.get(recipe=recipe, ingredient=first)
+
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            self.get_data([(first.id, 1), (third.id, 3)],
+                          tags=[self.dinner]),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            dict(recipe.recipeingredient_set.values_list('ingredient_id',
+                                                         'amount')),
+            {first.id: 1, third.id: 3},
+        )
+        self.assertTrue(RecipeIngredient.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(list(recipe.tags.all()), [self.dinner])
+
+    def test_invalid_image(self):
+        data = self.get_data([(self.ingredients[0].id, 1)])
+        data['image'] = 'data:image/png;base64,' + base64.b64encode(
+            b'not an image'
+        ).decode()
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_image_renditions(self):
+        data = self.get_data([(self.ingredients[0].id, 1)])
+        data['image'] = get_image((1600, 900))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data,
+                                        format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get()
+        renditions = recipe.image_renditions
+        self.assertEqual(renditions['source'], recipe.image.name)
+        with default_storage.open(renditions['card']['webp']) as file:
+            self.assertEqual(Image.open(file).size, (600, 338))
+        with default_storage.open(renditions['thumb']['webp']) as file:
+            self.assertEqual(Image.open(file).format, 'WEBP')
+        self.assertEqual(list(renditions['thumb']), ['webp'])
+
+        response = self.client.get('/api/recipes/?limit=1')
+        image = response.json()['results'][0]['image']
+        self.assertTrue(image.endswith(renditions['card']['webp']))
+        image = self.client.get(f'/api/recipes/{recipe.id}/').json()['image']
+        self.assertTrue(image.endswith(renditions['full']['webp']))
+
+    def test_image_without_renditions(self):
+        self.create([(self.ingredients[0].id, 1)])
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.image_renditions, {})
+        response = self.client.get('/api/recipes/?limit=1')
+        image = response.json()['results'][0]['image']
+        self.assertTrue(image.endswith(recipe.image.name))
+
+    def test_image_size(self):
+        data = self.get_data([(self.ingredients[0].id, 1)])
+        data['image'] = get_image((800, 800))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/recipes/', data, format='json')
+        recipe = Recipe.objects.get()
+        thumb = recipe.image_renditions['thumb']['webp']
+
+        response = self.client.get('/api/recipes/?limit=1&image_size=thumb')
+        self.assertTrue(
+            response.json()['results'][0]['image'].endswith(thumb)
+        )
+        response = self.client.get(
+            f'/api/recipes/{recipe.id}/?image_size=thumb'
+        )
+        self.assertTrue(response.json()['image'].endswith(thumb))
+        response = self.client.get('/api/recipes/?image_size=huge')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_renditions_removed(self):
+        data = self.get_data([(self.ingredients[0].id, 1)])
+        data['image'] = get_image((800, 800))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/recipes/', data, format='json')
+        recipe = Recipe.objects.get()
+        old = recipe.image_renditions['card']['webp']
+
+        data['image'] = get_image((900, 600))
+        # Удаление старых копий ставится в очередь из задачи,
+        # которая сама выполняется во внутреннем блоке.
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/recipes/{recipe.id}/', data,
+                                  format='json')
+        recipe.refresh_from_db()
+        new = recipe.image_renditions['card']['webp']
+        self.assertNotEqual(old, new)
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertFalse(default_storage.exists(new))
@@ -0,0 +1,111 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.response_cache import (GENERATION_KEY, LIST_GENERATION_KEY,
+                                get_recipes_cache)
+from foodgram.models import Recipe, Tag
+
+User = get_user_model()
+
+
+class RecipeResponseCacheTestCase(TestCase):
+    """Кеширование списка и страниц рецептов для анонимов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(email='chef@foodgram.ru',
+                                         username='chef')
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch',
+                                     color='#49B64E')
+        cls.recipe = Recipe.objects.create(name='Суп',
+                                           text='Текст',
+                                           author=cls.author,
+                                           cooking_time=30,
+                                           image='recipes/images/test.png')
+        cls.recipe.tags.add(cls.tag)
+        Tag.objects.create(name='Ужин', slug='dinner', color='#8775D2')
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.list_url = '/api/recipes/?limit=6&tags=lunch'
+        self.detail_url = f'/api/recipes/{self.recipe.id}/'
+
+    def test_list_and_detail_hit(self):
+        for url in (self.list_url, self.detail_url):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_normalized_params(self):
+        self.client.get('/api/recipes/?tags=lunch&tags=dinner&limit=6')
+        response = self.client.get(
+            '/api/recipes/?limit=6&tags=dinner&tags=lunch'
+        )
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_unknown_params_bypass(self):
+        response = self.client.get('/api/recipes/?limit=6&foo=bar')
+        self.assertNotIn('X-Cache', response)
+
+    def test_authorized_bypass(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.get(self.list_url)
+        self.assertNotIn('X-Cache', response)
+
+    def test_recipe_update_invalidates(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Борщ'
+            self.recipe.save()
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'Борщ')
+
+    def test_other_recipe_detail_kept(self):
+        other = Recipe.objects.create(name='Каша',
+                                      text='Текст',
+                                      author=self.author,
+                                      cooking_time=10,
+                                      image='recipes/images/test.png')
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'HIT')
+
+    def test_tag_change_invalidates(self):
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'Ланч'
+            self.tag.save()
+        self.assertEqual(self.client.get(self.list_url)['X-Cache'], 'MISS')
+
+    def test_evicted_generation(self):
+        """Вытесненное поколение не совпадает с прежним."""
+
+        self.client.get(self.list_url)
+        get_recipes_cache().delete_many([GENERATION_KEY,
+                                         LIST_GENERATION_KEY])
+        self.assertEqual(self.client.get(self.list_url)['X-Cache'], 'MISS')
+
+    def test_stats(self):
+        self.client.get(self.list_url)
+        self.client.get(self.list_url)
+        out = StringIO()
+        call_command('recipes_cache_stats', '--reset', stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        out = StringIO()
+        call_command('recipes_cache_stats', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['hits'], 0)
@@ -0,0 +1,177 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient, Tag)
+
+User = get_user_model()
+
+
+class ShoppingCartDownloadTestCase(TestCase):
+    """Выгрузка списка покупок в разных форматах."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        sugar = Ingredient.objects.create(name='sugar',
+                                          measurement_unit='г')
+        sugar_upper = Ingredient.objects.create(name='Sugar',
+                                                measurement_unit='г')
+        apple = Ingredient.objects.create(name='apple',
+                                          measurement_unit='шт')
+        for amount, ingredient in ((100, sugar), (50, sugar_upper),
+                                   (3, apple)):
+            recipe = Recipe.objects.create(name='Рецепт',
+                                           text='Текст',
+                                           author=cls.user,
+                                           cooking_time=5,
+                                           image='recipes/images/test.png')
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=ingredient,
+                                            amount=amount)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for recipe in Recipe.objects.all():
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def download(self, file_format=None):
+        url = self.url + (f'?format={file_format}' if file_format else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_txt_is_default(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertIn('cart.txt', response['Content-Disposition'])
+        self.assertEqual(content.decode(),
+                         'Apple (шт)- 3 \nSugar (г)- 150 \n')
+
+    def test_csv(self):
+        response, content = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(content.decode().splitlines()[1:],
+                         ['Apple,шт,3', 'Sugar,г,150'])
+
+    def test_json(self):
+        response, content = self.download('json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(content), [
+            {'name': 'Apple', 'measurement_unit': 'шт', 'amount': 3},
+            {'name': 'Sugar', 'measurement_unit': 'г', 'amount': 150},
+        ])
+
+    def test_pdf(self):
+        response, content = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url + '?format=xls')
+        self.assertEqual(response.status_code, 404)
+
+
+class ShoppingCartIngredientTestCase(TestCase):
+    """Поддержание сумм ингредиентов в списке покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        cls.salt = Ingredient.objects.create(name='соль',
+                                             measurement_unit='г')
+        cls.flour = Ingredient.objects.create(name='мука',
+                                              measurement_unit='г')
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch',
+                                     color='#49B64E')
+        cls.recipe = Recipe.objects.create(name='Хлеб',
+                                           text='Текст',
+                                           author=cls.user,
+                                           cooking_time=60,
+                                           image='recipes/images/test.png')
+        cls.recipe.tags.add(cls.tag)
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.salt,
+                                        amount=5)
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.flour,
+                                        amount=500)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def amounts(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_add_and_remove(self):
+        self.client.post(self.url + 'shopping_cart/')
+        self.assertEqual(self.amounts(),
+                         {self.salt.id: 5, self.flour.id: 500})
+        self.client.delete(self.url + 'shopping_cart/')
+        self.assertEqual(self.amounts(), {})
+
+    def test_recipe_update(self):
+        self.client.post(self.url + 'shopping_cart/')
+        response = self.client.patch(self.url, {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.flour.id, 'amount': 300}],
+            'name': 'Хлеб',
+            'text': 'Текст',
+            'cooking_time': 60,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.amounts(), {self.flour.id: 300})
+
+    def test_recipe_delete(self):
+        self.client.post(self.url + 'shopping_cart/')
+        self.client.delete(self.url)
+        self.assertEqual(self.amounts(), {})
+
+    def test_model_changes(self):
+        """Изменения через модели, как в админке."""
+
+        self.user.shopping_cart.set([self.recipe])
+        self.assertEqual(self.amounts(),
+                         {self.salt.id: 5, self.flour.id: 500})
+        row = RecipeIngredient.objects.get(ingredient=self.flour)
+        row.amount = 300
+        row.save()
+        sugar = Ingredient.objects.create(name='сахар', measurement_unit='г')
+        row = RecipeIngredient.objects.get(ingredient=self.salt)
+        row.ingredient = sugar
+        row.save()
+        self.assertEqual(self.amounts(), {self.flour.id: 300, sugar.id: 5})
+        row.delete()
+        self.assertEqual(self.amounts(), {self.flour.id: 300})
+        self.recipe.in_shopping_cart.clear()
+        self.assertEqual(self.amounts(), {})
+        self.recipe.in_shopping_cart.add(self.user)
+        self.recipe.delete()
+        self.assertEqual(self.amounts(), {})
+        call_command('rebuild_shopping_cart', '--check', stdout=StringIO())
+
+    def test_rebuild_command(self):
+        Recipe.in_shopping_cart.through.objects.create(user=self.user,
+                                                       recipe=self.recipe)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shopping_cart', '--check',
+                         stdout=StringIO())
+        call_command('rebuild_shopping_cart', stdout=StringIO())
+        call_command('rebuild_shopping_cart', '--check', stdout=StringIO())
+        self.assertEqual(self.amounts(),
+                         {self.salt.id: 5, self.flour.id: 500})
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+class SparseFieldsTestCase(TestCase):
+    """Выбор полей ответа параметрами ?fields= и ?expand=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cook@foodgram.ru',
+                                       username='cook')
+        cls.author = User.objects.create(email='chef@foodgram.ru',
+                                         username='chef')
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch',
+                                     color='#49B64E')
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+        cls.recipe = Recipe.objects.create(name='Суп', text='Текст',
+                                           author=cls.author,
+                                           cooking_time=30,
+                                           image='recipes/images/test.png')
+        cls.recipe.tags.add(cls.tag)
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.ingredient, amount=5)
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def get_item(self, query, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get(f'/api/recipes/?limit=6&{query}')
+        self.assertEqual(response.status_code, 200, query)
+        return response.json()['results'][0]
+
+    def test_fields(self):
+        item = self.get_item('fields=id,name,image,cooking_time')
+        self.assertEqual(list(item), ['id', 'name', 'image', 'cooking_time'])
+        response = self.client.get(
+            f'/api/recipes/{self.recipe.id}/?fields=name,text'
+        )
+        self.assertEqual(response.json(), {'name': 'Суп', 'text': 'Текст'})
+
+    def test_collapsed_relations(self):
+        item = self.get_item('fields=author,tags,ingredients')
+        self.assertEqual(item, {'tags': [self.tag.id],
+                                'author': self.author.id,
+                                'ingredients': [self.ingredient.id]})
+
+    def test_expand(self):
+        item = self.get_item('fields=id&expand=author,ingredients',
+                             user=self.user)
+        self.assertEqual(list(item), ['id', 'author', 'ingredients'])
+        self.assertEqual(item['author']['username'], 'chef')
+        self.assertFalse(item['author']['is_subscribed'])
+        self.assertEqual(item['ingredients'][0]['amount'], 5)
+        item = self.get_item('expand=tags', user=self.user)
+        self.assertEqual(item['tags'][0]['slug'], 'lunch')
+        self.assertEqual(item['author'], self.author.id)
+        self.assertFalse(item['is_favorited'])
+
+    def test_default(self):
+        item = self.get_item('', user=self.user)
+        self.assertEqual(item['author']['id'], self.author.id)
+        self.assertEqual(item['tags'][0]['id'], self.tag.id)
+        self.assertEqual(item['ingredients'][0]['id'], self.ingredient.id)
+
+    def test_invalid(self):
+        for query in ('fields=id,password', 'expand=name'):
+            response = self.client.get(f'/api/recipes/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_queries(self):
+        """Незапрошенные поля и связи не читаются из БД."""
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as full:
+            self.client.get('/api/recipes/')
+        with CaptureQueriesContext(connection) as sparse:
+            self.client.get('/api/recipes/?fields=id,name,cooking_time')
+        self.assertEqual(len(full) - len(sparse), 3)
+        sql = '\n'.join(query['sql'] for query in sparse)
+        for column in ('"text"', '"image_renditions"', 'recipe_favorited'):
+            self.assertNotIn(column, sql)
+
+    def test_cache_key(self):
+        self.get_item('fields=id')
+        response = self.client.get('/api/recipes/?limit=6&fields=id,name')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(list(response.json()['results'][0]),
+                         ['id', 'name'])
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram.counters import reconcile_counters
+from foodgram.models import Recipe
+
+User = get_user_model()
+
+
+class SubscriptionsTestCase(TestCase):
+    """Страница подписок."""
+
+    url = '/api/users/subscriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='reader@foodgram.ru',
+                                       username='reader')
+        cls.authors = User.objects.bulk_create([
+            User(email=f'author{i}@foodgram.ru', username=f'author{i}')
+            for i in range(4)
+        ])
+        cls.user.subscriptions.set(cls.authors)
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {i}',
+                   text='Текст',
+                   author=author,
+                   cooking_time=5,
+                   image='recipes/images/test.png')
+            for author in cls.authors
+            for i in range(5)
+        ])
+        reconcile_counters()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipes_limit(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url + '?limit=10&recipes_limit=2')
+        for item in response.json()['results']:
+            expected = list(Recipe.objects.filter(
+                author_id=item['id']
+            ).order_by('id').values_list('id', flat=True)[:2])
+            self.assertEqual(
+                [recipe['id'] for recipe in item['recipes']], expected
+            )
+            self.assertEqual(item['recipes_count'], 5)
+            self.assertTrue(item['is_subscribed'])
+
+    def test_without_recipes_limit(self):
+        response = self.client.get(self.url + '?limit=10')
+        for item in response.json()['results']:
+            self.assertEqual(len(item['recipes']), 5)
+
+    def test_invalid_recipes_limit(self):
+        author = User.objects.create(email='new@foodgram.ru',
+                                     username='new')
+        for value in ('abc', '-1', '0', '1.5'):
+            response = self.client.get(self.url + f'?recipes_limit={value}')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('recipes_limit', response.json())
+            response = self.client.post(
+                f'/api/users/{author.id}/subscribe/?recipes_limit={value}'
+            )
+            self.assertEqual(response.status_code, 400, value)
+        self.assertFalse(self.user.subscriptions.filter(pk=author.pk).exists())
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import Recipe, Tag
+
+User = get_user_model()
+
+
+class TagFilterTestCase(TestCase):
+    """Фильтр рецептов по тегам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(email='chef@foodgram.ru',
+                                     username='chef')
+        tags = {
+            slug: Tag.objects.create(name=name, slug=slug, color=color)
+            for slug, name, color in (('breakfast', 'Завтрак', '#E26C2D'),
+                                      ('lunch', 'Обед', '#49B64E'),
+                                      ('dinner', 'Ужин', '#8775D2'))
+        }
+        cls.recipes = {}
+        for name, slugs in (('Каша', ('breakfast',)),
+                            ('Суп', ('lunch', 'dinner')),
+                            ('Омлет', ('breakfast', 'lunch', 'dinner')),
+                            ('Салат', ())):
+            recipe = Recipe.objects.create(name=name, text='Текст',
+                                           author=author, cooking_time=5,
+                                           image='recipes/images/test.png')
+            recipe.tags.set([tags[slug] for slug in slugs])
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def get_names(self, query):
+        response = self.client.get(f'/api/recipes/?limit=2&{query}')
+        self.assertEqual(response.status_code, 200, query)
+        data = response.json()
+        names = [item['name'] for item in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            names += [item['name'] for item in data['results']]
+        self.assertEqual(len(names), response.json()['count'], query)
+        return names
+
+    def test_any(self):
+        self.assertEqual(self.get_names('tags=lunch&tags=dinner'),
+                         ['Омлет', 'Суп'])
+        self.assertEqual(self.get_names('tags=breakfast&tags=lunch'),
+                         ['Омлет', 'Суп', 'Каша'])
+
+    def test_all(self):
+        self.assertEqual(
+            self.get_names('tags=lunch&tags=dinner&tags_mode=all'),
+            ['Омлет', 'Суп'],
+        )
+        self.assertEqual(
+            self.get_names('tags=breakfast&tags=dinner&tags_mode=all'),
+            ['Омлет'],
+        )
+        self.assertEqual(self.get_names('tags_mode=all'),
+                         ['Салат', 'Омлет', 'Суп', 'Каша'])
+
+    def test_invalid(self):
+        for query in ('tags=brunch', 'tags=lunch&tags_mode=some'):
+            response = self.client.get(f'/api/recipes/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_single_query(self):
+        """Теги не читаются из БД, строки рецептов не размножаются."""
+
+        self.client.get('/api/recipes/?tags=lunch')
+        with CaptureQueriesContext(connection) as unfiltered:
+            self.client.get('/api/recipes/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/recipes/?tags=breakfast&tags=dinner'
+                            '&tags_mode=all')
+        self.assertEqual(len(queries), len(unfiltered))
+        self.assertFalse(any('DISTINCT' in query['sql']
+                             for query in queries))
+
+    def test_catalogue_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='Перекус', slug='snack',
+                                     color='#000000')
+        self.recipes['Салат'].tags.add(tag)
+        self.assertEqual(self.get_names('tags=snack'), ['Салат'])
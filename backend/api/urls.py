@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -17,7 +18,14 @@ router.register(r'users',
                 views.CustomUserView,
                 basename='users')
 
-urlpatterns = [
+sync_urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+urlpatterns = sync_urlpatterns
+
+if settings.ASYNC_VIEWS:
+    from .async_views import urlpatterns as async_urlpatterns
+
+    urlpatterns = async_urlpatterns + sync_urlpatterns
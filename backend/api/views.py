@@ -1,26 +1,56 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.images import RENDITION_SIZES
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCartIngredient, Tag)
+from foodgram.recommendations import get_recommended_recipes
+
+from .catalogue import CatalogueViewMixin
+from .cookable import get_cookable_index
 from .filters import IngredientFilter, RecipeFilter
-from .paginators import CustomPaginator
+from .paginators import CustomPaginator, RankedPaginator
 from .permissions import OwnerOrReadOnly, ReadOnly
-from .serializers import (CustomUserSerializer, IngredientSerializer,
+from .renderers import SHOPPING_CART_RENDERERS
+from .response_cache import (acached_response, cached_response,
+                             get_detail_cache_key, get_list_cache_key)
+from .serializers import (CookableQuerySerializer, CookableRecipeSerializer,
+                          CustomUserSerializer, IngredientSerializer,
                           RecipeCreateSerializer, RecipeGetSerializer,
                           SubscribeGetSerializer, TagSerializer)
-from .views_utils import add_to_field
+from .serializers_utils import get_recipes_limit
+from .shopping_cart import get_cart_items, get_cart_queryset, get_cart_response
+from .views_utils import (add_to_field, attach_authors_recipes,
+                          bulk_change_relation, toggle_relation)
 
 User = get_user_model()
 
+# Сортировки списка рецептов (?ordering=), последнее поле - для
+# однозначного порядка при пагинации по ключу.
+RECIPE_ORDERINGS = {
+    'new': ('-pub_date', '-id'),
+    'popular': ('-favorites_count', '-id'),
+    'relevance': ('-search_rank', '-id'),
+}
+# Столбцы рецепта, которые не читаются, если поле не запрошено в ?fields=.
+RECIPE_FIELD_COLUMNS = {
+    'text': ('text',),
+    'image': ('image', 'image_renditions'),
+}
+
 
-class TagViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class TagViewSet(CatalogueViewMixin, mixins.ListModelMixin,
+                 viewsets.GenericViewSet):
     """Вьюсет для тегов."""
 
     queryset = Tag.objects.all()
@@ -28,7 +58,8 @@ class TagViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = (AllowAny, )
 
 
-class IngredientsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class IngredientsViewSet(CatalogueViewMixin, mixins.ListModelMixin,
+                         viewsets.GenericViewSet):
     """Вьюсет для ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -48,17 +79,213 @@ class RecipeViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def keyset_ordering(self):
+        """
+        Сортировка по параметру ?ordering=: new (сначала новые), popular
+        (по количеству добавлений в избранное) или relevance (по
+        релевантности, только с ?search=). По умолчанию relevance при
+        поиске и new без него.
+        """
+
+        searching = bool(
+            self.request.query_params.get('search', '').strip()
+        )
+        orderings = [name for name in RECIPE_ORDERINGS
+                     if searching or name != 'relevance']
+        ordering = self.request.query_params.get(
+            'ordering', 'relevance' if searching else 'new'
+        )
+        if ordering not in orderings:
+            raise ValidationError({'ordering': (
+                f'Допустимые значения: {", ".join(orderings)}.'
+            )})
+        return RECIPE_ORDERINGS[ordering]
+
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset).order_by(
+            *self.keyset_ordering
+        )
+
     def get_serializer_class(self):
         """Выбор сериализатора для рецептов."""
 
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'recommended']:
             return RecipeGetSerializer
+        if self.action == 'cookable':
+            return CookableRecipeSerializer
         return RecipeCreateSerializer
 
+    def get_fieldset(self):
+        """
+        Состав ответа по параметрам ?fields= (поля) и ?expand= (связи,
+        которые отдаются вложенными объектами): пара множеств имен,
+        None - параметр не задан.
+        """
+
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, RecipeGetSerializer):
+            return None, None
+        fieldset = []
+        for param, allowed in (('fields', serializer_class.Meta.fields),
+                               ('expand', serializer_class.relations)):
+            names = {
+                name.strip()
+                for name in self.request.query_params.get(param, '').split(',')
+                if name.strip()
+            }
+            if names - set(allowed):
+                raise ValidationError({param: (
+                    f'Допустимые значения: {", ".join(allowed)}.'
+                )})
+            fieldset.append(names or None)
+        return tuple(fieldset)
+
+    def get_serializer_context(self):
+        """
+        Размер копий фото и состав полей в ответе.
+
+        По умолчанию в списке отдаются копии для карточек, в рецепте —
+        крупные, параметр ?image_size= задает размер явно.
+        """
+
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_fieldset()
+        if self.action == 'retrieve':
+            context['image_size'] = 'full'
+        image_size = self.request.query_params.get('image_size')
+        if image_size is not None:
+            if image_size not in RENDITION_SIZES:
+                raise ValidationError({'image_size': (
+                    f'Допустимые значения: {", ".join(RENDITION_SIZES)}.'
+                )})
+            context['image_size'] = image_size
+        return context
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            get_list_cache_key(request),
+            lambda: super(RecipeViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            get_detail_cache_key(request, kwargs['pk']),
+            lambda: super(RecipeViewSet, self).retrieve(request, *args,
+                                                        **kwargs),
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        """Асинхронный вариант list для ASGI."""
+
+        async def get_response():
+            queryset = await sync_to_async(self.filter_queryset)(
+                self.get_queryset()
+            )
+            page = await self.paginator.apaginate_queryset(queryset, request,
+                                                           view=self)
+            if page is None:
+                serializer = self.get_serializer(
+                    [obj async for obj in queryset], many=True
+                )
+                return Response(serializer.data)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        return await acached_response(request, get_list_cache_key,
+                                      get_response)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Асинхронный вариант retrieve для ASGI."""
+
+        async def get_response():
+            queryset = await sync_to_async(self.filter_queryset)(
+                self.get_queryset()
+            )
+            instance = await queryset.filter(pk=kwargs['pk']).afirst()
+            if instance is None:
+                raise Http404
+            self.check_object_permissions(request, instance)
+            return Response(self.get_serializer(instance).data)
+
+        return await acached_response(request, get_detail_cache_key,
+                                      get_response, kwargs['pk'])
+
     def get_queryset(self):
-        return Recipe.objects.prefetch_related('ingredients',
-                                               'tags',
-                                               'author').all()
+        """
+        Рецепты со связями и отметками, которые попадут в ответ: поля и
+        связи, не запрошенные в ?fields=, не читаются и не
+        предзагружаются, связи без ?expand= читаются только как id.
+        """
+
+        user = self.request.user
+        fields, expand = self.get_fieldset()
+
+        def requested(name):
+            return (fields is None or name in fields
+                    or name in (expand or ()))
+
+        def expanded(name):
+            if fields is None and expand is None:
+                return True
+            return name in (expand or ())
+
+        queryset = Recipe.objects.defer('search_vector', *(
+            column
+            for name, columns in RECIPE_FIELD_COLUMNS.items()
+            if not requested(name)
+            for column in columns
+        ))
+        if requested('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipeingredient_set',
+                queryset=(
+                    RecipeIngredient.objects.select_related('ingredient')
+                    if expanded('ingredients')
+                    else RecipeIngredient.objects.only('recipe_id',
+                                                       'ingredient_id')
+                ),
+            ))
+        if requested('tags'):
+            queryset = queryset.prefetch_related(
+                'tags' if expanded('tags') else 'recipetag_set'
+            )
+        if user.is_anonymous:
+            if requested('author') and expanded('author'):
+                return queryset.select_related('author')
+            return queryset
+
+        if requested('author') and expanded('author'):
+            authors = User.objects.annotate(
+                is_subscribed=Exists(
+                    User.subscriptions.through.objects.filter(
+                        from_user=user,
+                        to_user=OuterRef('pk'),
+                    )
+                )
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch('author', queryset=authors)
+            )
+        if requested('is_favorited'):
+            queryset = queryset.annotate(
+                is_favorited=Exists(Recipe.favorited.through.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk'),
+                ))
+            )
+        if requested('is_in_shopping_cart'):
+            queryset = queryset.annotate(
+                is_in_shopping_cart=Exists(
+                    Recipe.in_shopping_cart.through.objects.filter(
+                        user=user,
+                        recipe=OuterRef('pk'),
+                    )
+                )
+            )
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -112,39 +339,147 @@ class RecipeViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
                                 **kwargs)
         return Response(response.data)
 
+    @action(
+        detail=False,
+        methods=[
+            'post',
+            'delete',
+        ],
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite',
+        url_name='favorite-bulk',
+    )
+    def favorite_bulk(self, request):
+        """
+        Добавление в избранное и удаление из него списка рецептов
+        {"ids": [...]}.
+        """
+
+        return bulk_change_relation(request, Recipe,
+                                    Recipe.favorited.through,
+                                    'user', 'recipe_id')
+
+    @action(
+        detail=False,
+        methods=[
+            'post',
+            'delete',
+        ],
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+    )
+    def in_shopping_cart_bulk(self, request):
+        """
+        Добавление в список покупок и удаление из него списка рецептов
+        {"ids": [...]}.
+        """
+
+        def on_change(recipe_ids, sign):
+            ShoppingCartIngredient.objects.add_recipes(request.user,
+                                                       recipe_ids, sign)
+
+        return bulk_change_relation(request, Recipe,
+                                    Recipe.in_shopping_cart.through,
+                                    'user', 'recipe_id', on_change)
+
+    @action(
+        detail=False,
+        methods=[
+            'get',
+        ],
+        pagination_class=RankedPaginator,
+        url_path='cookable',
+    )
+    def cookable(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов
+        `?ingredients=1,2,3`.
+
+        Рецепты, в которых есть хотя бы один из ингредиентов: сначала те,
+        для которых есть все ингредиенты, затем по возрастанию числа
+        недостающих, при равенстве сначала новые.
+        """
+
+        serializer = CookableQuerySerializer(data={'ingredients': [
+            value
+            for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value.strip()
+        ]})
+        serializer.is_valid(raise_exception=True)
+        page = self.paginate_queryset(
+            get_cookable_index().search(
+                serializer.validated_data['ingredients']
+            )
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        results = []
+        for recipe_id, matched_count, missing_count in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                # Рецепт удален после построения индекса.
+                continue
+            recipe.matched_count = matched_count
+            recipe.missing_count = missing_count
+            results.append(recipe)
+        return self.get_paginated_response(
+            self.get_serializer(results, many=True).data
+        )
+
+    @action(
+        detail=False,
+        methods=[
+            'get',
+        ],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=RankedPaginator,
+        url_path='recommended',
+    )
+    def recommended(self, request):
+        """
+        Лента рекомендаций: рецепты, похожие на избранное и список
+        покупок пользователя.
+        """
+
+        queryset = get_recommended_recipes(self.get_queryset(), request.user)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
     @action(
         detail=False,
         methods=[
             'get',
         ],
         permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
         url_path='download_shopping_cart',
     )
     def download_shopping_cart(self, request):
-        """Загрузка списка покупок."""
+        """
+        Загрузка списка покупок.
 
-        user = self.request.user
-        recipes = user.shopping_cart.all()
-        line_break = '\n'
-        ings = Ingredient.objects.filter(recipeingredient__recipe__in=recipes)
-        ing_values = ings.values(
-            'name',
-            'measurement_unit').annotate(
-                amount=Sum('recipeingredient__amount'))
-        result = []
-        for value in ing_values:
-            name = value['name']
-            maesurement_unit = value['measurement_unit']
-            amount = value['amount']
-            result.append(
-                (f'{ name.capitalize() } ({ maesurement_unit })'
-                 f'- { amount } { line_break }')
-            )
-        return HttpResponse(result, headers={
-            'Content-Type': 'text/plain',
-            'Content-Disposition': 'attachment; filename="cart.txt"',
-            }
-        )
+        Формат выбирается параметром `?format=txt|csv|json|pdf`,
+        по умолчанию txt.
+        """
+
+        return get_cart_response(request.accepted_renderer,
+                                 get_cart_items(request.user))
+
+    async def adownload_shopping_cart(self, request):
+        """
+        Асинхронный вариант download_shopping_cart для ASGI.
+
+        Строки списка выбираются асинхронным ORM заранее: в Django 4.1
+        ASGI-сервер перебирает потоковый ответ в цикле событий, где
+        синхронные запросы к БД запрещены.
+        """
+
+        items = [item async for item in get_cart_queryset(request.user)]
+        return get_cart_response(request.accepted_renderer, items)
 
 
 class CustomUserView(UserViewSet):
@@ -154,6 +489,18 @@ class CustomUserView(UserViewSet):
     pagination_class = CustomPaginator
     serializer_class = CustomUserSerializer
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(User.subscriptions.through.objects.filter(
+                from_user=user,
+                to_user=OuterRef('pk'),
+            ))
+        )
+
     @action(
         detail=True,
         methods=[
@@ -167,30 +514,58 @@ class CustomUserView(UserViewSet):
     def subscribe(self, request, **kwargs):
         """Подписка на пользователя и отписка от него."""
 
-        author = User.objects.get(id=kwargs['id'])
+        author = get_object_or_404(User, id=kwargs['id'])
         user = self.request.user
-        if request.method == 'POST':
-            if author == user:
-                return Response({'errors': 'Нельзя подписаться на себя.'})
-            if user.subscriptions.filter(pk=author.id).exists():
-                return Response({'errors': 'Вы уже подписаны на автора.'})
-            user.subscriptions.add(author)
-        if request.method == 'DELETE':
-            if user.subscriptions.filter(pk=author.id).exists():
-                user.subscriptions.remove(author)
-            else:
-                return Response({'errors': 'Вы не подписаны на автора.'})
+        get_recipes_limit(request)
+        if request.method == 'POST' and author == user:
+            return Response({'errors': 'Нельзя подписаться на себя.'})
+        changed = toggle_relation(request, User.subscriptions.through,
+                                  from_user_id=user.id, to_user_id=author.id)
+        if not changed and request.method == 'POST':
+            return Response({'errors': 'Вы уже подписаны на автора.'})
+        if not changed:
+            return Response({'errors': 'Вы не подписаны на автора.'})
         serializer = self.get_serializer(author)
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=[
+            'post',
+            'delete',
+        ],
+        permission_classes=(IsAuthenticated,),
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+    )
+    def subscribe_bulk(self, request):
+        """Подписка на список авторов {"ids": [...]} и отписка от них."""
+
+        return bulk_change_relation(request, User,
+                                    User.subscriptions.through,
+                                    'from_user', 'to_user_id')
+
 
 class SubscriptionView(UserViewSet):
     """Вьюсет для подписок пользователя."""
 
     pagination_class = CustomPaginator
+    keyset_ordering = ('id',)
     serializer_class = SubscribeGetSerializer
     permission_classes = (IsAuthenticated, )
 
     def get_queryset(self):
         user = self.request.user
-        return user.subscriptions.all()
+        return user.subscriptions.annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = list(queryset) if page is None else page
+        attach_authors_recipes(authors, get_recipes_limit(request))
+        serializer = self.get_serializer(authors, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
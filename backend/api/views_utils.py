@@ -1,26 +1,196 @@
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import F, Window
+from django.db.models.constants import OnConflict
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.db.models.sql import InsertQuery
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 
-from foodgram.models import Recipe
+from foodgram.counters import RELATION_COUNTERS, update_relation_counters
+from foodgram.models import Recipe, ShoppingCartIngredient
+
+from .serializers import BulkIdsSerializer, RecipeForSubscriptionsSerializer
+
+User = get_user_model()
+
+
+def insert_ignore(model, **values):
+    """
+    Добавление строки одним запросом INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает True, если строка добавлена, и False, если такая строка
+    уже есть. values - значения полей по attname (например, user_id).
+    """
 
-from .serializers import RecipeForSubscriptionsSerializer
+    using = router.db_for_write(model)
+    query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+    query.insert_values([model._meta.get_field(name) for name in values],
+                        [model(**values)])
+    with connections[using].cursor() as cursor:
+        for statement, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(statement, params)
+        return cursor.rowcount > 0
+
+
+def lock_user(user):
+    """
+    Блокировка строки пользователя до конца транзакции: изменения связей
+    одного пользователя (по одной и пакетом) выполняются по очереди.
+    """
+
+    users = User.objects.filter(pk=user.pk)
+    if connections[router.db_for_write(User)].features.has_select_for_update:
+        list(users.select_for_update().values_list('pk'))
+    else:
+        # SQLite: SELECT не блокирует запись, пустой UPDATE сразу берет
+        # блокировку записи базы до конца транзакции.
+        users.update(id=F('id'))
+
+
+def toggle_relation(request, through, **values):
+    """
+    Добавление (POST) или удаление (DELETE) строки связи одним условным
+    запросом. Возвращает True, если связь изменилась.
+
+    Счетчик связанного объекта меняется в той же транзакции.
+    """
+
+    adding = request.method == 'POST'
+    with transaction.atomic():
+        lock_user(request.user)
+        if adding:
+            changed = insert_ignore(through, **values)
+        else:
+            deleted, _ = through.objects.filter(**values).delete()
+            changed = deleted > 0
+        if changed:
+            update_relation_counters(
+                through, [values[RELATION_COUNTERS[through].column]],
+                1 if adding else -1,
+            )
+    return changed
 
 
 def add_to_field(self, request, field_name, message, **kwargs):
     """
     Метод для добавления и удаления значений в ManyToManyField модели Recipe.
+
+    Связь меняется одним условным запросом, поэтому повторные и
+    одновременные запросы не приводят к ошибке и не меняют список покупок
+    дважды.
     """
 
     recipe = get_object_or_404(Recipe, id=kwargs['pk'])
     user = self.request.user
-    field_value = getattr(recipe, field_name)
-    if request.method == 'POST':
-        if field_value.filter(pk=user.id).exists():
-            return Response({'errors': f'Рецепт уже в { message }.'})
-        field_value.add(user)
-    if request.method == 'DELETE':
-        if field_value.filter(pk=user.id).exists():
-            field_value.remove(user)
-        else:
-            return Response({'errors': f'Рецепта нет в { message }.'})
+    in_shopping_cart = field_name == 'in_shopping_cart'
+    with transaction.atomic() if in_shopping_cart else nullcontext():
+        changed = toggle_relation(request,
+                                  getattr(Recipe, field_name).through,
+                                  recipe_id=recipe.id, user_id=user.id)
+        if changed and in_shopping_cart:
+            ShoppingCartIngredient.objects.add_recipe(
+                user, recipe, 1 if request.method == 'POST' else -1
+            )
+    if not changed and request.method == 'POST':
+        return Response({'errors': f'Рецепт уже в { message }.'})
+    if not changed:
+        return Response({'errors': f'Рецепта нет в { message }.'})
     return RecipeForSubscriptionsSerializer(recipe)
+
+
+def bulk_change_relation(request, model, through, user_field, object_field,
+                         on_change=None):
+    """
+    Пакетное добавление (POST) и удаление (DELETE) связей пользователя с
+    объектами: рецептами в избранном и списке покупок или авторами в
+    подписках.
+
+    Все изменения выполняются в одной транзакции постоянным числом
+    запросов. Для каждого id возвращается статус: added, exists, removed,
+    absent, not_found или self (подписка на себя). on_change вызывается
+    со списком измененных id и знаком изменения (1 или -1).
+    """
+
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    user = request.user
+    adding = request.method == 'POST'
+    with transaction.atomic():
+        # Текущие связи читаются под блокировкой пользователя, которую
+        # берет и toggle_relation: одновременный одиночный запрос не
+        # изменит их до конца транзакции, и изменения не учтутся дважды.
+        lock_user(user)
+        found = set(model.objects.filter(id__in=ids)
+                    .values_list('id', flat=True))
+        current = set(through.objects.filter(
+            **{user_field: user, f'{ object_field }__in': found}
+        ).values_list(object_field, flat=True))
+        statuses = {}
+        for pk in ids:
+            if pk not in found:
+                statuses[pk] = 'not_found'
+            elif adding and model is User and pk == user.pk:
+                statuses[pk] = 'self'
+            elif adding:
+                statuses[pk] = 'exists' if pk in current else 'added'
+            else:
+                statuses[pk] = 'removed' if pk in current else 'absent'
+        changed = [pk for pk, status in statuses.items()
+                   if status in ('added', 'removed')]
+        if changed and adding:
+            through.objects.bulk_create(
+                [through(**{user_field: user, object_field: pk})
+                 for pk in changed],
+                ignore_conflicts=True,
+            )
+        elif changed:
+            through.objects.filter(
+                **{user_field: user, f'{ object_field }__in': changed}
+            ).delete()
+        if changed:
+            update_relation_counters(through, changed, 1 if adding else -1)
+        if changed and on_change is not None:
+            on_change(changed, 1 if adding else -1)
+    return Response({'results': [
+        {'id': pk, 'status': status} for pk, status in statuses.items()
+    ]})
+
+
+def get_authors_recipes(author_ids, recipes_limit=None):
+    """
+    Рецепты авторов одним запросом.
+
+    С ограничением берутся первые recipes_limit рецептов каждого автора
+    по id: номер строки считается оконной функцией в подзапросе.
+    """
+
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if recipes_limit is None:
+        return recipes
+    ranked = recipes.annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('id').asc(),
+        )
+    ).order_by().values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    return Recipe.objects.filter(pk__in=RawSQL(
+        f'SELECT "id" FROM ({ sql }) ranked WHERE "row_number" <= %s',
+        (*params, recipes_limit),
+    )).order_by('id')
+
+
+def attach_authors_recipes(authors, recipes_limit=None):
+    """Рецепты для страницы подписок в атрибуте subscription_recipes."""
+
+    authors_by_id = {author.id: author for author in authors}
+    for author in authors:
+        author.subscription_recipes = []
+    for recipe in get_authors_recipes(authors_by_id, recipes_limit):
+        authors_by_id[recipe.author_id].subscription_recipes.append(recipe)
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -17,12 +18,14 @@ AUTH_USER_MODEL = 'users.User'
 INSTALLED_APPS = [
     'users',
     'foodgram',
+    'api',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -99,6 +102,115 @@ DATABASES = {
     }
 }
 
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION',
+                           default=os.path.join(BASE_DIR, 'cache'))
+
+# Наибольшее количество записей в локальных кешах: при переполнении
+# удаляется треть записей. В 'recipes' хранятся страницы ответов, в
+# 'default' - версии справочников, журналы изменений рецептов и счетчики
+# попаданий в кеш ответов.
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', default=10000))
+RECIPES_CACHE_MAX_ENTRIES = int(os.getenv('RECIPES_CACHE_MAX_ENTRIES',
+                                          default=10000))
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.path.join(CACHE_LOCATION, 'default'),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'recipes': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.path.join(CACHE_LOCATION, 'recipes'),
+        'OPTIONS': {'MAX_ENTRIES': RECIPES_CACHE_MAX_ENTRIES},
+    },
+}
+
+# Redis вместо локального кеша, например redis://redis:6379/0.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': alias,
+        }
+        for alias in CACHES
+    }
+
+# Время жизни (в секундах) ответов со списком и страницами рецептов
+# для анонимных пользователей.
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', default=300))
+
+# Время (в секундах), на которое клиенты и nginx могут кешировать
+# справочники без перепроверки ETag.
+CATALOGUE_CACHE_MAX_AGE = int(os.getenv('CATALOGUE_CACHE_MAX_AGE',
+                                        default=60))
+
+# Асинхронные представления для нагруженных эндпоинтов чтения.
+# Включаются автоматически при запуске через backend.asgi.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='0') == '1'
+
+# Метрики запросов: время ответа, запросы к базе, время сериализации и
+# размер ответа в логе (JSON) и на /metrics в формате Prometheus.
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='0') == '1'
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'api.middleware.request_metrics_middleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Количество потоков, которые в фоне готовят уменьшенные копии фото
+# рецептов. При 0 копии создаются сразу после сохранения рецепта.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+# Тесты запускаются на SQLite без миграций, которые создаются при деплое.
+if 'test' in sys.argv:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+            # Файл вместо базы в памяти: в памяти SQLite с общим кешем
+            # блокирует таблицы при записи из нескольких потоков.
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
+        }
+    }
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': alias,
+        }
+        for alias in CACHES
+    }
+    IMAGE_WORKERS = 0
+    MIGRATION_MODULES = {
+        'users': None,
+        'foodgram': None,
+        'api': None,
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,3 +242,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
@@ -8,6 +8,11 @@ urlpatterns = [
     path('api/', include('api.urls')),
 ]
 
+if settings.REQUEST_METRICS:
+    from api.metrics import metrics_view
+
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
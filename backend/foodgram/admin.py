@@ -57,7 +57,7 @@ class RecipesAdmin(admin.ModelAdmin):
 
     def in_favorites(self, obj):
         """Количество добавлений в избранное."""
-        return obj.favorited.count()
+        return obj.favorites_count
 
 
 admin.site.register(Ingredient, IngredientsAdmin)
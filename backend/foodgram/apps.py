@@ -1,6 +1,39 @@
 from django.apps import AppConfig
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete, pre_save)
 
 
 class FoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+
+        from .counters import (RELATION_COUNTERS, recipe_deleted, recipe_saved,
+                               relation_changed, user_deleted)
+        from .images import delete_renditions, schedule_renditions
+        from .indexes import create_indexes
+        from .models import Recipe, RecipeIngredient
+        from .shopping_cart import (ShoppingCart, recipe_deleting,
+                                    recipe_deletion_finished,
+                                    recipe_ingredient_deleted,
+                                    recipe_ingredient_saved,
+                                    recipe_ingredient_saving,
+                                    shopping_cart_changed)
+
+        post_migrate.connect(create_indexes, sender=self)
+        post_save.connect(schedule_renditions, sender=Recipe)
+        post_delete.connect(delete_renditions, sender=Recipe)
+        for through in RELATION_COUNTERS:
+            m2m_changed.connect(relation_changed, sender=through)
+        post_save.connect(recipe_saved, sender=Recipe)
+        post_delete.connect(recipe_deleted, sender=Recipe)
+        pre_delete.connect(user_deleted, sender=get_user_model())
+        m2m_changed.connect(shopping_cart_changed, sender=ShoppingCart)
+        pre_save.connect(recipe_ingredient_saving, sender=RecipeIngredient)
+        post_save.connect(recipe_ingredient_saved, sender=RecipeIngredient)
+        post_delete.connect(recipe_ingredient_deleted,
+                            sender=RecipeIngredient)
+        pre_delete.connect(recipe_deleting, sender=Recipe)
+        post_delete.connect(recipe_deletion_finished, sender=Recipe)
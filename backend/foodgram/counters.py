@@ -0,0 +1,152 @@
+"""
+Счетчики популярности: избранное и списки покупок у рецепта, рецепты и
+подписчики у автора.
+
+Счетчики меняются выражением F() в той же транзакции, что и связь,
+поэтому одновременные изменения не теряются. Изменения в обход ORM
+(bulk_create, удаление связей SQL-запросом) счетчики не учитывают,
+расхождения исправляет команда reconcile_counters.
+"""
+from collections import Counter, defaultdict, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe
+
+User = get_user_model()
+
+RelationCounter = namedtuple('RelationCounter',
+                             'm2m_field model field column')
+
+# Связи ManyToManyField (по промежуточной модели) и счетчики объектов,
+# с которыми связь устанавливается (column - их id в промежуточной модели).
+RELATION_COUNTERS = {
+    Recipe.favorited.through: RelationCounter(
+        Recipe.favorited.field, Recipe, 'favorites_count', 'recipe_id'
+    ),
+    Recipe.in_shopping_cart.through: RelationCounter(
+        Recipe.in_shopping_cart.field, Recipe, 'shopping_cart_count',
+        'recipe_id'
+    ),
+    User.subscriptions.through: RelationCounter(
+        User.subscriptions.field, User, 'followers_count', 'to_user_id'
+    ),
+}
+
+
+def update_counters(model, field, object_ids, delta):
+    """
+    Изменение счетчика field объектов object_ids на delta.
+
+    Id могут повторяться: счетчик объекта меняется на delta столько раз,
+    сколько раз встречается его id. Счетчик не становится меньше нуля.
+    """
+
+    ids_by_count = defaultdict(list)
+    for pk, count in Counter(object_ids).items():
+        ids_by_count[count].append(pk)
+    for count, ids in ids_by_count.items():
+        model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta * count, Value(0))}
+        )
+
+
+def update_relation_counters(through, object_ids, delta):
+    """Учет добавленных (delta=1) или удаленных (delta=-1) связей."""
+
+    counter = RELATION_COUNTERS[through]
+    update_counters(counter.model, counter.field, object_ids, delta)
+
+
+def relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Учет изменений связей через менеджеры ManyToManyField (админка,
+    add/remove/set/clear в коде).
+
+    Добавленные связи учитываются после добавления (в post_add pk_set
+    содержит только новые id), удаляемые - до удаления, пока их можно
+    выбрать.
+    """
+
+    if action == 'post_add':
+        delta = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        delta = -1
+    else:
+        return
+    counter = RELATION_COUNTERS[sender]
+    source = counter.m2m_field.m2m_column_name()
+    target = counter.m2m_field.m2m_reverse_name()
+    if reverse:
+        source, target = target, source
+    rows = sender.objects.filter(**{source: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f'{ target }__in': pk_set})
+    update_relation_counters(
+        sender, rows.values_list(counter.column, flat=True), delta
+    )
+
+
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_counters(User, 'recipes_count', [instance.author_id], 1)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    update_counters(User, 'recipes_count', [instance.author_id], -1)
+
+
+def user_deleted(sender, instance, **kwargs):
+    """
+    Учет связей удаляемого пользователя: строки промежуточных таблиц
+    удаляются каскадом, без сигналов m2m_changed.
+    """
+
+    for through, counter in RELATION_COUNTERS.items():
+        user_column = ({counter.m2m_field.m2m_column_name(),
+                        counter.m2m_field.m2m_reverse_name()}
+                       - {counter.column}).pop()
+        update_relation_counters(
+            through,
+            through.objects.filter(**{user_column: instance.pk})
+            .values_list(counter.column, flat=True),
+            -1,
+        )
+
+
+def get_counter_sources():
+    """Счетчики и модели, строки которых они считают: (модель, поле,
+    модель-источник, поле со ссылкой на объект)."""
+
+    return [
+        *((counter.model, counter.field, through, counter.column)
+          for through, counter in RELATION_COUNTERS.items()),
+        (User, 'recipes_count', Recipe, 'author_id'),
+    ]
+
+
+def reconcile_counters(check=False):
+    """
+    Пересчет счетчиков по данным связей.
+
+    Возвращает {'модель.поле': количество строк с расхождением}. С
+    check=True только считает расхождения, не меняя данные.
+    """
+
+    result = {}
+    for model, field, source, column in get_counter_sources():
+        expected = Coalesce(
+            Subquery(
+                source.objects.filter(**{column: OuterRef('pk')})
+                .order_by().values(column).annotate(total=Count('pk'))
+                .values('total')
+            ),
+            0,
+        )
+        drifted = model.objects.exclude(**{field: expected})
+        result[f'{ model._meta.model_name }.{ field }'] = (
+            drifted.count() if check else drifted.update(**{field: expected})
+        )
+    return result
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions/'
+
+# Наибольшая сторона копии в пикселях.
+RENDITION_SIZES = {
+    'thumb': 240,
+    'card': 600,
+    'full': 1200,
+}
+
+# API отдает только WebP: формат копии не зависит от запроса, поэтому
+# ответы можно кешировать без учета заголовка Accept.
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для подготовки копий, создается при первом вызове."""
+
+    return ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS,
+                              thread_name_prefix='renditions')
+
+
+def get_rendition_url(recipe, size, image_format='webp'):
+    """
+    Адрес копии фото рецепта нужного размера.
+
+    Пока копии для текущего фото не готовы, возвращает None.
+    """
+
+    renditions = recipe.image_renditions
+    if renditions.get('source') != recipe.image.name:
+        return None
+    name = renditions.get(size, {}).get(image_format)
+    if name is None:
+        return None
+    return default_storage.url(name)
+
+
+def render(image, size, image_format):
+    """Уменьшенная копия фото в заданном формате."""
+
+    image_format, options = RENDITION_FORMATS[image_format]
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def create_renditions(recipe_id):
+    """
+    Создание копий фото рецепта всех размеров и форматов.
+
+    Копии лежат в отдельном каталоге рецепта, имена файлов содержат
+    хеш исходного фото, поэтому готовые копии повторно не создаются,
+    а nginx может отдавать их с бессрочным кешированием. Копии прежнего
+    фото удаляются после сохранения новых. Если пока копии готовились,
+    фото рецепта заменили, результат не сохраняется: для нового фото
+    уже запланирована своя задача.
+    """
+
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    if not default_storage.exists(recipe.image.name):
+        logger.info('Фото рецепта %s не найдено', recipe_id)
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        data = file.read()
+    digest = hashlib.md5(data).hexdigest()[:16]
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    image = image.convert('RGB')
+
+    renditions = {'source': source}
+    for size_name, size in RENDITION_SIZES.items():
+        renditions[size_name] = {}
+        for extension in RENDITION_FORMATS:
+            name = posixpath.join(RENDITIONS_DIR, str(recipe_id),
+                                  f'{digest}-{size_name}.{extension}')
+            if not default_storage.exists(name):
+                name = default_storage.save(
+                    name, ContentFile(render(image, size, extension))
+                )
+            renditions[size_name][extension] = name
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=source
+        ).first()
+        if recipe is None:
+            return
+        stale = (get_rendition_names(recipe.image_renditions)
+                 - get_rendition_names(renditions))
+        recipe.image_renditions = renditions
+        recipe.save(update_fields=['image_renditions'])
+        transaction.on_commit(lambda: delete_files(stale))
+
+
+def get_rendition_names(renditions):
+    """Имена файлов всех копий фото."""
+
+    return {
+        name
+        for size_name in RENDITION_SIZES
+        for name in renditions.get(size_name, {}).values()
+    }
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def delete_renditions(sender, instance, **kwargs):
+    """Удаление копий фото вместе с рецептом."""
+
+    names = get_rendition_names(instance.image_renditions)
+    if names:
+        transaction.on_commit(lambda: delete_files(names))
+
+
+def run_create_renditions(recipe_id):
+    """Задача для пула потоков: ошибки пишутся в лог."""
+
+    try:
+        create_renditions(recipe_id)
+    except Exception:
+        logger.exception('Не удалось подготовить копии фото рецепта %s',
+                         recipe_id)
+    finally:
+        if settings.IMAGE_WORKERS:
+            connections.close_all()
+
+
+def schedule_renditions(sender, instance, update_fields=None, **kwargs):
+    """
+    Постановка задачи на подготовку копий после сохранения рецепта.
+
+    Задача ставится только если фото изменилось с момента
+    подготовки последних копий.
+    """
+
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if not instance.image:
+        return
+    if instance.image_renditions.get('source') == instance.image.name:
+        return
+
+    def submit():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(run_create_renditions, instance.pk)
+        else:
+            run_create_renditions(instance.pk)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from .models import Recipe
+
+User = get_user_model()
+
+# Индексы, которые нельзя описать в Meta.indexes: у автоматически
+# созданных таблиц ManyToManyField нет Meta, а индексы PostgreSQL
+# сломали бы совместимость с SQLite. Они создаются после миграций.
+POSTGRES_EXTENSIONS = (
+    'pg_trgm',
+)
+
+POSTGRES_INDEXES = (
+    # Поиск ингредиентов по подстроке: UPPER(name) LIKE UPPER('%...%').
+    'CREATE INDEX IF NOT EXISTS foodgram_ingredient_name_upper_trgm '
+    'ON foodgram_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+    # Поиск ингредиентов с опечатками: name %> 'запрос'.
+    'CREATE INDEX IF NOT EXISTS foodgram_ingredient_name_trgm '
+    'ON foodgram_ingredient USING gin (name gin_trgm_ops)',
+    # Полнотекстовый поиск рецептов: search_vector @@ websearch_to_tsquery.
+    'CREATE INDEX IF NOT EXISTS foodgram_recipe_search_vector '
+    'ON foodgram_recipe USING gin (search_vector)',
+)
+
+
+def get_membership_indexes():
+    """
+    Индексы для проверок "рецепт в избранном/списке покупок" и подписок.
+
+    Уникальный индекс (recipe_id, user_id) создает Django, здесь
+    добавляются обратные индексы для выборок по пользователю.
+    """
+
+    tables = (
+        (Recipe.favorited.through._meta.db_table, 'user_id', 'recipe_id'),
+        (Recipe.in_shopping_cart.through._meta.db_table,
+         'user_id', 'recipe_id'),
+        (User.subscriptions.through._meta.db_table,
+         'to_user_id', 'from_user_id'),
+    )
+    return [
+        f'CREATE INDEX IF NOT EXISTS {table}_{first}_{second}_idx '
+        f'ON {table} ({first}, {second})'
+        for table, first, second in tables
+    ]
+
+
+def create_indexes(using='default', **kwargs):
+    """Создание расширений и индексов после миграций."""
+
+    connection = connections[using]
+    if 'foodgram_ingredient' not in connection.introspection.table_names():
+        return
+    statements = get_membership_indexes()
+    if connection.vendor == 'postgresql':
+        statements = [
+            *(f'CREATE EXTENSION IF NOT EXISTS {extension}'
+              for extension in POSTGRES_EXTENSIONS),
+            *POSTGRES_INDEXES,
+            *statements,
+        ]
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
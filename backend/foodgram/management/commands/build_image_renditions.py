@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from foodgram.images import create_renditions
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Подготовка уменьшенных копий фото рецептов, '
+            'для которых их еще нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        )
+        count = 0
+        for recipe in recipes.iterator():
+            if (not options['all'] and recipe.image_renditions.get('source')
+                    == recipe.image.name):
+                continue
+            create_renditions(recipe.id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {count}.'
+        ))
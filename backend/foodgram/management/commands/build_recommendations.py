@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from foodgram.recommendations import CHUNK_SIZE, TOP_K, build_similarities
+
+
+class Command(BaseCommand):
+    help = ('Пересчет похожих рецептов по избранному и спискам покупок '
+            'для ленты рекомендаций.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=TOP_K,
+            help='Количество похожих рецептов, сохраняемых для рецепта.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов расчета, по умолчанию по числу ядер.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Количество рецептов в пачке одного процесса.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк, сохраняемых одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        total = build_similarities(top_k=options['top_k'],
+                                   workers=options['workers'],
+                                   chunk_size=options['chunk_size'],
+                                   batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено похожих рецептов: {total} '
+            f'за {time.perf_counter() - start:.1f} с.'
+        ))
@@ -1,29 +1,175 @@
 import csv
+import json
 import os
+import re
+import time
+from collections import Counter
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
 from foodgram.models import Ingredient
+from foodgram.signals import bulk_loaded
 
+FORMATS = ('csv', 'json')
+CSV_HEADER = ['name', 'measurement_unit']
+JSON_CHUNK_SIZE = 2 ** 16
+# Пробелы и разделители между объектами в массиве JSON.
+JSON_SEPARATORS = re.compile(r'[\s,\[]*')
+MAX_LENGTH = Ingredient._meta.get_field('name').max_length
 
-class Command(BaseCommand):
-    help = 'Импорт ингредиентов из csv файла.'
 
-    def handle(self, *args, **kwargs):
-        if Ingredient.objects.all().exists():
-            pass
+def read_csv(file):
+    """Строки CSV (название, единица измерения), заголовок пропускается."""
+
+    for row in csv.reader(file):
+        if row != CSV_HEADER:
+            yield row
+
+
+def read_json(file):
+    """
+    Ингредиенты из массива JSON или из объектов по одному в строке.
+
+    Файл читается частями, в памяти хранится только текущая часть.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if eof:
+                if position < len(buffer):
+                    raise CommandError(f'Ошибка в JSON: {error}')
+                return
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if isinstance(item, dict):
+            yield [item.get('name'), item.get('measurement_unit')]
+        else:
+            yield [item]
+
+
+def clean(row):
+    """Ключ (название, единица измерения) или None для ошибочной строки."""
+
+    if len(row) != 2 or not all(isinstance(value, str) for value in row):
+        return None
+    name, measurement_unit = (value.strip() for value in row)
+    if (not name or not measurement_unit or len(name) > MAX_LENGTH
+            or len(measurement_unit) > MAX_LENGTH):
+        return None
+    return name, measurement_unit
+
+
+def import_batch(rows, stats):
+    """
+    Добавление пачки ингредиентов, которых еще нет в базе.
+
+    Ингредиент однозначно определяется парой (название, единица
+    измерения), других полей у него нет, поэтому повторы пропускаются.
+    """
+
+    keys = set()
+    for row in rows:
+        key = clean(row)
+        if key is None:
+            stats['invalid'] += 1
+        elif key in keys:
+            stats['skipped'] += 1
         else:
-            with open(
-                os.path.join(
-                    settings.BASE_DIR,
-                    'data',
-                    'ingredients.csv'
-                ),
-                encoding='utf-8'
-            ) as data:
-                Ingredient.objects.bulk_create(
-                    [Ingredient(
-                        name=line[0],
-                        measurement_unit=line[1]
-                    ) for line in csv.reader(data)]
-                )
+            keys.add(key)
+    existing = set(
+        Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit')
+    )
+    new = keys - existing
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in sorted(new)],
+        ignore_conflicts=True,
+    )
+    stats['inserted'] += len(new)
+    stats['skipped'] += len(keys) - len(new)
+
+
+class Command(BaseCommand):
+    help = ('Импорт ингредиентов из CSV или JSON. Ингредиенты, которые '
+            'уже есть в базе, пропускаются, поэтому импорт можно '
+            'запускать повторно для обновления справочника.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data',
+                                 'ingredients.csv'),
+            help='Файл с ингредиентами, по умолчанию data/ingredients.csv.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество строк, которые обрабатываются за раз.',
+        )
+
+    def get_format(self, path, file_format):
+        if file_format:
+            return file_format
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in FORMATS:
+            raise CommandError('Не удалось определить формат файла, '
+                               'укажите --format.')
+        return extension
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        path = options['path']
+        reader = {'csv': read_csv, 'json': read_json}[
+            self.get_format(path, options['format'])
+        ]
+        stats = Counter()
+        start = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = reader(file)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    import_batch(batch, stats)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(
+                            f'Обработано строк: {sum(stats.values())}'
+                        )
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+        elapsed = time.perf_counter() - start
+        if stats['inserted']:
+            bulk_loaded.send(sender=Ingredient)
+
+        total = sum(stats.values())
+        self.stdout.write(
+            f'Добавлено: {stats["inserted"]}, '
+            f'пропущено: {stats["skipped"]}, '
+            f'с ошибками: {stats["invalid"]}, '
+            f'строк в секунду: {round(total / elapsed) if elapsed else total}'
+        )
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Проверка и пересчет сумм ингредиентов в списках покупок '
+            '(ShoppingCartIngredient).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не меняя данные.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при пересчете.',
+        )
+
+    def get_drift(self):
+        """Строки, в которых сохраненная сумма отличается от расчетной."""
+
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.calculate().iterator()
+        }
+        drift = []
+        for user_id, ingredient_id, amount in (
+            ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        ):
+            expected_amount = expected.pop((user_id, ingredient_id), None)
+            if expected_amount != amount:
+                drift.append((user_id, ingredient_id, amount,
+                              expected_amount))
+        drift.extend(
+            (user_id, ingredient_id, None, amount)
+            for (user_id, ingredient_id), amount in expected.items()
+        )
+        return drift
+
+    def handle(self, *args, **options):
+        drift = self.get_drift()
+        for user_id, ingredient_id, amount, expected in drift[:20]:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'сохранено {amount}, ожидается {expected}'
+            )
+        if options['check']:
+            if drift:
+                raise CommandError(f'Найдено расхождений: {len(drift)}.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        ShoppingCartIngredient.objects.rebuild(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Таблица пересчитана, исправлено расхождений: {len(drift)}.'
+        ))
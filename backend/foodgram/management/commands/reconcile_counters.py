@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Проверка и пересчет счетчиков популярности: избранное и '
+            'списки покупок у рецептов, рецепты и подписчики у авторов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не меняя данные.',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(check=options['check'])
+        for name, count in drift.items():
+            self.stdout.write(f'{name}: {count}')
+        total = sum(drift.values())
+        if options['check']:
+            if total:
+                raise CommandError(f'Найдено расхождений: {total}.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны, исправлено строк: {total}.'
+        ))
@@ -1,6 +1,12 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+
+from users.mixins import MaintainedFieldsMixin
 
 User = get_user_model()
 
@@ -27,6 +33,7 @@ class Tag(models.Model):
         max_length=200,
         blank=False,
         null=False,
+        unique=True,
         help_text='Уникальный слаг',
     )
 
@@ -59,12 +66,18 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(MaintainedFieldsMixin, models.Model):
     """Модель для рецептов."""
 
     name = models.CharField(
@@ -120,6 +133,13 @@ class Recipe(models.Model):
         blank=False,
         null=False,
     )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Пути к копиям фото разных размеров и форматов',
+    )
     favorited = models.ManyToManyField(
         User,
         related_name='favorites',
@@ -136,11 +156,48 @@ class Recipe(models.Model):
         'Даnа публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+        help_text='Счетчик, обновляется при изменении избранного',
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False,
+        help_text='Счетчик, обновляется при изменении списков покупок',
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+        help_text='Название, ингредиенты и описание для полнотекстового '
+                  'поиска (только PostgreSQL)',
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+        ]
+
+    # Счетчики и поисковый вектор обновляются запросами UPDATE.
+    maintained_fields = ('favorites_count', 'shopping_cart_count',
+                         'search_vector')
 
     def __str__(self):
         return self.name
@@ -161,6 +218,12 @@ class RecipeTag(models.Model):
                 name='unique_recipe_tag'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipetag_tag_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tag}'
@@ -190,3 +253,216 @@ class RecipeIngredient(models.Model):
 
     def __str__(self):
         return f'{self.recipe} {self.ingredient}'
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Поддержание сумм ингредиентов в списках покупок."""
+
+    def apply_deltas(self, deltas):
+        """
+        Изменение сумм на переданные величины.
+
+        deltas - словарь {(user_id, ingredient_id): изменение количества}.
+        Строки с нулевой суммой удаляются.
+        """
+
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        user_ids = {user_id for user_id, _ in deltas}
+        ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+        with transaction.atomic():
+            existing = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids,
+                    ingredient_id__in=ingredient_ids,
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+            for (user_id, ingredient_id), delta in deltas.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta,
+                        ))
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ['amount'])
+            if to_delete:
+                self.filter(id__in=to_delete).delete()
+
+    def add_recipe(self, user, recipe, sign=1):
+        """Учет ингредиентов рецепта, добавленного в список покупок."""
+
+        self.add_recipes(user, [recipe.id], sign)
+
+    def add_recipes(self, user, recipe_ids, sign=1):
+        """Учет ингредиентов рецептов, добавленных в список покупок."""
+
+        self.add_pairs([(user.id, recipe_id) for recipe_id in recipe_ids],
+                       sign)
+
+    def add_pairs(self, pairs, sign=1):
+        """
+        Учет рецептов, добавленных в списки покупок (sign=1) или
+        удаленных из них (sign=-1): pairs - пары (user_id, recipe_id).
+        """
+
+        users_by_recipe = defaultdict(list)
+        for user_id, recipe_id in pairs:
+            users_by_recipe[recipe_id].append(user_id)
+        deltas = defaultdict(int)
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=users_by_recipe
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+        for recipe_id, ingredient_id, amount in rows:
+            for user_id in users_by_recipe[recipe_id]:
+                deltas[(user_id, ingredient_id)] += sign * amount
+        self.apply_deltas(deltas)
+
+    def remove_recipe(self, user, recipe):
+        """Учет ингредиентов рецепта, удаленного из списка покупок."""
+
+        self.add_recipe(user, recipe, sign=-1)
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """
+        Учет изменения ингредиентов рецепта у всех пользователей,
+        у которых он в списке покупок.
+
+        old_amounts и new_amounts - словари {ingredient_id: amount}.
+        """
+
+        changes = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        changes = {key: delta for key, delta in changes.items() if delta}
+        if not changes:
+            return
+        user_ids = Recipe.in_shopping_cart.through.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+        self.apply_deltas({
+            (user_id, ingredient_id): delta
+            for user_id in user_ids
+            for ingredient_id, delta in changes.items()
+        })
+
+    def calculate(self):
+        """Суммы ингредиентов, рассчитанные по спискам покупок."""
+
+        return RecipeIngredient.objects.filter(
+            recipe__in_shopping_cart__isnull=False
+        ).values(
+            'ingredient_id',
+            user_id=F('recipe__in_shopping_cart'),
+        ).annotate(
+            total=Sum('amount')
+        ).values_list('user_id', 'ingredient_id', 'total')
+
+    def rebuild(self, batch_size=1000):
+        """Полный пересчет таблицы."""
+
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for user_id, ingredient_id, amount in self.calculate().iterator(
+                chunk_size=batch_size
+            ):
+                batch.append(self.model(user_id=user_id,
+                                        ingredient_id=ingredient_id,
+                                        amount=amount))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Сумма ингредиента в списке покупок пользователя.
+
+    Денормализованная таблица, обновляется при изменении списка покупок
+    и ингредиентов рецептов из него.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        'Количество',
+        help_text='Суммарное количество в единицах измерения',
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}'
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Похожий рецепт: один из ближайших соседей рецепта по избранному и
+    спискам покупок пользователей.
+
+    Таблица пересчитывается командой build_recommendations.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        'Сходство',
+        help_text='Косинусное сходство от 0 до 1',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similarity'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.similar}'
@@ -0,0 +1,174 @@
+"""
+Рекомендации рецептов по избранному и спискам покупок.
+
+Похожесть рецептов - косинусное сходство столбцов матрицы
+пользователь x рецепт: избранное с весом 2, список покупок с весом 1.
+Строка матрицы сходства считается как сумма строк пользователей, которые
+добавили рецепт: Counter.update по кортежу рецептов пользователя, где
+рецепт повторен столько раз, каков его вес, выполняется в C и дает
+произведение весов без цикла Python по парам. Рецепты делятся на пачки,
+пачки считаются в отдельных процессах, для каждого рецепта сохраняются
+TOP_K ближайших соседей.
+
+Лента пользователя - сумма сходства с рецептами из его избранного и
+списка покупок, одним запросом по индексу таблицы похожих рецептов.
+"""
+import heapq
+import math
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import Recipe, RecipeSimilarity
+
+FAVORITE_WEIGHT = 2
+SHOPPING_CART_WEIGHT = 1
+TOP_K = 20
+# Пользователи, добавившие очень много рецептов, почти ничего не говорят
+# о сходстве, а время расчета растет как квадрат числа их рецептов.
+MAX_USER_RECIPES = 500
+CHUNK_SIZE = 1000
+
+# Матрица для процессов расчета: наследуется при fork.
+_matrix = None
+
+
+def load_matrix():
+    """
+    Матрица пользователь x рецепт: (пользователи каждого рецепта,
+    рецепты каждого пользователя, нормы рецептов). Id повторяются
+    столько раз, каков вес связи.
+    """
+
+    weights = defaultdict(dict)
+    for through, weight in (
+        (Recipe.in_shopping_cart.through, SHOPPING_CART_WEIGHT),
+        (Recipe.favorited.through, FAVORITE_WEIGHT),
+    ):
+        for user_id, recipe_id in through.objects.values_list(
+            'user_id', 'recipe_id'
+        ).iterator(chunk_size=10000):
+            weights[user_id][recipe_id] = weight
+    recipe_users = defaultdict(list)
+    user_recipes = {}
+    for user_id, recipes in weights.items():
+        if len(recipes) > MAX_USER_RECIPES:
+            continue
+        user_recipes[user_id] = tuple(
+            recipe_id
+            for recipe_id, weight in recipes.items()
+            for _ in range(weight)
+        )
+        for recipe_id, weight in recipes.items():
+            recipe_users[recipe_id].extend([user_id] * weight)
+    norms = {
+        recipe_id: math.sqrt(sum(
+            weights[user_id][recipe_id] for user_id in users
+        ))
+        for recipe_id, users in recipe_users.items()
+    }
+    return dict(recipe_users), user_recipes, norms
+
+
+def get_neighbours(recipe_ids, top_k=TOP_K):
+    """Пары (рецепт, похожий рецепт, сходство) для пачки рецептов."""
+
+    recipe_users, user_recipes, norms = _matrix
+    rows = []
+    for recipe_id in recipe_ids:
+        products = Counter()
+        for user_id in recipe_users[recipe_id]:
+            products.update(user_recipes[user_id])
+        del products[recipe_id]
+        norm = norms[recipe_id]
+        rows.extend(
+            (recipe_id, similar_id, round(score, 6))
+            for score, similar_id in heapq.nlargest(top_k, (
+                (product / (norm * norms[similar_id]), similar_id)
+                for similar_id, product in products.items()
+            ))
+        )
+    return rows
+
+
+def iter_neighbours(recipe_ids, top_k, workers, chunk_size):
+    chunks = [recipe_ids[start:start + chunk_size]
+              for start in range(0, len(recipe_ids), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1 or (
+        'fork' not in multiprocessing.get_all_start_methods()
+    ):
+        for chunk in chunks:
+            yield get_neighbours(chunk, top_k)
+        return
+    # Дочерние процессы не обращаются к БД и завершаются без закрытия
+    # унаследованных соединений.
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('fork')
+    ) as executor:
+        yield from executor.map(get_neighbours, chunks,
+                                [top_k] * len(chunks))
+
+
+def build_similarities(top_k=TOP_K, workers=None, chunk_size=CHUNK_SIZE,
+                       batch_size=1000):
+    """
+    Пересчет таблицы похожих рецептов. Возвращает количество строк.
+
+    workers - число процессов расчета, по умолчанию по числу ядер.
+    """
+
+    global _matrix
+    _matrix = load_matrix()
+    try:
+        rows = iter_neighbours(sorted(_matrix[0]), top_k,
+                               workers or os.cpu_count() or 1, chunk_size)
+        total = 0
+        with transaction.atomic():
+            existing = set(Recipe.objects.values_list('id', flat=True))
+            RecipeSimilarity.objects.all().delete()
+            for chunk in rows:
+                batch = [
+                    RecipeSimilarity(recipe_id=recipe_id,
+                                     similar_id=similar_id, score=score)
+                    for recipe_id, similar_id, score in chunk
+                    if recipe_id in existing and similar_id in existing
+                ]
+                RecipeSimilarity.objects.bulk_create(batch,
+                                                     batch_size=batch_size)
+                total += len(batch)
+    finally:
+        _matrix = None
+    return total
+
+
+def get_recommended_recipes(queryset, user):
+    """
+    Рецепты, похожие на избранное и список покупок пользователя, кроме
+    них самих, по убыванию суммарного сходства. Если похожих рецептов
+    нет (нет избранного и списка покупок или таблица похожих рецептов
+    еще не построена) - популярные рецепты.
+    """
+
+    favorites = Recipe.favorited.through.objects.filter(
+        user=user
+    ).values('recipe_id')
+    shopping_cart = Recipe.in_shopping_cart.through.objects.filter(
+        user=user
+    ).values('recipe_id')
+    queryset = queryset.exclude(pk__in=favorites).exclude(
+        pk__in=shopping_cart
+    )
+    if not RecipeSimilarity.objects.filter(
+        Q(recipe_id__in=favorites) | Q(recipe_id__in=shopping_cart)
+    ).exists():
+        return queryset.order_by('-favorites_count', '-id')
+    return queryset.filter(
+        Q(similar_to__recipe_id__in=favorites)
+        | Q(similar_to__recipe_id__in=shopping_cart)
+    ).annotate(
+        recommendation_score=Sum('similar_to__score')
+    ).order_by('-recommendation_score', '-id')
@@ -0,0 +1,120 @@
+import csv
+import os
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .counters import reconcile_counters
+from .models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingCartIngredient, Tag)
+from .signals import bulk_loaded
+
+User = get_user_model()
+
+USERS_COUNT = 200
+RECIPES_COUNT = 2000
+INGREDIENTS_PER_RECIPE = 5
+FAVORITES_PER_USER = 20
+CART_USERS_COUNT = 10
+CART_SIZE = 100
+SUBSCRIPTIONS_COUNT = 50
+
+
+def seed_database(seed=42, users_count=USERS_COUNT,
+                  recipes_count=RECIPES_COUNT,
+                  ingredients_per_recipe=INGREDIENTS_PER_RECIPE,
+                  favorites_per_user=FAVORITES_PER_USER,
+                  cart_users_count=CART_USERS_COUNT, cart_size=CART_SIZE,
+                  subscriptions_count=SUBSCRIPTIONS_COUNT):
+    """
+    Наполнение пустой базы реалистичным набором данных.
+
+    Используется в тестах и в нагрузочных замерах (команда bench).
+    Первые cart_users_count пользователей получают список покупок и
+    подписки. Возвращает первого из них.
+    """
+
+    rnd = random.Random(seed)
+
+    with open(
+        os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+        encoding='utf-8'
+    ) as data:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=line[0], measurement_unit=line[1])
+             for line in csv.reader(data)]
+        )
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    tags = Tag.objects.bulk_create([
+        Tag(name='Завтрак', color='#E26C2D', slug='breakfast'),
+        Tag(name='Обед', color='#49B64E', slug='lunch'),
+        Tag(name='Ужин', color='#8775D2', slug='dinner'),
+    ])
+    tags = list(Tag.objects.filter(slug__in=[tag.slug for tag in tags]))
+
+    User.objects.bulk_create([
+        User(email=f'user{i}@foodgram.ru',
+             username=f'user{i}',
+             first_name=f'Имя{i}',
+             last_name=f'Фамилия{i}')
+        for i in range(users_count)
+    ])
+    users = list(User.objects.order_by('id'))
+
+    Recipe.objects.bulk_create([
+        Recipe(name=f'Рецепт {i}',
+               text='Описание рецепта ' * 20,
+               author=rnd.choice(users),
+               cooking_time=rnd.randint(1, 120),
+               image='recipes/images/test.png')
+        for i in range(recipes_count)
+    ])
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe_id=recipe_id,
+                         ingredient_id=ingredient_id,
+                         amount=rnd.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rnd.sample(
+            ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids))
+        )
+    ])
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe_id, tag=tag)
+        for recipe_id in recipe_ids
+        for tag in rnd.sample(tags, rnd.randint(1, len(tags)))
+    ])
+
+    favorited = Recipe.favorited.through
+    favorited.objects.bulk_create([
+        favorited(user=user, recipe_id=recipe_id)
+        for user in users
+        for recipe_id in rnd.sample(
+            recipe_ids, min(favorites_per_user, len(recipe_ids))
+        )
+    ])
+    in_shopping_cart = Recipe.in_shopping_cart.through
+    in_shopping_cart.objects.bulk_create([
+        in_shopping_cart(user=user, recipe_id=recipe_id)
+        for user in users[:cart_users_count]
+        for recipe_id in rnd.sample(recipe_ids,
+                                    min(cart_size, len(recipe_ids)))
+    ])
+    ShoppingCartIngredient.objects.rebuild()
+    subscriptions = User.subscriptions.through
+    subscriptions.objects.bulk_create([
+        subscriptions(from_user=user, to_user=author)
+        for user in users[:cart_users_count]
+        for author in rnd.sample(
+            [author for author in users if author != user],
+            min(subscriptions_count, len(users) - 1)
+        )
+    ])
+    reconcile_counters()
+    for model in (Ingredient, Tag, Recipe):
+        bulk_loaded.send(sender=model)
+
+    return users[0]
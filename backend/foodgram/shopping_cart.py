@@ -0,0 +1,100 @@
+"""
+Поддержание сумм ингредиентов в списках покупок при изменениях через
+модели: менеджер in_shopping_cart (админка, add/remove/set/clear),
+сохранение и удаление ингредиентов рецепта, удаление рецепта.
+
+Эндпоинты API меняют связи и ингредиенты запросами без сигналов
+(INSERT ... ON CONFLICT, bulk_create, bulk_update) и учитывают эти
+изменения сами.
+"""
+from contextvars import ContextVar
+
+from .models import Recipe, RecipeIngredient, ShoppingCartIngredient
+
+ShoppingCart = Recipe.in_shopping_cart.through
+# Id рецептов, которые удаляются в текущем контексте.
+_deleting_recipes = ContextVar('deleting_recipes', default=frozenset())
+
+
+def shopping_cart_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """
+    Учет рецептов, добавленных в списки покупок и удаленных из них.
+
+    Добавленные связи учитываются после добавления (в post_add pk_set
+    содержит только новые id), удаляемые - до удаления, пока их можно
+    выбрать.
+    """
+
+    if action == 'post_add':
+        sign = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        sign = -1
+    else:
+        return
+    source, target = ('user_id', 'recipe_id') if reverse else (
+        'recipe_id', 'user_id'
+    )
+    rows = ShoppingCart.objects.filter(**{source: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f'{ target }__in': pk_set})
+    ShoppingCartIngredient.objects.add_pairs(
+        rows.values_list('user_id', 'recipe_id'), sign
+    )
+
+
+def recipe_ingredient_saving(sender, instance, raw=False, **kwargs):
+    """Запоминание ингредиента и количества до сохранения строки."""
+
+    instance._cart_old = None
+    if raw or instance.pk is None:
+        return
+    instance._cart_old = RecipeIngredient.objects.filter(
+        pk=instance.pk
+    ).values_list('ingredient_id', 'amount').first()
+
+
+def recipe_ingredient_saved(sender, instance, raw=False, **kwargs):
+    """Учет нового или измененного ингредиента рецепта."""
+
+    if raw:
+        return
+    old = getattr(instance, '_cart_old', None)
+    old_amounts = {old[0]: old[1]} if old else {}
+    new_amounts = {instance.ingredient_id: instance.amount}
+    if old and old[0] != instance.ingredient_id:
+        new_amounts[old[0]] = 0
+    ShoppingCartIngredient.objects.change_recipe(instance.recipe_id,
+                                                 old_amounts, new_amounts)
+
+
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    """
+    Учет удаленного ингредиента рецепта (удаление одной строки, например
+    в админке). Строки удаляемого рецепта уже учтены в recipe_deleting.
+    """
+
+    if instance.recipe_id in _deleting_recipes.get():
+        return
+    ShoppingCartIngredient.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {}
+    )
+
+
+def recipe_deleting(sender, instance, **kwargs):
+    """
+    Вычитание рецепта из списков покупок одним запросом до каскадного
+    удаления его ингредиентов, которые затем не учитываются по строкам.
+    """
+
+    _deleting_recipes.set(_deleting_recipes.get() | {instance.pk})
+    ShoppingCartIngredient.objects.add_pairs(
+        ShoppingCart.objects.filter(recipe_id=instance.pk).values_list(
+            'user_id', 'recipe_id'
+        ),
+        -1,
+    )
+
+
+def recipe_deletion_finished(sender, instance, **kwargs):
+    _deleting_recipes.set(_deleting_recipes.get() - {instance.pk})
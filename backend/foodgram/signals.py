@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Строки модели sender загружены в обход ORM (bulk_create): сигналы
+# post_save для них не отправлялись. Обработчики пересчитывают данные,
+# которые зависят от модели (версии справочников, поисковые векторы).
+bulk_loaded = Signal()
@@ -0,0 +1,19 @@
+class MaintainedFieldsMixin:
+    """
+    Сохранение модели без полей из maintained_fields: они меняются
+    отдельными запросами UPDATE (счетчики, поисковый вектор), и значение,
+    загруженное вместе с объектом, могло устареть.
+    """
+
+    maintained_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.maintained_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
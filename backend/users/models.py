@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .mixins import MaintainedFieldsMixin
 
-class User(AbstractUser):
+
+class User(MaintainedFieldsMixin, AbstractUser):
     """Кастомизированная модель пользователей."""
 
     USER = 'user'
@@ -30,6 +32,18 @@ class User(AbstractUser):
         blank=True,
     )
 
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
     role = models.CharField(
         'Роль пользователя',
         max_length=13,
@@ -39,6 +53,9 @@ class User(AbstractUser):
         null=False,
     )
 
+    # Счетчики обновляются запросами UPDATE.
+    maintained_fields = ('recipes_count', 'followers_count')
+
     @property
     def is_user(self):
         return self.role == User.USER